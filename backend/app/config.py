@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 
 
 @dataclass(frozen=True)
@@ -16,10 +17,45 @@ class Settings:
     OCR_LANGS: list[str]
     PDF_TO_IMAGES_MAX_PAGES: int
     OCR_MAX_PAGES: int
+    OCR_WORKERS: int
     GS_TIMEOUT_SECONDS: int
     MAX_DPI_TO_IMAGES: int
+    RENDER_BATCH_PAGES: int
+    RENDER_PROCESSES: int
+    RENDER_BACKEND: str
+    EXTRACT_EMBEDDED_IMAGES: bool
+    EXTRACT_EMBEDDED_MAX_MB: int
+    CACHE_ENABLED: bool
+    CACHE_MAX_MB: int
+    CACHE_TTL_MINUTES: int
+    POOL_LIGHT_WORKERS: int
+    POOL_LIGHT_QUEUE: int
+    POOL_GS_WORKERS: int
+    POOL_GS_QUEUE: int
+    POOL_RENDER_WORKERS: int
+    POOL_RENDER_QUEUE: int
+    RATE_LIMIT_BACKEND: str
+    RATE_LIMIT: int
+    RATE_LIMIT_WINDOW_SECONDS: int
+    STORAGE_MIN_FREE_MB: int
+    DOWNLOAD_MODE: str
+    X_ACCEL_PREFIX: str
+    ADMISSION_CPU_SLOTS: int
+    ADMISSION_MEMORY_MB: int
+    AUTO_SYNC_MAX_SECONDS: float
+    METRICS_ENABLED: bool
+    PROFILE_TOKEN: str
+    PROFILE_SAMPLE_RATE: float
+    PROFILE_INTERVAL_MS: int
+    PROFILE_MAX_MB: int
+    TRACE_ENABLED: bool
+    TRACE_FILE: str
 
 
+# Lidas uma vez por processo: o ambiente não muda depois da partida e
+# get_settings() é chamada em toda requisição. Testes que mudam variáveis de
+# ambiente limpam o cache (get_settings.cache_clear(), ver tests/conftest.py).
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
     port = int(os.getenv("PORT", "8000"))
     env = os.getenv("ENV", "production")
@@ -32,8 +68,59 @@ def get_settings() -> Settings:
     langs = [lang.strip() for lang in langs if lang.strip()]
     to_images_max = int(os.getenv("PDF_TO_IMAGES_MAX_PAGES", "200"))
     ocr_max = int(os.getenv("OCR_MAX_PAGES", "50"))
+    # Processos de OCR em paralelo por processo da API/worker (0 = núcleos disponíveis)
+    ocr_workers = int(os.getenv("OCR_WORKERS", "0"))
     gs_timeout = int(os.getenv("GS_TIMEOUT_SECONDS", "120"))
     max_dpi = int(os.getenv("MAX_DPI_TO_IMAGES", "300"))
+    # Páginas renderizadas por janela (pico de memória ~ janela × página decodificada)
+    render_batch = int(os.getenv("RENDER_BATCH_PAGES", "4"))
+    # pdftoppm simultâneos por janela (0 = núcleos ÷ POOL_RENDER_WORKERS)
+    render_processes = int(os.getenv("RENDER_PROCESSES", "0"))
+    # PNG/JPEG de /to-images: poppler (pdftoppm grava o arquivo final) ou pil
+    # (PPM decodificado e recodificado no Python, o caminho antigo)
+    render_backend = os.getenv("RENDER_BACKEND", "poppler").lower()
+    # Página que é uma única imagem JPEG/Flate (scanner) sai direto do PDF, na
+    # resolução original, sem renderizar; o JPEG continua JPEG mesmo em PNG
+    extract_embedded = os.getenv("EXTRACT_EMBEDDED_IMAGES", "true").lower() == "true"
+    # Teto da imagem Flate descomprimida no processo da API; acima, o pdftoppm renderiza
+    extract_embedded_max = int(os.getenv("EXTRACT_EMBEDDED_MAX_MB", "64"))
+    # Cache de resultados por conteúdo (TMP_DIR/cache)
+    cache_enabled = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    cache_max_mb = int(os.getenv("CACHE_MAX_MB", "512"))
+    cache_ttl = int(os.getenv("CACHE_TTL_MINUTES", "60"))
+    # Pools de execução por classe de operação (workers simultâneos + fila de espera)
+    light_workers = int(os.getenv("POOL_LIGHT_WORKERS", "4"))
+    light_queue = int(os.getenv("POOL_LIGHT_QUEUE", "32"))
+    gs_workers = int(os.getenv("POOL_GS_WORKERS", "2"))
+    gs_queue = int(os.getenv("POOL_GS_QUEUE", "8"))
+    render_workers = int(os.getenv("POOL_RENDER_WORKERS", "2"))
+    render_queue = int(os.getenv("POOL_RENDER_QUEUE", "8"))
+    # Rate limit por IP: memory (por processo) ou redis (compartilhado entre réplicas)
+    rate_backend = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    rate_limit = int(os.getenv("RATE_LIMIT", "60"))
+    rate_window = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "600"))
+    # Espaço livre mínimo em TMP_DIR; abaixo disso os diretórios mais antigos saem antes do TTL
+    storage_min_free = int(os.getenv("STORAGE_MIN_FREE_MB", "512"))
+    # Downloads: direct (a API envia o arquivo) ou x-accel (nginx envia via X-Accel-Redirect)
+    download_mode = os.getenv("DOWNLOAD_MODE", "direct").lower()
+    x_accel_prefix = os.getenv("X_ACCEL_PREFIX", "/_protected")
+    # Orçamento das rotas síncronas: slots de CPU (0 = núcleos) e memória estimada
+    admission_cpu = int(os.getenv("ADMISSION_CPU_SLOTS", "0"))
+    admission_memory = int(os.getenv("ADMISSION_MEMORY_MB", "1024"))
+    # POST /api/jobs com mode=auto: roda inline se o tempo previsto couber aqui
+    auto_sync_max = float(os.getenv("AUTO_SYNC_MAX_SECONDS", "3"))
+    # GET /metrics (Prometheus); bloqueie no proxy se a API for pública
+    metrics_enabled = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Perfil sob demanda (TMP_DIR/profiles): header X-Profile-Token com este valor
+    # e/ou fração das requisições/tasks sorteadas; vazio e 0 = desligado
+    profile_token = os.getenv("PROFILE_TOKEN", "")
+    profile_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    profile_interval = int(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    profile_max_mb = int(os.getenv("PROFILE_MAX_MB", "64"))
+    # Linha do tempo de cada job (GET /api/jobs/{id}/trace) e, opcionalmente, todos
+    # os spans em JSON lines num arquivo para um coletor
+    trace_enabled = os.getenv("TRACE_ENABLED", "true").lower() == "true"
+    trace_file = os.getenv("TRACE_FILE", "")
     return Settings(
         PORT=port,
         ENV=env,
@@ -45,6 +132,37 @@ def get_settings() -> Settings:
         OCR_LANGS=langs,
         PDF_TO_IMAGES_MAX_PAGES=to_images_max,
         OCR_MAX_PAGES=ocr_max,
+        OCR_WORKERS=ocr_workers,
         GS_TIMEOUT_SECONDS=gs_timeout,
         MAX_DPI_TO_IMAGES=max_dpi,
+        RENDER_BATCH_PAGES=render_batch,
+        RENDER_PROCESSES=render_processes,
+        RENDER_BACKEND=render_backend,
+        EXTRACT_EMBEDDED_IMAGES=extract_embedded,
+        EXTRACT_EMBEDDED_MAX_MB=extract_embedded_max,
+        CACHE_ENABLED=cache_enabled,
+        CACHE_MAX_MB=cache_max_mb,
+        CACHE_TTL_MINUTES=cache_ttl,
+        POOL_LIGHT_WORKERS=light_workers,
+        POOL_LIGHT_QUEUE=light_queue,
+        POOL_GS_WORKERS=gs_workers,
+        POOL_GS_QUEUE=gs_queue,
+        POOL_RENDER_WORKERS=render_workers,
+        POOL_RENDER_QUEUE=render_queue,
+        RATE_LIMIT_BACKEND=rate_backend,
+        RATE_LIMIT=rate_limit,
+        RATE_LIMIT_WINDOW_SECONDS=rate_window,
+        STORAGE_MIN_FREE_MB=storage_min_free,
+        DOWNLOAD_MODE=download_mode,
+        X_ACCEL_PREFIX=x_accel_prefix,
+        ADMISSION_CPU_SLOTS=admission_cpu,
+        ADMISSION_MEMORY_MB=admission_memory,
+        AUTO_SYNC_MAX_SECONDS=auto_sync_max,
+        METRICS_ENABLED=metrics_enabled,
+        PROFILE_TOKEN=profile_token,
+        PROFILE_SAMPLE_RATE=profile_rate,
+        PROFILE_INTERVAL_MS=profile_interval,
+        PROFILE_MAX_MB=profile_max_mb,
+        TRACE_ENABLED=trace_enabled,
+        TRACE_FILE=trace_file,
     )
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import sys
 import threading
 import time
 import uuid
@@ -9,13 +10,42 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import Response
 
 from app.config import Settings, get_settings
-from app.routes import health, jobs, ocr, pdf_compress, pdf_merge, pdf_split, pdf_to_images
+from app.routes import (
+    health,
+    jobs,
+    metrics,
+    ocr,
+    pdf_compress,
+    pdf_merge,
+    pdf_split,
+    pdf_to_images,
+    uploads,
+)
 from app.services.cleanup_service import cleanup_tmp_dir_periodically
+from app.utils.admission import AdmissionRejectedError
+from app.utils.executors import PoolBusyError, shutdown_pools
 from app.utils.logging import configure_logging, log_request
+from app.utils.metrics import (
+    HTTP_BYTES,
+    RATE_LIMITED,
+    REJECTED,
+    REQUEST_SECONDS,
+    clean_multiproc_dir,
+    count_bytes_out,
+    mark_process_dead,
+)
+from app.utils.profiling import PROFILE_HEADER, finish_after, should_profile, start_profile
+from app.utils.ratelimit import get_rate_limiter
 from app.utils.security import add_csp_headers
+from app.utils.spool import install_upload_spool
+from app.utils.tracing import begin as begin_trace
+from app.utils.tracing import end_after
+from app.workers.progress import close_async_client
 
 settings: Settings = get_settings()
 
@@ -23,6 +53,10 @@ settings: Settings = get_settings()
 @asynccontextmanager
 async def lifespan_ctx(_app: FastAPI):
     os.makedirs(settings.TMP_DIR, exist_ok=True)
+    # Métricas de processos de execuções anteriores deste host não somam mais
+    clean_multiproc_dir()
+    # Uploads grandes vão para TMP_DIR/spool e entram no destino por hard link
+    install_upload_spool(settings.TMP_DIR)
     th = threading.Thread(
         target=cleanup_tmp_dir_periodically,
         kwargs={
@@ -34,6 +68,13 @@ async def lifespan_ctx(_app: FastAPI):
     )
     th.start()
     yield
+    shutdown_pools()
+    await close_async_client()
+    # O serviço de OCR é importado no primeiro uso; sem ele, não há pool a fechar
+    ocr_service = sys.modules.get("app.services.ocr_service")
+    if ocr_service is not None:
+        ocr_service.shutdown_ocr_pool()
+    mark_process_dead()
 
 
 app = FastAPI(
@@ -60,19 +101,26 @@ if origins:
     )
 
 
-# Configure logging
-configure_logging()
+@app.exception_handler(PoolBusyError)
+async def pool_busy_handler(_request: Request, exc: PoolBusyError):
+    REJECTED.labels(exc.pool).inc()
+    content = {"detail": "Servidor ocupado. Tente novamente em instantes."}
+    if isinstance(exc, AdmissionRejectedError):
+        # Orçamento síncrono esgotado: o mesmo trabalho cabe na fila de jobs
+        content["jobs"] = "/api/jobs"
+    return JSONResponse(
+        content,
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
-# --- Simple in-memory rate limiter (60 req / 10 min por IP) ---
-RATE_LIMIT = 60
-WINDOW_SECONDS = 600
-_rate_store: dict[str, list[float]] = {}
-_rate_lock = threading.Lock()
+# Configure logging
+configure_logging()
 
 
 @app.middleware("http")
-async def request_context_middleware(request: Request, call_next):
+async def request_context_middleware(request: Request, call_next):  # noqa: PLR0912
     # Request ID
     request_id = str(uuid.uuid4())
     start = time.time()
@@ -89,21 +137,41 @@ async def request_context_middleware(request: Request, call_next):
             )
 
     # Rate limiting por IP
+    # (RATE_LIMIT req / RATE_LIMIT_WINDOW_SECONDS, backend em RATE_LIMIT_BACKEND)
     client_ip = request.client.host if request.client else "unknown"
-    now = time.time()
-    with _rate_lock:
-        hits = _rate_store.get(client_ip, [])
-        hits = [h for h in hits if now - h <= WINDOW_SECONDS]
-        if len(hits) >= RATE_LIMIT:
-            return Response(
-                content="Muitas requisições. Tente novamente mais tarde.",
-                status_code=429,
-                media_type="text/plain",
-            )
-        hits.append(now)
-        _rate_store[client_ip] = hits
-
-    response = await call_next(request)
+    # Partes de um upload retomável não contam: o upload já contou ao ser criado
+    upload_part = request.method in {"PATCH", "HEAD"} and request.url.path.startswith(
+        "/api/uploads/"
+    )
+    # Scrape do Prometheus também não
+    exempt = upload_part or request.url.path == "/metrics"
+    if not exempt and not await get_rate_limiter().hit(client_ip):
+        RATE_LIMITED.inc()
+        return Response(
+            content="Muitas requisições. Tente novamente mais tarde.",
+            status_code=429,
+            media_type="text/plain",
+        )
+
+    # Perfil sob demanda (token de admin ou amostragem), gravado com o X-Request-ID
+    profile = None
+    if should_profile(request.headers.get(PROFILE_HEADER), settings):
+        name = f"{request.method} {request.url.path}"
+        profile = start_profile(request_id, name, settings)
+
+    # Trace da requisição (traceId = X-Request-ID); segue para pools e Celery
+    root = None
+    if request.url.path != "/metrics":
+        root = begin_trace(request_id, f"{request.method} {request.url.path}", settings)
+
+    try:
+        response = await call_next(request)
+    except BaseException as err:
+        if root is not None:
+            root.end(error=type(err).__name__)
+        if profile is not None:
+            await run_in_threadpool(profile.finish)
+        raise
     # Add headers
     response.headers["X-Request-ID"] = request_id
     add_csp_headers(response)
@@ -111,6 +179,29 @@ async def request_context_middleware(request: Request, call_next):
     # Logging
     duration_ms = int((time.time() - start) * 1000)
     log_request(request, response.status_code, request_id, duration_ms)
+
+    # Métricas por rota (template do path, não o path com ids)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    REQUEST_SECONDS.labels(route, request.method, response.status_code).observe(time.time() - start)
+    if content_length and content_length.isdigit():
+        HTTP_BYTES.labels(route, "in").inc(int(content_length))
+    if hasattr(response, "body_iterator"):
+        response.body_iterator = count_bytes_out(response.body_iterator, route)
+    if root is not None:
+        root.name = f"{request.method} {route}"
+        root.attributes["status"] = response.status_code
+        if hasattr(response, "body_iterator"):
+            response.body_iterator = end_after(response.body_iterator, root)
+        else:
+            root.end()
+    if profile is not None:
+        profile.name = f"{request.method} {route}"
+        response.headers["X-Profile-Id"] = request_id
+        # Streaming (split, to-images): o trabalho continua até o último chunk
+        if hasattr(response, "body_iterator"):
+            response.body_iterator = finish_after(response.body_iterator, profile)
+        else:
+            await run_in_threadpool(profile.finish)
     return response
 
 
@@ -121,4 +212,6 @@ app.include_router(pdf_compress.router, prefix="/api/pdf", tags=["pdf"])
 app.include_router(pdf_to_images.router, prefix="/api/pdf", tags=["pdf"])
 app.include_router(ocr.router, prefix="/api", tags=["ocr"])
 app.include_router(jobs.router, prefix="/api", tags=["jobs"])
+app.include_router(uploads.router, prefix="/api", tags=["uploads"])
 app.include_router(health.router, prefix="/api", tags=["health"])
+app.include_router(metrics.router, tags=["metrics"])
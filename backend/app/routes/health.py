@@ -1,10 +1,23 @@
 from __future__ import annotations
 
+from typing import Any
+
 from fastapi import APIRouter
 
+from app.services.cache_service import cache_stats
+from app.utils.admission import get_admission
+from app.utils.dispatch import get_service_times
+from app.utils.executors import pools_stats
+
 router = APIRouter()
 
 
 @router.get("/health")
-async def health() -> dict[str, str]:
-    return {"status": "ok"}
+async def health() -> dict[str, Any]:
+    return {
+        "status": "ok",
+        "pools": pools_stats(),
+        "admission": get_admission().stats(),
+        "dispatch": get_service_times().stats(),
+        "cache": cache_stats(),
+    }
@@ -1,19 +1,36 @@
 from __future__ import annotations
 
+import json
 import os
+import time
+from collections.abc import Callable
 from typing import Any, Literal
+from uuid import uuid4
 
 from fastapi import APIRouter, Depends, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
-from pypdf import PdfReader
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 from app.config import Settings
 from app.deps import get_app_settings
-from app.utils.files import save_upload, secure_tmp_join
-from app.utils.mime import is_pdf
+from app.services.artifact_service import artifact_response
+from app.services.pipeline_service import PipelineError, parse_steps, run_step
+from app.services.storage_service import Workspace, get_storage
+from app.services.upload_service import (
+    parse_upload_ids,
+    save_any_input,
+    save_pdf_input,
+    save_pdfs_for_merge_input,
+)
+from app.utils.admission import admit
+from app.utils.cost import estimate_cost, priority_for
+from app.utils.dispatch import cost_header, record, refresh, run_inline
+from app.utils.executors import PoolBusyError, run_in_pool
+from app.utils.ingest import IngestedFile, page_count
 from app.utils.ranges import RangeParseError, parse_ranges
 from app.utils.security import is_uuid4
-from app.utils.validators import stream_save_pdf, stream_save_pdfs_for_merge
+from app.utils.tracing import TRACE_FILENAME, bind_job, read_spans, span, timeline
+from app.workers.progress import TERMINAL_STATUSES, JobEvents, status_payload
 
 # Importações de Celery/tarefas são feitas sob demanda dentro das rotas
 # para evitar falhas de import quando o ambiente não possui Celery runtime
@@ -22,8 +39,108 @@ from app.utils.validators import stream_save_pdf, stream_save_pdfs_for_merge
 router = APIRouter()
 
 
-JobType = Literal["merge", "split", "compress", "to-images", "ocr"]
+JobType = Literal["merge", "split", "compress", "to-images", "ocr", "pipeline"]
+# async: sempre enfileira; auto: o servidor decide pelo trabalho estimado
+JobMode = Literal["async", "auto"]
 MIN_FILES_FOR_MERGE = 2
+SSE_HEARTBEAT_SECONDS = 15
+SSE_MAX_SECONDS = 3600
+
+
+# Custo estimado: prioridade na fila e base da previsão de tempo do mode=auto
+def _cost(
+    op: str, uploads: list[IngestedFile], *, pages: int | None = None, dpi: int | None = None
+) -> float:
+    if pages is None and all(u.page_count is not None for u in uploads):
+        pages = sum(u.page_count or 0 for u in uploads)
+    return estimate_cost(op, pages=pages, size_bytes=sum(u.size for u in uploads), dpi=dpi)
+
+
+# Pool da API por operação, para a execução inline (mesma divisão das filas)
+_INLINE_POOLS = {"compress": "gs", "to-images": "render", "ocr": "render"}
+
+
+def _timed_step(  # noqa: PLR0913
+    step: dict[str, Any],
+    paths: list[str],
+    digests: list[str],
+    out_base: str,
+    *,
+    pages: int | None,
+    cost: float,
+    settings: Settings,
+) -> Any:
+    """run_step no pool da API; o tempo (sem a espera no pool) vai para o modelo."""
+    started = time.monotonic()
+    out = run_step(None, step, paths, digests, out_base, page_count=pages)
+    record(step["op"], cost, time.monotonic() - started, settings)
+    return out
+
+
+async def _run_inline(
+    ws: Workspace,
+    uploads: list[IngestedFile],
+    plan: list[dict[str, Any]],
+    costs: list[float],
+    settings: Settings,
+) -> Response:
+    """Executa as etapas na própria requisição, com o mesmo runner do worker.
+
+    Cada etapa reserva orçamento (admissão) e alimenta o modelo de tempos.
+    """
+    paths, digests = [u.path for u in uploads], [u.sha256 for u in uploads]
+    pages = uploads[0].page_count if len(uploads) == 1 else None
+    size = sum(u.size for u in uploads)
+    out = None
+    for idx, (step, cost) in enumerate(zip(plan, costs, strict=True)):
+        op = step["op"]
+        out_base = ws.file("result" if idx == len(plan) - 1 else f"step{idx + 1}")
+        try:
+            with admit(op, settings, pages=pages, size_bytes=size, dpi=step.get("dpi")):
+                out = await run_in_pool(
+                    _INLINE_POOLS.get(op, "light"),
+                    lambda s=step, p=paths, d=digests, b=out_base, n=pages, c=cost: _timed_step(
+                        s, p, d, b, pages=n, cost=c, settings=settings
+                    ),
+                )
+        except PoolBusyError:
+            raise
+        except Exception as e:  # Mesmos erros que a task registraria como FAILURE
+            raise HTTPException(status_code=500, detail=f"Falha ao processar: {e}") from e
+        paths, digests, pages = out.paths, out.digests, None
+        size = sum(os.path.getsize(p) for p in paths)
+    return artifact_response(
+        out.paths[0], out.content_type, out.filename, settings, workspace_id=ws.id
+    )
+
+
+async def _dispatch(  # noqa: PLR0913
+    mode: JobMode,
+    ws: Workspace,
+    uploads: list[IngestedFile],
+    plan: list[dict[str, Any]],
+    costs: list[float],
+    *,
+    settings: Settings,
+    submit: Callable[[], None],
+) -> Any:
+    """Inline (resultado na resposta) ou fila (jobId); async mantém o 200 de sempre."""
+    if mode == "auto":
+        await refresh(settings)
+    if mode == "auto" and run_inline(
+        list(zip([s["op"] for s in plan], costs, strict=True)), settings
+    ):
+        try:
+            return await _run_inline(ws, uploads, plan, costs, settings)
+        except PoolBusyError:
+            if not settings.ASYNC_JOBS:
+                raise
+            # Orçamento síncrono (ou pool) esgotado: o trabalho vai para a fila
+    with span("enqueue", ops=[s["op"] for s in plan]):
+        submit()
+    if mode == "auto":
+        return JSONResponse({"jobId": ws.id}, status_code=202)
+    return {"jobId": ws.id}
 
 
 @router.post("/jobs")
@@ -39,108 +156,208 @@ async def create_job(  # noqa: PLR0913, PLR0912, PLR0915
     format: str | None = Form(None),
     dpi: int | None = Form(None),
     lang: str | None = Form(None),
+    # upload retomável (/api/uploads) no lugar de file/files
+    upload_id: str | None = Form(None),
+    upload_ids: str | None = Form(None),
+    # pipeline: lista JSON de etapas, ex. [{"op":"merge"},{"op":"compress","quality":"low"}]
+    steps: str | None = Form(None),
+    # auto: pequeno roda inline (200 + arquivo), grande vira job (202 + jobId)
+    mode: JobMode = Form("async"),
 ):
-    if not settings.ASYNC_JOBS:
+    if not settings.ASYNC_JOBS and mode != "auto":
         raise HTTPException(status_code=400, detail="Jobs assíncronos desabilitados")
 
-    tmp = settings.TMP_DIR
-
-    if type == "merge":
-        if not files or len(files) < MIN_FILES_FOR_MERGE:
-            raise HTTPException(status_code=400, detail="Envie 2+ PDFs para merge")
-        total_limit = 100 * 1024 * 1024
-        max_bytes = settings.MAX_FILE_MB * 1024 * 1024
-        inputs = await stream_save_pdfs_for_merge(files, tmp, max_bytes, total_limit)
-        from app.workers import tasks  # noqa: PLC0415  # import tardio
-
-        res = tasks.task_merge.apply_async(kwargs={"tmp_dir": tmp, "inputs": inputs})
-        return {"jobId": res.id}
-
-    if type == "split":
-        if not file:
-            raise HTTPException(status_code=400, detail="Envie o PDF")
-        input_path = await stream_save_pdf(
-            file, tmp, settings.MAX_FILE_MB * 1024 * 1024, "Apenas PDF é aceito"
-        )
-        if not ranges:
-            raise HTTPException(status_code=400, detail="Informe ranges")
-        total = len(PdfReader(input_path).pages)
-        try:
-            pr = parse_ranges(ranges, total)
-        except RangeParseError as e:
-            raise HTTPException(status_code=400, detail=str(e)) from e
-        from app.workers import tasks  # noqa: PLC0415  # import tardio
-
-        res = tasks.task_split.apply_async(
-            kwargs={"tmp_dir": tmp, "input_path": input_path, "ranges": pr}
-        )
-        return {"jobId": res.id}
-
-    if type == "compress":
-        if not file:
-            raise HTTPException(status_code=400, detail="Envie o PDF")
-        input_path = await stream_save_pdf(
-            file, tmp, settings.MAX_FILE_MB * 1024 * 1024, "Apenas PDF é aceito"
-        )
-        if quality not in {"low", "medium", "high"}:
-            raise HTTPException(status_code=400, detail="quality inválido")
-        from app.workers import tasks  # noqa: PLC0415  # import tardio
-
-        res = tasks.task_compress.apply_async(
-            kwargs={
-                "tmp_dir": tmp,
-                "input_path": input_path,
-                "quality": quality,
-            }
-        )
-        return {"jobId": res.id}
-
-    if type == "to-images":
-        if not file:
-            raise HTTPException(status_code=400, detail="Envie o PDF")
-        input_path = await stream_save_pdf(
-            file, tmp, settings.MAX_FILE_MB * 1024 * 1024, "Apenas PDF é aceito"
-        )
-        if format not in {"jpg", "png"} or not dpi:
-            raise HTTPException(status_code=400, detail="Parâmetros inválidos")
-        from app.workers import tasks  # noqa: PLC0415  # import tardio
-
-        res = tasks.task_to_images.apply_async(
-            kwargs={
-                "tmp_dir": tmp,
-                "input_path": input_path,
-                "fmt": format,
-                "dpi": dpi,
-            }
-        )
-        return {"jobId": res.id}
-
-    if type == "ocr":
-        if not file:
-            raise HTTPException(status_code=400, detail="Envie o PDF/Imagem")
-        langs = (lang or "por").split("+")
-        if is_pdf(file.filename, file.content_type or ""):
-            input_path = await stream_save_pdf(
-                file, tmp, settings.MAX_FILE_MB * 1024 * 1024, "Apenas PDF é aceito"
+    # Id do job gerado aqui: é também o diretório de entradas e resultado (w/<id>)
+    job_id = str(uuid4())
+    storage = get_storage()
+    with storage.discard_on_error(storage.create(workspace_id=job_id)) as ws:
+        tmp = ws.path
+        # Spans desta requisição também vão para a linha do tempo do job
+        bind_job(job_id, tmp)
+
+        if type == "merge":
+            ids = parse_upload_ids(upload_ids)
+            if len(ids or files or []) < MIN_FILES_FOR_MERGE:
+                raise HTTPException(status_code=400, detail="Envie 2+ PDFs para merge")
+            total_limit = 100 * 1024 * 1024
+            max_bytes = settings.MAX_FILE_MB * 1024 * 1024
+            uploads = await save_pdfs_for_merge_input(files, ids, tmp, max_bytes, total_limit)
+            cost = _cost("merge", uploads)
+
+            def submit() -> None:
+                from app.workers import tasks  # noqa: PLC0415  # import tardio
+
+                tasks.task_merge.apply_async(
+                    kwargs={
+                        "tmp_dir": tmp,
+                        "inputs": [u.path for u in uploads],
+                        "digests": [u.sha256 for u in uploads],
+                    },
+                    task_id=job_id,
+                    priority=priority_for(cost),
+                    headers=cost_header("merge", cost),
+                )
+
+            plan = [{"op": "merge"}]
+            return await _dispatch(
+                mode, ws, uploads, plan, [cost], settings=settings, submit=submit
             )
-        else:
-            data = await file.read()
-            if len(data) > settings.MAX_FILE_MB * 1024 * 1024:
-                raise HTTPException(status_code=413, detail="Arquivo excede o limite de tamanho")
-            # Reutiliza caminho simples para imagens
-            input_path = save_upload(tmp, file.filename, data)
-        from app.workers import tasks  # noqa: PLC0415  # import tardio
-
-        res = tasks.task_ocr.apply_async(
-            kwargs={
-                "tmp_dir": tmp,
-                "input_path": input_path,
-                "langs": langs,
-            }
-        )
-        return {"jobId": res.id}
-
-    raise HTTPException(status_code=400, detail="Tipo de job inválido")
+
+        if type == "split":
+            if not (file or upload_id):
+                raise HTTPException(status_code=400, detail="Envie o PDF")
+            upload = await save_pdf_input(file, upload_id, tmp, settings.MAX_FILE_MB * 1024 * 1024)
+            if not ranges:
+                raise HTTPException(status_code=400, detail="Informe ranges")
+            total = page_count(upload)
+            try:
+                pr = parse_ranges(ranges, total)
+            except RangeParseError as e:
+                raise HTTPException(status_code=400, detail=str(e)) from e
+            cost = _cost("split", [upload], pages=total)
+
+            def submit() -> None:
+                from app.workers import tasks  # noqa: PLC0415  # import tardio
+
+                tasks.task_split.apply_async(
+                    kwargs={
+                        "tmp_dir": tmp,
+                        "input_path": upload.path,
+                        "ranges": pr,
+                        "digests": [upload.sha256],
+                    },
+                    task_id=job_id,
+                    priority=priority_for(cost),
+                    headers=cost_header("split", cost),
+                )
+
+            plan = [{"op": "split", "ranges": pr}]
+            return await _dispatch(
+                mode, ws, [upload], plan, [cost], settings=settings, submit=submit
+            )
+
+        if type == "compress":
+            if not (file or upload_id):
+                raise HTTPException(status_code=400, detail="Envie o PDF")
+            upload = await save_pdf_input(file, upload_id, tmp, settings.MAX_FILE_MB * 1024 * 1024)
+            if quality not in {"low", "medium", "high"}:
+                raise HTTPException(status_code=400, detail="quality inválido")
+            cost = _cost("compress", [upload])
+
+            def submit() -> None:
+                from app.workers import tasks  # noqa: PLC0415  # import tardio
+
+                tasks.task_compress.apply_async(
+                    kwargs={
+                        "tmp_dir": tmp,
+                        "input_path": upload.path,
+                        "quality": quality,
+                        "digests": [upload.sha256],
+                    },
+                    task_id=job_id,
+                    priority=priority_for(cost),
+                    headers=cost_header("compress", cost),
+                )
+
+            plan = [{"op": "compress", "quality": quality}]
+            return await _dispatch(
+                mode, ws, [upload], plan, [cost], settings=settings, submit=submit
+            )
+
+        if type == "to-images":
+            if not (file or upload_id):
+                raise HTTPException(status_code=400, detail="Envie o PDF")
+            upload = await save_pdf_input(file, upload_id, tmp, settings.MAX_FILE_MB * 1024 * 1024)
+            if format not in {"jpg", "png"} or not dpi:
+                raise HTTPException(status_code=400, detail="Parâmetros inválidos")
+            cost = _cost("to-images", [upload], dpi=dpi)
+
+            def submit() -> None:
+                from app.workers import tasks  # noqa: PLC0415  # import tardio
+
+                tasks.task_to_images.apply_async(
+                    kwargs={
+                        "tmp_dir": tmp,
+                        "input_path": upload.path,
+                        "fmt": format,
+                        "dpi": dpi,
+                        "digests": [upload.sha256],
+                        "page_count": upload.page_count,
+                    },
+                    task_id=job_id,
+                    priority=priority_for(cost),
+                    headers=cost_header("to-images", cost),
+                )
+
+            plan = [{"op": "to-images", "fmt": format, "dpi": dpi}]
+            return await _dispatch(
+                mode, ws, [upload], plan, [cost], settings=settings, submit=submit
+            )
+
+        if type == "ocr":
+            if not (file or upload_id):
+                raise HTTPException(status_code=400, detail="Envie o PDF/Imagem")
+            langs = (lang or "por").split("+")
+            upload = await save_any_input(file, upload_id, tmp, settings.MAX_FILE_MB * 1024 * 1024)
+            input_path, input_hash = upload.path, upload.sha256
+            is_pdf_path = input_path.lower().endswith(".pdf")
+            cost = _cost("ocr", [upload], pages=upload.page_count if is_pdf_path else 1)
+
+            def submit() -> None:
+                from app.workers import tasks  # noqa: PLC0415  # import tardio
+
+                tasks.task_ocr.apply_async(
+                    kwargs={
+                        "tmp_dir": tmp,
+                        "input_path": input_path,
+                        "langs": langs,
+                        "digests": [input_hash],
+                    },
+                    task_id=job_id,
+                    priority=priority_for(cost),
+                    headers=cost_header("ocr", cost),
+                )
+
+            plan = [{"op": "ocr", "langs": langs}]
+            return await _dispatch(
+                mode, ws, [upload], plan, [cost], settings=settings, submit=submit
+            )
+
+        if type == "pipeline":
+            if not steps:
+                raise HTTPException(status_code=400, detail="Informe steps")
+            max_bytes = settings.MAX_FILE_MB * 1024 * 1024
+            ids = parse_upload_ids(upload_ids)
+            if ids or files:
+                uploads = await save_pdfs_for_merge_input(
+                    files, ids, tmp, max_bytes, 100 * 1024 * 1024
+                )
+            else:
+                uploads = [await save_pdf_input(file, upload_id, tmp, max_bytes)]
+            try:
+                plan = parse_steps(steps, len(uploads), settings)
+            except PipelineError as e:
+                raise HTTPException(status_code=400, detail=str(e)) from e
+            costs = [_cost(s["op"], uploads, dpi=s.get("dpi")) for s in plan]
+
+            def submit() -> None:
+                from app.workers import tasks  # noqa: PLC0415  # import tardio
+
+                # Etapas encadeadas no worker: intermediários não voltam para a API
+                tasks.submit_pipeline(
+                    job_id,
+                    tmp,
+                    [u.path for u in uploads],
+                    [u.sha256 for u in uploads],
+                    plan,
+                    page_count=uploads[0].page_count if len(uploads) == 1 else None,
+                    priority=priority_for(sum(costs)),
+                    costs=costs,
+                )
+
+            return await _dispatch(mode, ws, uploads, plan, costs, settings=settings, submit=submit)
+
+        raise HTTPException(status_code=400, detail="Tipo de job inválido")
 
 
 @router.get("/jobs/{job_id}")
@@ -150,41 +367,88 @@ async def job_status(job_id: str):
     except Exception as err:  # noqa: BLE001
         raise HTTPException(status_code=503, detail="Fila de jobs indisponível") from err
     ar = _celery.AsyncResult(job_id)
-    if ar.state == "PENDING":
-        return {"status": "queued", "progress": 0}
-    if ar.state == "STARTED":
-        return {"status": "running", "progress": 50}
-    if ar.state == "SUCCESS":
-        payload: dict[str, Any] = ar.result or {}
-        return {
-            "status": "done",
-            "progress": 100,
-            "resultUrl": f"/api/jobs/{job_id}/download",
-            "contentType": payload.get("content_type"),
-        }
-    if ar.state == "FAILURE":
-        return {"status": "error", "progress": 100}
-    return {"status": ar.state.lower(), "progress": 0}
+    # PROGRESS traz etapa e páginas/partes feitas (reportadas pela task)
+    return status_payload(job_id, ar.state, ar.info)
+
+
+@router.get("/jobs/{job_id}/trace")
+async def job_trace(job_id: str):
+    """Linha do tempo do job: requisição, fila, etapas do worker (spans em ordem)."""
+    if not is_uuid4(job_id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+    ws = get_storage().open(job_id)
+    spans = await run_in_threadpool(read_spans, ws.file(TRACE_FILENAME)) if ws else []
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace do job não encontrado")
+    return {"jobId": job_id, **timeline(spans)}
+
+
+def _sse(event: dict[str, Any]) -> bytes:
+    return f"event: status\ndata: {json.dumps(event)}\n\n".encode()
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Status do job por Server-Sent Events: estado atual e depois cada mudança
+    publicada pelo worker (pub/sub do Redis), sem polling.
+    """
+    if not is_uuid4(job_id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+    try:
+        from app.workers.celery_app import celery as _celery  # noqa: PLC0415  # import tardio
+
+        # Assina antes de ler o estado: nenhuma mudança entre as duas leituras se perde
+        events = await JobEvents.open(job_id)
+    except Exception as err:  # noqa: BLE001
+        raise HTTPException(status_code=503, detail="Fila de jobs indisponível") from err
+
+    async def stream():
+        try:
+            ar = _celery.AsyncResult(job_id)
+            state, info = await run_in_threadpool(lambda: (ar.state, ar.info))
+            event = status_payload(job_id, state, info)
+            yield _sse(event)
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while event["status"] not in TERMINAL_STATUSES and time.monotonic() < deadline:
+                received = await events.next(SSE_HEARTBEAT_SECONDS)
+                if received is None:
+                    # Comentário SSE: mantém proxies/conexão abertos
+                    yield b": ping\n\n"
+                    continue
+                event = received
+                yield _sse(event)
+        finally:
+            await events.close()
+
+    headers = {"Cache-Control": "no-store", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
 
 
 @router.get("/jobs/{job_id}/download")
 async def job_download(job_id: str, settings: Settings = Depends(get_app_settings)):
     if not is_uuid4(job_id):
         raise HTTPException(status_code=400, detail="ID inválido")
-    # tenta deduzir extensão comum
-    for ext, mime in (
-        (".pdf", "application/pdf"),
-        (".zip", "application/zip"),
-        (".txt", "text/plain"),
-    ):
-        try:
-            path = secure_tmp_join(settings.TMP_DIR, f"job-{job_id}{ext}")
-        except ValueError:
-            continue
-        if os.path.exists(path):
-            headers = {
-                "Content-Disposition": f'attachment; filename="result{ext}"',
-                "Cache-Control": "no-store",
-            }
-            return FileResponse(path, media_type=mime, headers=headers)
-    raise HTTPException(status_code=404, detail="Resultado do job não encontrado")
+    try:
+        from app.workers.celery_app import celery as _celery  # noqa: PLC0415  # import tardio
+    except Exception as err:  # noqa: BLE001
+        raise HTTPException(status_code=503, detail="Fila de jobs indisponível") from err
+    # Local, tamanho e hash do resultado vêm do backend do Celery (gravados pela task)
+    ar = _celery.AsyncResult(job_id)
+    state, info = await run_in_threadpool(lambda: (ar.state, ar.info))
+    ws = get_storage().open(job_id)
+    if state != "SUCCESS" or not isinstance(info, dict) or ws is None:
+        raise HTTPException(status_code=404, detail="Resultado do job não encontrado")
+    path = ws.file(info.get("path") or "")
+    if not os.path.isfile(path):
+        # Diretório do job expirou
+        raise HTTPException(status_code=404, detail="Resultado do job não encontrado")
+    headers = {"Cache-Control": "no-store"}
+    if info.get("sha256"):
+        headers["ETag"] = f'"{info["sha256"]}"'
+    return artifact_response(
+        path,
+        info.get("content_type") or "application/octet-stream",
+        info.get("filename") or os.path.basename(path),
+        settings,
+        headers=headers,
+    )
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from app.config import Settings
+from app.deps import get_app_settings
+from app.utils.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(settings: Settings = Depends(get_app_settings)) -> Response:
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # Coleta lê os arquivos mmap dos processos e consulta o Redis: fora do event loop
+    body, content_type = await run_in_threadpool(render_metrics)
+    return Response(body, media_type=content_type)
@@ -7,35 +7,42 @@ from fastapi.responses import FileResponse, JSONResponse
 
 from app.config import Settings
 from app.deps import get_app_settings
-from app.services.ocr_service import ocr_pdf_or_image, save_text
-from app.utils.files import save_upload, secure_tmp_join
+from app.services.cache_service import cached_text, make_key
+from app.services.storage_service import get_storage
+from app.services.upload_service import save_any_input
+from app.utils.admission import admit
+from app.utils.executors import PoolBusyError, run_in_pool
 from app.utils.mime import is_image, is_pdf
 from app.utils.security import is_uuid4
-from app.utils.validators import stream_save_pdf
 
 router = APIRouter()
 
+# Texto reconhecido, no diretório da requisição (o id devolvido é o do diretório)
+RESULT_NAME = "result.txt"
+
+
+def admission_pages(path: str, page_count: int | None, max_pages: int) -> int:
+    """Páginas que o OCR vai processar, para reservar o orçamento.
+
+    Imagem avulsa é uma página; PDF sem contagem barata (ver PdfScanner) conta
+    como o teto OCR_MAX_PAGES, não como uma página só.
+    """
+    if not path.lower().endswith(".pdf"):
+        return 1
+    return min(page_count or max_pages, max_pages)
+
 
 @router.post("/ocr")
 async def ocr_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
     lang: str = Form("por", description="por|eng|por+eng"),
+    upload_id: str | None = Form(None, description="uploadId de /api/uploads"),
     settings: Settings = Depends(get_app_settings),
 ):
-    ct = file.content_type
-    if not (is_pdf(file.filename, ct) or is_image(file.filename, ct)):
+    ct = file.content_type if file is not None else None
+    if file is not None and not (is_pdf(file.filename, ct) or is_image(file.filename, ct)):
         raise HTTPException(status_code=415, detail="Apenas PDF/JPG/PNG são aceitos")
 
-    if is_pdf(file.filename, ct):
-        input_path = await stream_save_pdf(
-            file, settings.TMP_DIR, settings.MAX_FILE_MB * 1024 * 1024, "Apenas PDF é aceito"
-        )
-    else:
-        data = await file.read()
-        if len(data) > settings.MAX_FILE_MB * 1024 * 1024:
-            raise HTTPException(status_code=413, detail="Arquivo excede o limite de tamanho")
-        input_path = save_upload(settings.TMP_DIR, file.filename, data)
-
     # Sanitiza idiomas e valida contra configuração
     langs = [s for s in lang.split("+") if s]
     if not langs:
@@ -47,37 +54,51 @@ async def ocr_endpoint(
             detail=(f"Idiomas não suportados. Permitidos: {', '.join(settings.OCR_LANGS)}"),
         )
 
-    try:
-        text = ocr_pdf_or_image(input_path, langs)
-    except Exception as e:  # Mapeia erros comuns de runtime (tesseract/poppler)
-        # Mensagens típicas: falta 'pdftoppm' (poppler), falta 'por.traineddata', etc.
-        msg = str(e)
-        # Remove caminho temporário antes de retornar
-        try:
-            os.remove(input_path)
-        except Exception:  # noqa: BLE001
-            pass
-        raise HTTPException(status_code=500, detail=f"Falha no OCR: {msg}") from e
-    finally:
+    # pytesseract/pdf2image/PIL só no primeiro OCR: fora da partida do processo
+    from app.services import ocr_service  # noqa: PLC0415  # import tardio
+
+    max_bytes = settings.MAX_FILE_MB * 1024 * 1024
+    storage = get_storage()
+    with storage.discard_on_error(storage.create()) as ws:
+        # Multipart ou upload retomável (PDF ou imagem, validado no complete)
+        upload = await save_any_input(file, upload_id, ws.path, max_bytes)
+        input_path, input_hash = upload.path, upload.sha256
+
         try:
-            os.remove(input_path)
-        except Exception:  # noqa: BLE001
-            pass
+            # OCR_MAX_PAGES muda o texto gerado: faz parte da chave
+            params = {"langs": langs, "maxPages": settings.OCR_MAX_PAGES}
+            key = make_key("ocr", [input_hash], params)
+            pages = admission_pages(input_path, upload.page_count, settings.OCR_MAX_PAGES)
+            with admit("ocr", settings, pages=pages, size_bytes=upload.size):
+                text = await run_in_pool(
+                    "render",
+                    cached_text,
+                    key,
+                    lambda: ocr_service.ocr_pdf_or_image(input_path, langs),
+                )
+        except PoolBusyError:
+            raise
+        except Exception as e:  # Mapeia erros comuns de runtime (tesseract/poppler)
+            # Mensagens típicas: falta 'pdftoppm' (poppler), falta 'por.traineddata', etc.
+            raise HTTPException(status_code=500, detail=f"Falha no OCR: {e}") from e
+        finally:
+            try:
+                os.remove(input_path)
+            except Exception:  # noqa: BLE001
+                pass
 
-    txt_path = save_text(settings.TMP_DIR, text)
-    oid = os.path.splitext(os.path.basename(txt_path))[0]
-    return JSONResponse({"text": text, "id": oid})
+        # Só o texto fica, até o TTL, para /ocr/download/{id}
+        ocr_service.save_text(ws.path, text, RESULT_NAME)
+    return JSONResponse({"text": text, "id": ws.id})
 
 
 @router.get("/ocr/download/{id}", response_class=FileResponse)
 async def ocr_download(id: str, settings: Settings = Depends(get_app_settings)):
     if not is_uuid4(id):
         raise HTTPException(status_code=400, detail="ID inválido")
-    try:
-        path = secure_tmp_join(settings.TMP_DIR, f"{id}.txt")
-    except ValueError as err:  # noqa: BLE001
-        raise HTTPException(status_code=400, detail="ID inválido") from err
-    if not os.path.exists(path):
+    ws = get_storage().open(id)
+    path = ws.file(RESULT_NAME) if ws is not None else ""
+    if not path or not os.path.exists(path):
         raise HTTPException(status_code=404, detail="Resultado não encontrado")
     headers = {
         "Content-Disposition": f'attachment; filename="{id}.txt"',
@@ -1,42 +1,50 @@
 from __future__ import annotations
 
-import os
-from uuid import uuid4
-
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from fastapi.responses import FileResponse
-from starlette.background import BackgroundTask
 
 from app.config import Settings
 from app.deps import get_app_settings
+from app.services.artifact_service import artifact_response
+from app.services.cache_service import cached_file, make_key
 from app.services.compress_service import Quality, compress_pdf
-from app.utils.validators import stream_save_pdf
+from app.services.storage_service import get_storage
+from app.services.upload_service import save_pdf_input
+from app.utils.admission import admit
+from app.utils.executors import PoolBusyError, run_in_pool
 
 router = APIRouter()
 
 
-def _cleanup_paths(paths: list[str]) -> None:
-    for p in paths:
-        try:
-            os.remove(p)
-        except Exception:
-            pass
-
-
 @router.post("/compress", response_class=FileResponse)
 async def compress_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    upload_id: str | None = Form(None, description="uploadId de /api/uploads"),
     quality: Quality = Form(..., description="low|medium|high"),
     settings: Settings = Depends(get_app_settings),
 ):
-    input_path = await stream_save_pdf(
-        file, settings.TMP_DIR, settings.MAX_FILE_MB * 1024 * 1024, "Apenas PDF é aceito"
+    storage = get_storage()
+    with storage.discard_on_error(storage.create()) as ws:
+        upload = await save_pdf_input(file, upload_id, ws.path, settings.MAX_FILE_MB * 1024 * 1024)
+        input_path = upload.path
+        out_path = ws.file("compressed.pdf")
+        try:
+            key = make_key("compress", [upload.sha256], {"quality": quality})
+            # Orçamento de CPU/memória antes de chamar o gs (503 se esgotado)
+            with admit("compress", settings, pages=upload.page_count, size_bytes=upload.size):
+                await run_in_pool(
+                    "gs",
+                    cached_file,
+                    key,
+                    out_path,
+                    lambda: compress_pdf(input_path, out_path, quality),
+                )
+        except PoolBusyError:
+            # 503 + Retry-After (handler global), não 500
+            raise
+        except RuntimeError as e:
+            raise HTTPException(status_code=500, detail=str(e)) from e
+    # Diretório da requisição sai após o envio (ou após a janela do nginx)
+    return artifact_response(
+        out_path, "application/pdf", "compressed.pdf", settings, workspace_id=ws.id
     )
-    out_path = os.path.join(settings.TMP_DIR, f"{uuid4()}-compressed.pdf")
-    try:
-        compress_pdf(input_path, out_path, quality)
-    except RuntimeError as e:
-        raise HTTPException(status_code=500, detail=str(e)) from e
-    headers = {"Content-Disposition": 'attachment; filename="compressed.pdf"'}
-    bg = BackgroundTask(_cleanup_paths, [input_path, out_path])
-    return FileResponse(out_path, media_type="application/pdf", headers=headers, background=bg)
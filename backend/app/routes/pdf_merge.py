@@ -1,46 +1,50 @@
 from __future__ import annotations
 
-import os
-from uuid import uuid4
-
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from fastapi.responses import FileResponse
-from starlette.background import BackgroundTask
 
 from app.config import Settings
 from app.deps import get_app_settings
-from app.services.merge_service import merge_pdfs
-from app.utils.validators import stream_save_pdfs_for_merge
+from app.services.artifact_service import artifact_response
+from app.services.cache_service import cached_file, make_key
+from app.services.storage_service import get_storage
+from app.services.upload_service import parse_upload_ids, save_pdfs_for_merge_input
+from app.utils.admission import admit
+from app.utils.executors import run_in_pool
 
 router = APIRouter()
 
 
-def _cleanup_paths(paths: list[str]) -> None:
-    for p in paths:
-        try:
-            os.remove(p)
-        except Exception:
-            pass
-
-
 @router.post("/merge", response_class=FileResponse)
 async def merge_endpoint(
-    files: list[UploadFile] = File(..., description="2-20 PDFs"),
+    files: list[UploadFile] | None = File(None, description="2-20 PDFs"),
+    upload_ids: str | None = Form(None, description="uploadIds de /api/uploads, na ordem"),
     settings: Settings = Depends(get_app_settings),
 ):
     MIN_FILES, MAX_FILES = 2, 20
-    if not (MIN_FILES <= len(files) <= MAX_FILES):
+    ids = parse_upload_ids(upload_ids)
+    if not (MIN_FILES <= len(ids or files or []) <= MAX_FILES):
         raise HTTPException(status_code=400, detail="Envie entre 2 e 20 PDFs")
 
+    # pypdf só no primeiro merge: fora da partida do processo
+    from app.services.merge_service import merge_pdfs  # noqa: PLC0415  # import tardio
+
     # Streaming + limite total (<= 100MB)
     max_bytes = settings.MAX_FILE_MB * 1024 * 1024
-    input_paths = await stream_save_pdfs_for_merge(
-        files, settings.TMP_DIR, max_bytes, 100 * 1024 * 1024
+    storage = get_storage()
+    with storage.discard_on_error(storage.create()) as ws:
+        uploads = await save_pdfs_for_merge_input(files, ids, ws.path, max_bytes, 100 * 1024 * 1024)
+        input_paths = [u.path for u in uploads]
+
+        # Entradas e saída no diretório da requisição, removido após o envio
+        out_path = ws.file("merged.pdf")
+        key = make_key("merge", [u.sha256 for u in uploads], {})
+        size = sum(u.size for u in uploads)
+        with admit("merge", settings, size_bytes=size):
+            await run_in_pool(
+                "light", cached_file, key, out_path, lambda: merge_pdfs(input_paths, out_path)
+            )
+    # Diretório da requisição sai após o envio (ou após a janela do nginx)
+    return artifact_response(
+        out_path, "application/pdf", "merged.pdf", settings, workspace_id=ws.id
     )
-
-    # Saída única por requisição + limpeza pós-envio
-    out_path = os.path.join(settings.TMP_DIR, f"{uuid4()}-merged.pdf")
-    merge_pdfs(input_paths, out_path)
-    headers = {"Content-Disposition": 'attachment; filename="merged.pdf"'}
-    bg = BackgroundTask(_cleanup_paths, input_paths + [out_path])
-    return FileResponse(out_path, media_type="application/pdf", headers=headers, background=bg)
@@ -1,61 +1,64 @@
 from __future__ import annotations
 
-import os
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from fastapi.responses import FileResponse
-from pypdf import PdfReader
-from starlette.background import BackgroundTask
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTasks
 
 from app.config import Settings
 from app.deps import get_app_settings
-from app.services.split_service import split_pdf
-from app.utils.files import zip_paths
+from app.services.cache_service import cached_members, make_key
+from app.services.storage_service import get_storage
+from app.services.upload_service import save_pdf_input
+from app.utils.admission import admit, release_after
+from app.utils.executors import primed_iterate_in_pool, run_in_pool
+from app.utils.ingest import page_count
 from app.utils.ranges import RangeParseError, parse_ranges
-from app.utils.validators import stream_save_pdf
+from app.utils.zipstream import iter_zip, renumbered
 
 router = APIRouter()
 
 
-def _cleanup_paths(paths: list[str]) -> None:
-    for p in paths:
-        try:
-            os.remove(p)
-        except Exception:
-            pass
-
-
-@router.post("/split", response_class=FileResponse)
+@router.post("/split")
 async def split_endpoint(
-    file: UploadFile = File(...),
+    file: UploadFile | None = File(None),
+    upload_id: str | None = Form(None, description="uploadId de /api/uploads"),
     ranges: str = Form(..., description='ex: "1-3,5,7-8"'),
     settings: Settings = Depends(get_app_settings),
 ):
-    input_path = await stream_save_pdf(file, settings.TMP_DIR, settings.MAX_FILE_MB * 1024 * 1024)
-
-    total_pages = len(PdfReader(input_path).pages)
-    try:
-        parts = parse_ranges(ranges, total_pages)
-    except RangeParseError as e:
-        raise HTTPException(status_code=400, detail=str(e)) from e
-
-    out_paths: list[str] = []
-    prefix = str(uuid4())
-    for idx, _ in enumerate(parts, start=1):
-        out_paths.append(os.path.join(settings.TMP_DIR, f"{prefix}-split-{idx}.pdf"))
-    res = split_pdf(input_path, parts, out_paths)
-    zip_path = os.path.join(settings.TMP_DIR, f"{prefix}-split.zip")
-    zip_paths(zip_path, res)
+    # pypdf só no primeiro split: fora da partida do processo
+    from app.services.split_service import iter_split_members  # noqa: PLC0415  # import tardio
+
+    storage = get_storage()
+    with storage.discard_on_error(storage.create()) as ws:
+        upload = await save_pdf_input(file, upload_id, ws.path, settings.MAX_FILE_MB * 1024 * 1024)
+        input_path = upload.path
+
+        # Contagem vem do upload; só abre o PDF quando ela não é confiável
+        total_pages = upload.page_count or await run_in_pool("light", page_count, upload)
+        try:
+            parts = parse_ranges(ranges, total_pages)
+        except RangeParseError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
+        # Cada parte vai para o ZIP (e para a rede) assim que é gerada, sem cópia em disco
+        key = make_key("split", [upload.sha256], {"ranges": parts})
+        members = cached_members(key, lambda: iter_split_members(input_path, parts))
+        chunks = iter_zip(renumbered(members, f"{uuid4()}-split-{{n}}.pdf"))
+        # Reserva vale até o fim do streaming, não só até a primeira parte
+        ticket = admit("split", settings, size_bytes=upload.size)
+        try:
+            body = release_after(await primed_iterate_in_pool("light", chunks), ticket)
+        except BaseException:
+            ticket.release()
+            raise
     headers = {
         "Content-Disposition": 'attachment; filename="split.zip"',
     }
-    # Limpa PDF de entrada, partes e zip após envio
-    to_delete = [input_path] + res + [zip_path]
-    bg = BackgroundTask(_cleanup_paths, to_delete)
-    return FileResponse(
-        zip_path,
-        media_type="application/zip",
-        headers=headers,
-        background=bg,
-    )
+    # Remove o diretório da requisição após o envio; libera a reserva mesmo se o
+    # corpo nem chegou a ser consumido
+    bg = BackgroundTasks()
+    bg.add_task(storage.remove, ws.id)
+    bg.add_task(ticket.release)
+    return StreamingResponse(body, media_type="application/zip", headers=headers, background=bg)
@@ -1,32 +1,46 @@
 from __future__ import annotations
 
-import os
-from io import BytesIO
-from zipfile import ZIP_DEFLATED, ZipFile
+from collections.abc import Iterator
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 from fastapi.responses import StreamingResponse
-from pdf2image import convert_from_path
-from pdf2image import exceptions as pdf2_exceptions
-from pypdf import PdfReader
+from starlette.background import BackgroundTasks
 
 from app.config import Settings
 from app.deps import get_app_settings
-from app.utils.validators import stream_save_pdf
+from app.services.cache_service import cached_members, make_key
+from app.services.storage_service import get_storage
+from app.services.upload_service import save_pdf_input
+from app.utils.admission import admit, release_after
+from app.utils.executors import primed_iterate_in_pool
+from app.utils.ingest import IngestedFile, page_count
+from app.utils.zipstream import iter_zip, renumbered
 
 router = APIRouter()
 
 
-def _convert_pdf_with_limits(input_path: str, dpi: int, max_pages: int):
+def _convert_pdf_with_limits(
+    upload: IngestedFile, dpi: int, max_pages: int
+) -> Iterator[tuple[int, str, bytes]]:
+    """Valida o limite de páginas e gera (página, extensão, bytes) em janelas.
+
+    PNG renderizado, ou a imagem embutida (JPEG/PNG) das páginas escaneadas.
+    """
+    # pdf2image/PIL só na primeira conversão: fora da partida do processo
+    from pdf2image import exceptions as pdf2_exceptions  # noqa: PLC0415  # import tardio
+
+    from app.services.images_service import iter_pdf_page_bytes  # noqa: PLC0415
+
     try:
-        total_pages = len(PdfReader(input_path).pages)
+        total_pages = page_count(upload)
         if total_pages > max_pages:
             raise HTTPException(
                 status_code=413,
                 detail=(f"PDF excede o limite de páginas (máx {max_pages})"),
             )
-        images = convert_from_path(input_path, dpi=dpi)
-        return images[:total_pages]
+        yield from iter_pdf_page_bytes(upload.path, "png", dpi, last_page=total_pages)
+    except HTTPException:
+        raise
     except pdf2_exceptions.PDFPageCountError as err:
         raise HTTPException(status_code=400, detail="PDF inválido ou sem páginas") from err
     except pdf2_exceptions.PDFInfoNotInstalledError as err:
@@ -39,54 +53,65 @@ def _convert_pdf_with_limits(input_path: str, dpi: int, max_pages: int):
         raise HTTPException(status_code=500, detail=f"Falha ao converter PDF: {str(err)}") from err
 
 
+def _image_members(upload: IngestedFile, dpi: int, max_pages: int) -> Iterator[tuple[str, bytes]]:
+    # Cada página sai para o ZIP antes de renderizar a próxima janela
+    count = 0
+    for idx, ext, data in _convert_pdf_with_limits(upload, dpi, max_pages):
+        yield f"page_{idx}.{ext}", data
+        count += 1
+    if not count:
+        raise HTTPException(status_code=400, detail="Nenhuma página encontrada no PDF")
+
+
 @router.post("/to-images")
 async def to_images_endpoint(
-    file: UploadFile = File(...),
-    # Mantém compat com frontend atual, mas saída será sempre PNG
+    file: UploadFile | None = File(None),
+    upload_id: str | None = Form(None, description="uploadId de /api/uploads"),
+    # Mantém compat com frontend atual; format é ignorado: páginas renderizadas
+    # saem em PNG e páginas escaneadas com a imagem embutida (JPEG como .jpg, Flate
+    # como .png), ver EXTRACT_EMBEDDED_IMAGES
     format: str = Form("png"),
     dpi: int = Form(150, ge=72, le=600),
     settings: Settings = Depends(get_app_settings),
 ):
-    # Salva em disco validando tamanho e assinatura real de PDF
-    input_path = await stream_save_pdf(
-        file, settings.TMP_DIR, settings.MAX_FILE_MB * 1024 * 1024, "Apenas PDF é aceito"
-    )
-
-    # 415 — heurística simples de JS/ações em PDF
-    # (já verificado no stream_save_pdf)
-
     # 400 — DPI acima do limite configurado
     if dpi > settings.MAX_DPI_TO_IMAGES:
-        try:
-            os.remove(input_path)
-        except Exception:
-            pass
         raise HTTPException(
             status_code=400,
             detail=(f"DPI excede o limite permitido (máx {settings.MAX_DPI_TO_IMAGES})"),
         )
 
-    try:
-        images = _convert_pdf_with_limits(input_path, dpi, settings.PDF_TO_IMAGES_MAX_PAGES)
-    finally:
-        # Limpa o PDF temporário
-        try:
-            os.remove(input_path)
-        except Exception:
-            pass
-
-    if not images:
-        raise HTTPException(status_code=400, detail="Nenhuma página encontrada no PDF")
-
-    # Monta o ZIP em memória e garante fechamento antes do envio
-    zip_buffer = BytesIO()
-    with ZipFile(zip_buffer, "w", ZIP_DEFLATED) as zf:
-        for idx, img in enumerate(images, start=1):
-            buf = BytesIO()
-            img.save(buf, format="PNG")
-            zf.writestr(f"page_{idx}.png", buf.getvalue())
+    storage = get_storage()
+    with storage.discard_on_error(storage.create()) as ws:
+        # Salva em disco validando tamanho, assinatura real de PDF e JS (415)
+        upload = await save_pdf_input(file, upload_id, ws.path, settings.MAX_FILE_MB * 1024 * 1024)
 
-    zip_buffer.seek(0)  # garante leitura desde o início
+        # Renderização + PNG + ZIP fora do event loop; a primeira página é gerada
+        # antes da resposta para que erros (413/400/500) ainda virem status HTTP
+        max_pages = settings.PDF_TO_IMAGES_MAX_PAGES
+        params = {
+            "fmt": "png",
+            "dpi": dpi,
+            "maxPages": max_pages,
+            "embedded": settings.EXTRACT_EMBEDDED_IMAGES,
+        }
+        key = make_key("to-images", [upload.sha256], params)
+        members = cached_members(key, lambda: _image_members(upload, dpi, max_pages))
+        chunks = iter_zip(renumbered(members, "page_{n}.{ext}"))
+        # Reserva vale até o fim do streaming, não só até a primeira parte
+        ticket = admit(
+            "to-images", settings, pages=upload.page_count, size_bytes=upload.size, dpi=dpi
+        )
+        try:
+            body = release_after(await primed_iterate_in_pool("render", chunks), ticket)
+        except BaseException:
+            ticket.release()
+            raise
 
     headers = {"Content-Disposition": 'attachment; filename="images.zip"'}
-    return StreamingResponse(zip_buffer, media_type="application/zip", headers=headers)
+    # Remove o diretório da requisição após o envio; libera a reserva mesmo se o
+    # corpo nem chegou a ser consumido
+    bg = BackgroundTasks()
+    bg.add_task(storage.remove, ws.id)
+    bg.add_task(ticket.release)
+    return StreamingResponse(body, media_type="application/zip", headers=headers, background=bg)
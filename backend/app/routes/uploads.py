@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Form, Header, Request, Response
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.config import Settings
+from app.deps import get_app_settings
+from app.services.upload_service import (
+    append_chunk,
+    complete_upload,
+    create_upload,
+    upload_offset,
+)
+
+router = APIRouter()
+
+# Upload retomável em partes (para conexões instáveis, ex.: app Android):
+#   POST   /uploads                  cria (filename, length) -> uploadId
+#   PATCH  /uploads/{id}             corpo = bytes a partir de Upload-Offset
+#   HEAD   /uploads/{id}             Upload-Offset atual (onde retomar)
+#   POST   /uploads/{id}/complete    valida como um upload comum
+# O uploadId finalizado vale no lugar do arquivo em /api/pdf/*, /api/ocr e /api/jobs.
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload_endpoint(
+    filename: str = Form(...),
+    length: int = Form(..., description="Tamanho total em bytes"),
+    content_type: str | None = Form(None),
+    settings: Settings = Depends(get_app_settings),
+):
+    max_bytes = settings.MAX_FILE_MB * 1024 * 1024
+    created = await run_in_threadpool(create_upload, filename, content_type, length, max_bytes)
+    headers = {"Location": f"/api/uploads/{created['uploadId']}", "Upload-Offset": "0"}
+    return JSONResponse(created, status_code=201, headers=headers)
+
+
+@router.head("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    offset, length = await run_in_threadpool(upload_offset, upload_id)
+    headers = {
+        "Upload-Offset": str(offset),
+        "Upload-Length": str(length),
+        "Cache-Control": "no-store",
+    }
+    return Response(status_code=200, headers=headers)
+
+
+@router.patch("/uploads/{upload_id}", status_code=204)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset_header: int = Header(..., alias="Upload-Offset"),
+):
+    offset = await append_chunk(upload_id, upload_offset_header, request.stream())
+    return Response(status_code=204, headers={"Upload-Offset": str(offset)})
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def upload_complete(upload_id: str):
+    # Varre o arquivo inteiro (hash + JS): fora do event loop
+    return await run_in_threadpool(complete_upload, upload_id)
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import os
+from typing import Any
+from urllib.parse import quote
+
+from fastapi.responses import FileResponse, Response
+from starlette.background import BackgroundTask
+
+from app.config import Settings
+from app.services.cache_service import file_sha256
+from app.services.storage_service import get_storage
+
+# Com X-Accel-Redirect o nginx abre o arquivo depois que a API respondeu:
+# o diretório da requisição fica mais esse tempo em vez de sair na hora
+ACCEL_GRACE_SECONDS = 120
+
+
+def describe_artifact(path: str, content_type: str, filename: str) -> dict[str, Any]:
+    """Metadados do resultado, gravados no backend do Celery junto com o status."""
+    return {
+        "path": path,
+        "size": os.path.getsize(path),
+        "content_type": content_type,
+        "sha256": file_sha256(path),
+        "filename": filename,
+    }
+
+
+def accel_uri(path: str, settings: Settings) -> str:
+    """Caminho interno do nginx para um arquivo dentro de TMP_DIR."""
+    rel = os.path.relpath(os.path.realpath(path), os.path.realpath(settings.TMP_DIR))
+    if rel.startswith(os.pardir):
+        raise ValueError("arquivo fora de TMP_DIR")
+    return f"{settings.X_ACCEL_PREFIX.rstrip('/')}/{quote(rel)}"
+
+
+def artifact_response(  # noqa: PLR0913
+    path: str,
+    media_type: str,
+    filename: str,
+    settings: Settings,
+    *,
+    workspace_id: str | None = None,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Entrega o arquivo direto (FileResponse) ou via nginx (DOWNLOAD_MODE=x-accel).
+
+    workspace_id: diretório da requisição a remover depois do envio.
+    """
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', **(headers or {})}
+    storage = get_storage()
+    if settings.DOWNLOAD_MODE == "x-accel":
+        # nginx faz o sendfile (e Range); a API só devolve os cabeçalhos
+        headers["X-Accel-Redirect"] = accel_uri(path, settings)
+        if workspace_id:
+            storage.extend(workspace_id, ACCEL_GRACE_SECONDS)
+        return Response(media_type=media_type, headers=headers)
+    bg = BackgroundTask(storage.remove, workspace_id) if workspace_id else None
+    return FileResponse(path, media_type=media_type, headers=headers, background=bg)
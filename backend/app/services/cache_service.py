@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from typing import Any
+
+from app.config import get_settings
+from app.utils.metrics import CACHE_LOOKUPS
+
+MANIFEST = "manifest.json"
+STAGING = ".staging"
+# Staging mais antigo que isso é órfão (worker morto, OOM) e é removido
+STAGING_MAX_AGE_SECONDS = 3600
+# Intervalo da varredura completa; entre varreduras o tamanho é mantido em memória
+RESCAN_SECONDS = 300
+# Contadores que também viram métrica (hit ratio no Prometheus)
+_LOOKUP_RESULTS = {"hits": "hit", "misses": "miss"}
+
+
+def make_key(op: str, digests: list[str], params: dict[str, Any]) -> str:
+    """Chave de conteúdo: hash(s) das entradas + operação + parâmetros normalizados."""
+    payload = json.dumps(
+        {"op": op, "inputs": digests, "params": params}, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class CacheStage:
+    """Entrada em construção; só fica visível no commit (rename atômico).
+
+    Resultado maior que o limite do cache é descartado assim que passa do
+    limite: guardá-lo expulsaria todas as outras entradas e depois ele mesmo.
+    """
+
+    def __init__(self, cache: ResultCache, key: str):
+        self._cache = cache
+        self._key = key
+        self._dir = os.path.join(cache.root, STAGING, uuid.uuid4().hex)
+        os.makedirs(self._dir)
+        self._names: list[str] = []
+        self._size = 0
+        self.oversize = False
+
+    def _member_path(self, name: str) -> str:
+        return os.path.join(self._dir, f"{len(self._names):05d}-{os.path.basename(name)}")
+
+    def _reserve(self, size: int) -> bool:
+        if self.oversize:
+            return False
+        self._size += size
+        if self._size > self._cache.max_bytes:
+            self.oversize = True
+            self.discard()
+            return False
+        return True
+
+    def add_bytes(self, name: str, data: bytes) -> None:
+        if not self._reserve(len(data)):
+            return
+        with open(self._member_path(name), "wb") as f:
+            f.write(data)
+        self._names.append(name)
+
+    def add_file(self, name: str, path: str) -> None:
+        if not self._reserve(os.path.getsize(path)):
+            return
+        link_or_copy(path, self._member_path(name))
+        self._names.append(name)
+
+    def commit(self) -> None:
+        if self.oversize:
+            return
+        manifest = json.dumps({"names": self._names, "created": time.time()}).encode()
+        with open(os.path.join(self._dir, MANIFEST), "wb") as f:
+            f.write(manifest)
+        self._cache._commit(self._key, self._dir, self._size + len(manifest))
+
+    def discard(self) -> None:
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def _created(entry: str) -> float:
+    """Hora de criação gravada no manifest; ilegível conta como vencida."""
+    try:
+        with open(os.path.join(entry, MANIFEST), encoding="utf-8") as f:
+            return float(json.load(f).get("created", 0))
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+class ResultCache:
+    """Cache de resultados em disco endereçado por conteúdo.
+
+    Cada entrada é um diretório <root>/<kk>/<key>/ com os arquivos de saída e um
+    manifest. Leitura atualiza o mtime (LRU); entradas vencem pelo TTL contado
+    do "created" do manifest (em get e em evict); o tamanho total é limitado removendo as menos usadas. Escritas vão
+    para .staging e entram com rename, então vários processos podem compartilhar
+    o mesmo diretório.
+    """
+
+    def __init__(self, root: str, max_bytes: int, ttl_seconds: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # Tamanho estimado (None = ainda não varrido) e hora da última varredura
+        self._size: int | None = None
+        self._last_scan = 0.0
+        os.makedirs(os.path.join(root, STAGING), exist_ok=True)
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+        if name in _LOOKUP_RESULTS:
+            CACHE_LOOKUPS.labels(_LOOKUP_RESULTS[name]).inc(n)
+
+    def get(self, key: str) -> list[tuple[str, str]] | None:
+        """Retorna [(nome, caminho)] na ordem original, ou None (miss)."""
+        entry = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry, MANIFEST), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+        if time.time() - manifest.get("created", 0) > self.ttl_seconds:
+            # Mesma regra do evict: o TTL conta da criação, não do último uso
+            self._remove(entry)
+            self._count("misses")
+            return None
+        names: list[str] = manifest["names"]
+        paths = [os.path.join(entry, f"{i:05d}-{os.path.basename(n)}") for i, n in enumerate(names)]
+        if not all(os.path.exists(p) for p in paths):
+            self._count("misses")
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        self._count("hits")
+        return list(zip(names, paths, strict=True))
+
+    def stage(self, key: str) -> CacheStage:
+        return CacheStage(self, key)
+
+    def put_files(self, key: str, paths: list[str]) -> None:
+        stage = self.stage(key)
+        try:
+            for p in paths:
+                stage.add_file(os.path.basename(p), p)
+            stage.commit()
+        except BaseException:
+            stage.discard()
+            raise
+
+    def _commit(self, key: str, staged_dir: str, size: int) -> None:
+        entry = self._entry_dir(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        try:
+            os.rename(staged_dir, entry)
+        except OSError:
+            # Outro processo já gravou a mesma chave
+            shutil.rmtree(staged_dir, ignore_errors=True)
+            return
+        self._count("stores")
+        with self._lock:
+            if self._size is not None:
+                self._size += size
+            due = (
+                self._size is None
+                or self._size > self.max_bytes
+                or time.time() - self._last_scan > RESCAN_SECONDS
+            )
+        # Varredura completa só quando o limite estoura ou a estimativa envelhece
+        # (outros processos também gravam no mesmo diretório)
+        if due:
+            self.evict()
+
+    def _remove(self, entry: str) -> None:
+        # Renomeia antes de apagar: leitores nunca veem entrada pela metade
+        trash = os.path.join(self.root, STAGING, f"rm-{uuid.uuid4().hex}")
+        try:
+            os.rename(entry, trash)
+        except OSError:
+            return
+        shutil.rmtree(trash, ignore_errors=True)
+
+    def _entries(self) -> list[tuple[float, float, int, str]]:
+        """(último uso, criação, tamanho, caminho) de cada entrada."""
+        entries: list[tuple[float, float, int, str]] = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name == STAGING:
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    mtime = entry.stat().st_mtime
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                except OSError:
+                    continue
+                entries.append((mtime, _created(entry.path), size, entry.path))
+        return entries
+
+    def _sweep_staging(self, now: float) -> None:
+        for item in os.scandir(os.path.join(self.root, STAGING)):
+            try:
+                if now - item.stat().st_mtime > STAGING_MAX_AGE_SECONDS:
+                    shutil.rmtree(item.path, ignore_errors=True)
+            except OSError:
+                continue
+
+    def evict(self) -> int:
+        """Remove entradas vencidas, staging órfão e, acima do limite, as menos usadas (LRU)."""
+        now = time.time()
+        self._sweep_staging(now)
+        entries = sorted(self._entries())
+        total = sum(size for _mtime, _created, size, _path in entries)
+        removed = 0
+        for _mtime, created, size, path in entries:
+            expired = now - created > self.ttl_seconds
+            if not expired and total <= self.max_bytes:
+                continue
+            self._remove(path)
+            total -= size
+            removed += 1
+        with self._lock:
+            self._size = total
+            self._last_scan = now
+        if removed:
+            self._count("evictions", removed)
+        return removed
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+
+_caches: dict[tuple[str, int, int], ResultCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache | None:
+    settings = get_settings()
+    if not settings.CACHE_ENABLED:
+        return None
+    conf = (
+        os.path.join(settings.TMP_DIR, "cache"),
+        settings.CACHE_MAX_MB * 1024 * 1024,
+        settings.CACHE_TTL_MINUTES * 60,
+    )
+    with _caches_lock:
+        cache = _caches.get(conf)
+        if cache is None:
+            cache = ResultCache(*conf)
+            _caches[conf] = cache
+    return cache
+
+
+def cache_stats() -> dict[str, int] | None:
+    cache = get_result_cache()
+    return cache.stats() if cache else None
+
+
+def cached_file(key: str, out_path: str, produce: Callable[[], Any]) -> str:
+    """Gera out_path com produce(), ou o materializa a partir do cache (hit)."""
+    cache = get_result_cache()
+    if cache is not None:
+        hit = cache.get(key)
+        if hit:
+            link_or_copy(hit[0][1], out_path)
+            return out_path
+    produce()
+    if cache is not None:
+        cache.put_files(key, [out_path])
+    return out_path
+
+
+def cached_text(key: str, produce: Callable[[], str]) -> str:
+    cache = get_result_cache()
+    if cache is not None:
+        hit = cache.get(key)
+        if hit:
+            with open(hit[0][1], encoding="utf-8") as f:
+                return f.read()
+    text = produce()
+    if cache is not None:
+        stage = cache.stage(key)
+        try:
+            stage.add_bytes("result.txt", text.encode("utf-8"))
+            stage.commit()
+        except BaseException:
+            stage.discard()
+            raise
+    return text
+
+
+def cached_members(
+    key: str, produce: Callable[[], Iterable[tuple[str, bytes]]]
+) -> Iterator[tuple[str, bytes | str]]:
+    """Membros (nome, bytes) de um resultado multi-arquivo (páginas, partes).
+
+    Hit: devolve (nome, caminho) do cache sem executar produce(). Miss: repassa
+    cada membro conforme é gerado e o grava no cache; só confirma a entrada se
+    a geração terminar inteira.
+    """
+    cache = get_result_cache()
+    if cache is not None:
+        hit = cache.get(key)
+        if hit:
+            yield from hit
+            return
+    if cache is None:
+        yield from produce()
+        return
+    stage = cache.stage(key)
+    try:
+        for name, data in produce():
+            stage.add_bytes(name, data)
+            yield name, data
+    except BaseException:
+        stage.discard()
+        raise
+    stage.commit()
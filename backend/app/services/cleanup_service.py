@@ -1,8 +1,16 @@
 from __future__ import annotations
 
+import os
 import time
 
+from app.services.cache_service import get_result_cache
+from app.services.storage_service import EXPIRY, WORKSPACES, get_storage
 from app.utils.files import remove_old_files
+from app.utils.profiling import PROFILES_DIRNAME
+from app.utils.spool import SPOOL_DIRNAME
+
+# Perfis não vencem por TTL: o diretório é limitado por PROFILE_MAX_MB ao gravar
+_MANAGED = frozenset({"cache", SPOOL_DIRNAME, WORKSPACES, EXPIRY, PROFILES_DIRNAME})
 
 
 def cleanup_tmp_dir_periodically(
@@ -11,7 +19,17 @@ def cleanup_tmp_dir_periodically(
     # Loop de limpeza;
     while True:
         try:
-            remove_old_files(tmp_dir, ttl_minutes)
+            # Diretórios de requisição/job: só os vencidos no índice (e, com pouco
+            # espaço livre, os mais antigos primeiro)
+            get_storage().sweep()
+            # Arquivos soltos na raiz (versões anteriores); cache e índices têm regras próprias
+            remove_old_files(tmp_dir, ttl_minutes, keep=_MANAGED)
+            # Spool fica; só os arquivos antigos dele (requisições abortadas) saem
+            remove_old_files(os.path.join(tmp_dir, SPOOL_DIRNAME), ttl_minutes)
+            cache = get_result_cache()
+            if cache is not None:
+                # Vence entradas e staging órfão mesmo sem novas gravações
+                cache.evict()
         except Exception:
             pass
         time.sleep(interval_seconds)
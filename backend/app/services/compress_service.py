@@ -4,6 +4,7 @@ import subprocess
 from typing import Literal
 
 from app.config import get_settings
+from app.utils.metrics import stage
 
 Quality = Literal["low", "medium", "high"]
 
@@ -48,9 +49,10 @@ def compress_pdf(input_path: str, output_path: str, quality: Quality) -> str:
     args += _gs_params_for_quality(quality)
     args += ["-sOutputFile=" + output_path, input_path]
     try:
-        proc = subprocess.run(
-            args, capture_output=True, check=False, timeout=get_settings().GS_TIMEOUT_SECONDS
-        )
+        with stage("ghostscript"):
+            proc = subprocess.run(
+                args, capture_output=True, check=False, timeout=get_settings().GS_TIMEOUT_SECONDS
+            )
     except subprocess.TimeoutExpired as err:
         raise RuntimeError("Ghostscript excedeu o tempo limite (timeout)") from err
     if proc.returncode != 0:
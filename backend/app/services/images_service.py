@@ -1,33 +1,252 @@
 from __future__ import annotations
 
 import os
+import tempfile
+from collections.abc import Iterator
+from io import BytesIO
 from typing import Literal
 
 from pdf2image import convert_from_path
+from PIL import Image
 from pypdf import PdfReader
 
 from app.config import get_settings
+from app.utils.embedded import page_image
+from app.utils.files import ensure_dir
+from app.utils.metrics import count_pages, stage
 
 ImageFormat = Literal["jpg", "png"]
+# Formato do pdftoppm para cada formato de saída
+_POPPLER_FORMATS = {"jpg": "jpeg", "png": "png"}
+# Imagens embutidas aceitas, por formato pedido (ver app/utils/embedded.py)
+_EMBEDDED_FORMATS = {"jpg": {"jpg"}, "png": {"jpg", "png"}}
 
 
-def pdf_to_images(
-    input_path: str, out_dir: str, fmt: ImageFormat, dpi: int, max_pages: int | None = None
-) -> list[str]:
-    os.makedirs(out_dir, exist_ok=True)
-    try:
-        total = len(PdfReader(input_path).pages)
-    except Exception:
-        total = get_settings().PDF_TO_IMAGES_MAX_PAGES
+def render_processes(pages: int) -> int:
+    """pdftoppm simultâneos para uma janela: os núcleos divididos pelo pool render."""
+    settings = get_settings()
+    configured = settings.RENDER_PROCESSES
+    if configured <= 0:
+        configured = (os.cpu_count() or 1) // max(1, settings.POOL_RENDER_WORKERS)
+    return max(1, min(configured, pages))
+
+
+def _windows(first_page: int, last_page: int | None, batch: int) -> Iterator[tuple[int, int]]:
+    """Intervalos [início, fim] de até batch páginas; sem last_page, segue até o consumidor parar."""
+    page = first_page
+    while last_page is None or page <= last_page:
+        end = page + batch - 1
+        if last_page is not None:
+            end = min(end, last_page)
+        yield page, end
+        page = end + 1
+
+
+def iter_pdf_images(
+    input_path: str,
+    dpi: int,
+    first_page: int = 1,
+    last_page: int | None = None,
+    batch_pages: int | None = None,
+) -> Iterator[tuple[int, Image.Image]]:
+    """Renderiza o PDF em janelas de páginas (first_page/last_page do pdftoppm).
+
+    Gera (número da página, imagem) e fecha cada imagem depois que o consumidor
+    a processa, de modo que no máximo uma janela fica decodificada em memória.
+    Com last_page=None percorre até o fim do documento.
+    """
+    batch = max(1, batch_pages or get_settings().RENDER_BATCH_PAGES)
+    for page, end in _windows(first_page, last_page, batch):
+        with stage("render"):
+            # A janela é dividida entre pdftoppm paralelos (PPM pelo stdout de cada um)
+            images = convert_from_path(
+                input_path,
+                dpi=dpi,
+                first_page=page,
+                last_page=end,
+                thread_count=render_processes(end - page + 1),
+            )
+        rendered = len(images)
+        count_pages("to-images", rendered)
+        try:
+            for offset, img in enumerate(images):
+                yield page + offset, img
+                img.close()
+        finally:
+            for img in images:
+                img.close()
+            images.clear()
+        if rendered < end - page + 1:
+            # Janela veio incompleta: fim do documento
+            break
+
+
+def _iter_poppler_files(  # noqa: PLR0913
+    input_path: str,
+    fmt: ImageFormat,
+    dpi: int,
+    *,
+    first_page: int,
+    last_page: int | None,
+    batch: int,
+) -> Iterator[tuple[int, bytes]]:
+    """pdftoppm grava PNG/JPEG em disco e os bytes seguem sem passar pelo PIL.
+
+    A codificação acontece nos processos do poppler, em paralelo e fora do GIL;
+    cada arquivo é apagado assim que lido.
+    """
+    # Em TMP_DIR (disco da app, não o tmpfs); sobra de um processo morto sai pelo TTL
+    tmp_dir = get_settings().TMP_DIR
+    ensure_dir(tmp_dir)
+    with tempfile.TemporaryDirectory(prefix="render-", dir=tmp_dir) as out_dir:
+        for page, end in _windows(first_page, last_page, batch):
+            with stage("render"):
+                paths = convert_from_path(
+                    input_path,
+                    dpi=dpi,
+                    first_page=page,
+                    last_page=end,
+                    fmt=_POPPLER_FORMATS[fmt],
+                    output_folder=out_dir,
+                    # Prefixo por janela: a listagem da pasta só traz as páginas desta
+                    output_file=f"w{page}-",
+                    paths_only=True,
+                    thread_count=render_processes(end - page + 1),
+                )
+            count_pages("to-images", len(paths))
+            for offset, path in enumerate(paths):
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.remove(path)
+                yield page + offset, data
+            if len(paths) < end - page + 1:
+                # Janela veio incompleta: fim do documento
+                break
+
+
+def _render_page_bytes(  # noqa: PLR0913
+    input_path: str,
+    fmt: ImageFormat,
+    dpi: int,
+    *,
+    first_page: int,
+    last_page: int | None,
+    batch: int,
+) -> Iterator[tuple[int, str, bytes]]:
+    if get_settings().RENDER_BACKEND == "pil":
+        for idx, img in iter_pdf_images(input_path, dpi, first_page, last_page, batch):
+            yield idx, fmt, encode_image(img, fmt)
+        return
+    for idx, data in _iter_poppler_files(
+        input_path, fmt, dpi, first_page=first_page, last_page=last_page, batch=batch
+    ):
+        yield idx, fmt, data
+
+
+def iter_pdf_page_bytes(  # noqa: PLR0913
+    input_path: str,
+    fmt: ImageFormat,
+    dpi: int,
+    *,
+    first_page: int = 1,
+    last_page: int | None = None,
+    batch_pages: int | None = None,
+) -> Iterator[tuple[int, str, bytes]]:
+    """Gera (número da página, extensão, bytes) em janelas, conforme RENDER_BACKEND.
+
+    Com EXTRACT_EMBEDDED_IMAGES, páginas que são uma única imagem cobrindo a
+    página saem direto do PDF (extensão jpg ou png, pela imagem embutida); só as
+    demais, em trechos consecutivos, são renderizadas em fmt.
+    """
+    settings = get_settings()
+    batch = max(1, batch_pages or settings.RENDER_BATCH_PAGES)
+    reader = None
+    if settings.EXTRACT_EMBEDDED_IMAGES:
+        try:
+            with stage("pdf_parse"):
+                reader = PdfReader(input_path)
+                total = len(reader.pages)
+        except Exception:  # noqa: BLE001
+            # PDF que o pypdf não abre: o poppler decide (e reporta o erro)
+            reader = None
+    if reader is None:
+        yield from _render_page_bytes(
+            input_path, fmt, dpi, first_page=first_page, last_page=last_page, batch=batch
+        )
+        return
+
+    last = total if last_page is None else min(last_page, total)
+    # JPEG embutido serve para qualquer pedido; Flate vira PNG, só quando pedido PNG
+    formats = _EMBEDDED_FORMATS[fmt]
+    max_bytes = settings.EXTRACT_EMBEDDED_MAX_MB * 1024 * 1024
+    pending: int | None = None  # início do trecho que precisa de renderização
+    for page_no in range(first_page, last + 1):
+        with stage("extract_image"):
+            image = page_image(reader.pages[page_no - 1], formats, max_bytes)
+        if image is None:
+            pending = pending or page_no
+            continue
+        if pending is not None:
+            yield from _render_page_bytes(
+                input_path, fmt, dpi, first_page=pending, last_page=page_no - 1, batch=batch
+            )
+            pending = None
+        count_pages("to-images", 1)
+        yield page_no, image.ext, image.data
+    if pending is not None:
+        yield from _render_page_bytes(
+            input_path, fmt, dpi, first_page=pending, last_page=last, batch=batch
+        )
+
+
+def encode_image(img: Image.Image, fmt: ImageFormat) -> bytes:
+    buf = BytesIO()
+    with stage(f"encode_{fmt}"):
+        img.save(buf, format="JPEG" if fmt == "jpg" else "PNG")
+    return buf.getvalue()
+
+
+def iter_pdf_image_bytes(
+    input_path: str,
+    fmt: ImageFormat,
+    dpi: int,
+    max_pages: int | None = None,
+    *,
+    total_pages: int | None = None,
+) -> Iterator[tuple[str, bytes]]:
+    """Gera (nome, bytes codificados) página a página, p.ex. para um ZIP em streaming.
+
+    total_pages: contagem já conhecida (calculada no upload); evita reabrir o PDF.
+    """
     if max_pages is None:
         max_pages = get_settings().PDF_TO_IMAGES_MAX_PAGES
-    last_page = min(total, max_pages)
-    images = convert_from_path(input_path, dpi=dpi)
-    images = images[:last_page]
+    if total_pages is None:
+        try:
+            total_pages = len(PdfReader(input_path).pages)
+        except Exception:
+            # Sem contagem confiável: para na primeira janela incompleta
+            total_pages = max_pages
+    last_page = min(total_pages, max_pages)
+    for idx, ext, data in iter_pdf_page_bytes(input_path, fmt, dpi, last_page=last_page):
+        yield f"p{idx}.{ext}", data
+
+
+def pdf_to_images(  # noqa: PLR0913
+    input_path: str,
+    out_dir: str,
+    fmt: ImageFormat,
+    dpi: int,
+    max_pages: int | None = None,
+    *,
+    total_pages: int | None = None,
+) -> list[str]:
+    os.makedirs(out_dir, exist_ok=True)
     paths: list[str] = []
-    ext = "jpg" if fmt == "jpg" else "png"
-    for idx, img in enumerate(images, start=1):
-        out_path = os.path.join(out_dir, f"p{idx}.{ext}")
-        img.save(out_path, format="JPEG" if fmt == "jpg" else "PNG")
+    for name, data in iter_pdf_image_bytes(
+        input_path, fmt, dpi, max_pages, total_pages=total_pages
+    ):
+        out_path = os.path.join(out_dir, name)
+        with open(out_path, "wb") as f:
+            f.write(data)
         paths.append(out_path)
     return paths
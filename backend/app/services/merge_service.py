@@ -1,14 +1,24 @@
 from __future__ import annotations
 
+from collections.abc import Callable
+
 from pypdf import PdfReader, PdfWriter
 
+from app.utils.metrics import count_pages, stage
+
 
-def merge_pdfs(paths: list[str], output_path: str) -> str:
+def merge_pdfs(
+    paths: list[str], output_path: str, on_file: Callable[[], None] | None = None
+) -> str:
     writer = PdfWriter()
     for p in paths:
-        reader = PdfReader(p)
-        for page in reader.pages:
-            writer.add_page(page)
-    with open(output_path, "wb") as f:
+        with stage("pdf_parse"):
+            reader = PdfReader(p)
+            for page in reader.pages:
+                writer.add_page(page)
+        count_pages("merge", len(reader.pages))
+        if on_file is not None:
+            on_file()
+    with stage("pdf_write"), open(output_path, "wb") as f:
         writer.write(f)
     return output_path
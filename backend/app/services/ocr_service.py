@@ -1,7 +1,14 @@
 from __future__ import annotations
 
+import multiprocessing
 import os
+import threading
 import uuid
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from itertools import repeat
 
 import pytesseract
 from pdf2image import convert_from_path
@@ -9,40 +16,234 @@ from PIL import Image
 from pypdf import PdfReader
 
 from app.config import get_settings
+from app.utils.metrics import count_pages, mark_process_dead, stage
 
+OCR_DPI = 200
+# Página com imagens cobrindo >= 50% da área e pouco texto é tratada como escaneada
+SCAN_IMAGE_COVERAGE = 0.5
+SCAN_MAX_TEXT_CHARS = 64
+PAINT_OPERATORS = {b"f", b"F", b"f*", b"S", b"s", b"B", b"B*", b"b", b"b*", b"sh", b"BI"}
 
-def extract_text_pdf_textual(path: str) -> str:
-    reader = PdfReader(path)
-    texts: list[str] = []
-    for page in reader.pages:
+_ocr_pool: ProcessPoolExecutor | None = None
+_ocr_pool_size = 0
+_ocr_pool_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class PageProfile:
+    text: str
+    has_fonts: bool
+    image_count: int
+    image_coverage: float  # fração da área da página coberta por imagens (0..1)
+    has_drawing: bool
+
+    @property
+    def needs_ocr(self) -> bool:
+        chars = len(self.text.strip())
+        if self.image_coverage >= SCAN_IMAGE_COVERAGE and chars < SCAN_MAX_TEXT_CHARS:
+            # Escaneada (o pouco texto costuma ser carimbo/rodapé)
+            return True
+        if chars:
+            return False
+        # Sem texto: OCR só se houver algo desenhado (imagem ou texto vetorizado)
+        return not self.has_fonts and (self.image_count > 0 or self.has_drawing)
+
+
+def _page_resources(page) -> dict:
+    res = page.get("/Resources")
+    return res.get_object() if res is not None else {}
+
+
+def _image_names(resources: dict) -> set[str]:
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return set()
+    xobjects = xobjects.get_object()
+    return {name for name, ref in xobjects.items() if ref.get_object().get("/Subtype") == "/Image"}
+
+
+def _analyze_contents(page, image_names: set[str]) -> tuple[float, bool]:
+    """Percorre o content stream só acompanhando o determinante da CTM.
+
+    Área de uma imagem desenhada = |det(CTM)| (imagem ocupa o quadrado unitário).
+    Retorna (cobertura de imagens, há operadores de pintura).
+    """
+    contents = page.get_contents()
+    if contents is None:
+        return 0.0, False
+    box = page.mediabox
+    page_area = float(box.width) * float(box.height) or 1.0
+    det = 1.0
+    stack: list[float] = []
+    covered = 0.0
+    drawing = False
+    for operands, operator in contents.operations:
+        if operator == b"q":
+            stack.append(det)
+        elif operator == b"Q":
+            det = stack.pop() if stack else 1.0
+        elif operator == b"cm" and len(operands) == 6:  # noqa: PLR2004
+            a, b, c, d = (float(v) for v in operands[:4])
+            det *= a * d - b * c
+        elif operator == b"Do" and operands:
+            if str(operands[0]) in image_names:
+                covered += abs(det)
+            else:
+                drawing = True
+        elif operator in PAINT_OPERATORS:
+            drawing = True
+    return min(covered / page_area, 1.0), drawing
+
+
+def profile_page(page) -> PageProfile:
+    """Classifica a página: camada de texto, fontes e cobertura por imagens."""
+    try:
+        text = page.extract_text() or ""
+    except Exception:  # noqa: BLE001
+        text = ""
+    try:
+        resources = _page_resources(page)
+        has_fonts = bool(resources.get("/Font"))
+        images = _image_names(resources)
+    except Exception:  # noqa: BLE001
+        has_fonts, images = False, set()
+    coverage, drawing = 0.0, False
+    if len(text.strip()) < SCAN_MAX_TEXT_CHARS:
+        # Só páginas com pouco texto pagam a varredura do content stream
         try:
-            t = page.extract_text() or ""
+            coverage, drawing = _analyze_contents(page, images)
         except Exception:  # noqa: BLE001
-            t = ""
-        if t:
-            texts.append(t)
-    return "\n\n".join(texts).strip()
+            # Conteúdo ilegível: na dúvida, deixa o OCR decidir
+            drawing = True
+    return PageProfile(
+        text=text,
+        has_fonts=has_fonts,
+        image_count=len(images),
+        image_coverage=coverage,
+        has_drawing=drawing,
+    )
+
+
+def ocr_workers() -> int:
+    configured = get_settings().OCR_WORKERS
+    return configured if configured > 0 else (os.cpu_count() or 1)
+
+
+def _limit_ocr_threads() -> None:
+    # Um thread OpenMP por tesseract: o total fica limitado a OCR_WORKERS
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
 
+def _ocr_page(path: str, page_no: int, langs_tag: str) -> str:
+    """Renderiza e reconhece uma única página (executa no processo do pool)."""
+    with stage("render"):
+        images = convert_from_path(path, dpi=OCR_DPI, first_page=page_no, last_page=page_no)
+    try:
+        with stage("tesseract"):
+            return "".join(pytesseract.image_to_string(img, lang=langs_tag) for img in images)
+    finally:
+        for img in images:
+            img.close()
+
+
+def _close_pool(pool: ProcessPoolExecutor) -> None:
+    pids = list(pool._processes or {})  # noqa: SLF001
+    pool.shutdown(wait=False, cancel_futures=True)
+    # Processos do pool escrevem métricas (tesseract) no diretório multiprocesso
+    for pid in pids:
+        mark_process_dead(pid)
+
+
+def _get_ocr_pool(workers: int) -> ProcessPoolExecutor:
+    global _ocr_pool, _ocr_pool_size  # noqa: PLW0603
+    with _ocr_pool_lock:
+        if _ocr_pool is None or _ocr_pool_size != workers:
+            if _ocr_pool is not None:
+                _close_pool(_ocr_pool)
+            # spawn: seguro mesmo com threads ativas no processo da API
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_limit_ocr_threads,
+            )
+            _ocr_pool_size = workers
+        return _ocr_pool
+
+
+def shutdown_ocr_pool() -> None:
+    global _ocr_pool  # noqa: PLW0603
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            _close_pool(_ocr_pool)
+            _ocr_pool = None
+
+
+PageCallback = Callable[[int, int], None]
 
-def ocr_pdf_or_image(path: str, langs: list[str]) -> str:
+
+def _collect(results, total: int, on_page: PageCallback | None) -> list[str]:
+    texts: list[str] = []
+    for text in results:
+        texts.append(text)
+        if on_page is not None:
+            on_page(len(texts), total)
+    return texts
+
+
+def ocr_pdf_pages(
+    path: str, pages: list[int], langs: list[str], on_page: PageCallback | None = None
+) -> list[str]:
+    """OCR das páginas (1-based) em paralelo no pool de processos, na ordem recebida.
+
+    Cada processo renderiza e reconhece a sua página, então renderização e OCR
+    de páginas diferentes se sobrepõem. on_page(feitas, total) acompanha o progresso.
+    """
+    langs_tag = "+".join(langs)
+    total = len(pages)
+    workers = min(ocr_workers(), total)
+    if workers <= 1:
+        return _collect((_ocr_page(path, p, langs_tag) for p in pages), total, on_page)
+    if multiprocessing.current_process().daemon:
+        # Filho do prefork do Celery é daemônico e não pode criar processos;
+        # pdftoppm/tesseract já são subprocessos, então threads bastam
+        _limit_ocr_threads()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr") as pool:
+            results = pool.map(_ocr_page, repeat(path), pages, repeat(langs_tag))
+            return _collect(results, total, on_page)
+    try:
+        pool = _get_ocr_pool(ocr_workers())
+        results = pool.map(_ocr_page, repeat(path), pages, repeat(langs_tag))
+        return _collect(results, total, on_page)
+    except BrokenProcessPool as err:
+        # Processo do pool morreu (p.ex. OOM): refazer aqui derrubaria o processo
+        # da API; recria o pool na próxima chamada e falha só esta requisição
+        shutdown_ocr_pool()
+        raise RuntimeError("Processo de OCR encerrado inesperadamente") from err
+
+
+def ocr_pdf_or_image(path: str, langs: list[str], on_page: PageCallback | None = None) -> str:
     ext = os.path.splitext(path)[1].lower()
     if ext == ".pdf":
-        text = extract_text_pdf_textual(path)
-        if text:
-            return text
-        # fallback OCR por imagens (limita número de páginas)
+        # Texto nativo nas páginas digitais; OCR só nas páginas só-imagem
         reader = PdfReader(path)
-        total = len(reader.pages)
-        last_page = min(total, get_settings().OCR_MAX_PAGES)
-        images = convert_from_path(path, dpi=200)
-        images = images[:last_page]
-        langs_tag = "+".join(langs)
+        max_ocr = get_settings().OCR_MAX_PAGES
         texts: list[str] = []
-        for img in images:
-            t = pytesseract.image_to_string(img, lang=langs_tag)
-            if t:
-                texts.append(t)
-        return "\n\n".join(texts).strip()
+        ocr_pages: list[int] = []
+        with stage("pdf_text"):
+            for page_no, page in enumerate(reader.pages, start=1):
+                profile = profile_page(page)
+                if profile.needs_ocr and len(ocr_pages) < max_ocr:
+                    ocr_pages.append(page_no)
+                    texts.append("")
+                else:
+                    texts.append(profile.text)
+        count_pages("ocr", len(ocr_pages))
+        count_pages("ocr_native", len(texts) - len(ocr_pages))
+        if ocr_pages:
+            ocr_texts = ocr_pdf_pages(path, ocr_pages, langs, on_page)
+            for page_no, t in zip(ocr_pages, ocr_texts, strict=True):
+                texts[page_no - 1] = t
+        return "\n\n".join(t for t in texts if t).strip()
     else:
         langs_tag = "+".join(langs)
         try:
@@ -50,12 +251,14 @@ def ocr_pdf_or_image(path: str, langs: list[str]) -> str:
         except Exception:
             # Se não conseguir abrir como imagem, retorna vazio
             return ""
-        return pytesseract.image_to_string(img, lang=langs_tag)
+        count_pages("ocr")
+        with stage("tesseract"):
+            return pytesseract.image_to_string(img, lang=langs_tag)
 
 
-def save_text(tmp_dir: str, text: str) -> str:
+def save_text(tmp_dir: str, text: str, name: str | None = None) -> str:
     os.makedirs(tmp_dir, exist_ok=True)
-    out = os.path.join(tmp_dir, f"{uuid.uuid4()}.txt")
+    out = os.path.join(tmp_dir, name or f"{uuid.uuid4()}.txt")
     with open(out, "w", encoding="utf-8") as f:
         f.write(text)
     return out
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from typing import Any
+
+from app.config import Settings, get_settings
+from app.services.cache_service import cached_file, cached_members, cached_text, make_key
+from app.services.compress_service import compress_pdf
+from app.utils.ranges import parse_ranges
+from app.utils.zipstream import renumbered, write_zip
+from app.workers.progress import Progress
+
+# Os serviços de cada etapa (pypdf, pdf2image, PIL, pytesseract) são importados
+# em run_step: a API só valida etapas aqui, e a partida do processo não paga por eles.
+
+# Etapas de um pipeline (POST /api/jobs, type=pipeline). Todas as etapas
+# consomem PDF; só merge/compress produzem PDF, então as demais encerram o pipeline.
+TERMINAL_OPS = {"split", "to-images", "ocr"}
+MAX_PIPELINE_STEPS = 5
+MIN_MERGE_INPUTS = 2
+MIN_DPI = 72
+
+
+class PipelineError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class StepOutput:
+    """Resultado de uma etapa: arquivos no disco do worker + digests para a próxima.
+
+    O digest de uma saída intermediária é a própria chave de cache que a gerou
+    (entradas + parâmetros), então a etapa seguinte não precisa reler o arquivo.
+    """
+
+    paths: list[str]
+    digests: list[str]
+    content_type: str
+    filename: str
+
+
+def _normalize(step: dict[str, Any], settings: Settings) -> dict[str, Any]:
+    op = step.get("op")
+    if op == "compress":
+        quality = step.get("quality")
+        if quality not in {"low", "medium", "high"}:
+            raise PipelineError("quality inválido")
+        return {"op": "compress", "quality": quality}
+    if op == "split":
+        ranges = step.get("ranges")
+        if not isinstance(ranges, str) or not ranges.strip():
+            raise PipelineError("Informe ranges")
+        # Validado contra o total de páginas só no worker: o PDF pode ser intermediário
+        return {"op": "split", "ranges": ranges}
+    if op == "to-images":
+        fmt, dpi = step.get("format", "png"), step.get("dpi", 150)
+        if fmt not in {"jpg", "png"} or not isinstance(dpi, int) or not MIN_DPI <= dpi:
+            raise PipelineError("Parâmetros inválidos")
+        if dpi > settings.MAX_DPI_TO_IMAGES:
+            raise PipelineError(f"DPI excede o limite permitido (máx {settings.MAX_DPI_TO_IMAGES})")
+        return {"op": "to-images", "fmt": fmt, "dpi": dpi}
+    if op == "ocr":
+        langs = [s for s in str(step.get("lang") or "por").split("+") if s]
+        if not set(langs).issubset(settings.OCR_LANGS):
+            raise PipelineError("Idiomas não suportados")
+        return {"op": "ocr", "langs": langs}
+    raise PipelineError(f"Etapa desconhecida: {op}")
+
+
+def parse_steps(raw: str, inputs: int, settings: Settings) -> list[dict[str, Any]]:
+    """Valida e normaliza a lista de etapas (JSON) antes de enfileirar."""
+    try:
+        steps = json.loads(raw)
+    except ValueError as err:
+        raise PipelineError("steps deve ser uma lista JSON") from err
+    if not isinstance(steps, list) or not 1 <= len(steps) <= MAX_PIPELINE_STEPS:
+        raise PipelineError(f"Informe de 1 a {MAX_PIPELINE_STEPS} etapas")
+    normalized: list[dict[str, Any]] = []
+    for idx, step in enumerate(steps):
+        if not isinstance(step, dict):
+            raise PipelineError("Etapa inválida")
+        if normalized and normalized[-1]["op"] in TERMINAL_OPS:
+            raise PipelineError(f"{normalized[-1]['op']} só pode ser a última etapa")
+        if step.get("op") == "merge":
+            if idx or inputs < MIN_MERGE_INPUTS:
+                raise PipelineError("merge precisa ser a primeira etapa, com 2+ PDFs")
+            normalized.append({"op": "merge"})
+            continue
+        if idx == 0 and inputs != 1:
+            raise PipelineError("Com vários PDFs a primeira etapa deve ser merge")
+        normalized.append(_normalize(step, settings))
+    return normalized
+
+
+def run_step(  # noqa: PLR0913
+    task: Any,
+    step: dict[str, Any],
+    paths: list[str],
+    digests: list[str],
+    out_base: str,
+    *,
+    page_count: int | None = None,
+    job_id: str | None = None,
+) -> StepOutput:
+    """Executa uma etapa no worker; compartilhado pelas tasks avulsas e pelo pipeline.
+
+    out_base: caminho da saída sem extensão. page_count: contagem já conhecida
+    da entrada (upload), evita reabrir o PDF.
+    """
+    op = step["op"]
+    if op == "merge":
+        from app.services.merge_service import merge_pdfs  # noqa: PLC0415  # import tardio
+
+        out = f"{out_base}.pdf"
+        progress = Progress(task, "merge", total=len(paths), job_id=job_id)
+        key = make_key("merge", digests, {})
+        cached_file(key, out, lambda: merge_pdfs(paths, out, on_file=progress.advance))
+        return StepOutput([out], [key], "application/pdf", "merged.pdf")
+
+    (path,) = paths
+    if op == "compress":
+        out = f"{out_base}.pdf"
+        # Ghostscript é uma etapa só: sem contagem intermediária
+        Progress(task, "compress", job_id=job_id)
+        key = make_key("compress", digests, {"quality": step["quality"]})
+        cached_file(key, out, lambda: compress_pdf(path, out, step["quality"]))
+        return StepOutput([out], [key], "application/pdf", "compressed.pdf")
+
+    if op == "split":
+        from pypdf import PdfReader  # noqa: PLC0415  # import tardio
+
+        from app.services.split_service import iter_split_members  # noqa: PLC0415
+
+        out = f"{out_base}.zip"
+        ranges = step["ranges"]
+        if isinstance(ranges, str):
+            ranges = parse_ranges(ranges, page_count or len(PdfReader(path).pages))
+        progress = Progress(task, "split", total=len(ranges), job_id=job_id)
+        key = make_key("split", digests, {"ranges": ranges})
+        members = progress.track(cached_members(key, lambda: iter_split_members(path, ranges)))
+        # Partes vão direto para o ZIP, sem arquivos intermediários
+        name = os.path.basename(out_base)
+        write_zip(out, renumbered(members, f"{name}-{{n}}.pdf"))
+        return StepOutput([out], [key], "application/zip", "split.zip")
+
+    if op == "to-images":
+        from app.services.images_service import iter_pdf_image_bytes  # noqa: PLC0415
+
+        out = f"{out_base}.zip"
+        fmt, dpi = step["fmt"], step["dpi"]
+        settings = get_settings()
+        max_pages = settings.PDF_TO_IMAGES_MAX_PAGES
+        # Extração de imagens embutidas muda os arquivos gerados: faz parte da chave
+        params = {
+            "fmt": fmt,
+            "dpi": dpi,
+            "maxPages": max_pages,
+            "embedded": settings.EXTRACT_EMBEDDED_IMAGES,
+        }
+        key = make_key("to-images", digests, params)
+        total = min(page_count, max_pages) if page_count is not None else None
+        progress = Progress(task, "render", total=total, job_id=job_id)
+        members = cached_members(
+            key, lambda: iter_pdf_image_bytes(path, fmt, dpi, max_pages, total_pages=page_count)
+        )
+        write_zip(out, renumbered(progress.track(members), "p{n}.{ext}"))
+        return StepOutput([out], [key], "application/zip", "images.zip")
+
+    if op == "ocr":
+        from app.services.ocr_service import ocr_pdf_or_image  # noqa: PLC0415  # import tardio
+
+        out = f"{out_base}.txt"
+        # OCR_MAX_PAGES muda o texto gerado: faz parte da chave
+        params = {"langs": step["langs"], "maxPages": get_settings().OCR_MAX_PAGES}
+        key = make_key("ocr", digests, params)
+        progress = Progress(task, "ocr", job_id=job_id)
+        text = cached_text(
+            key, lambda: ocr_pdf_or_image(path, step["langs"], on_page=progress.page)
+        )
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text)
+        return StepOutput([out], [key], "text/plain", "result.txt")
+
+    raise PipelineError(f"Etapa desconhecida: {op}")
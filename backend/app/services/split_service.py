@@ -1,19 +1,40 @@
 from __future__ import annotations
 
+from collections.abc import Iterator
+from io import BytesIO
+
 from pypdf import PdfReader, PdfWriter
 
+from app.utils.metrics import count_pages, stage
+
+
+def iter_split_pdf(path: str, ranges: list[tuple[int, int]]) -> Iterator[bytes]:
+    """Gera cada parte como bytes de PDF, na ordem dos intervalos."""
+    with stage("pdf_parse"):
+        reader = PdfReader(path)
+        total = len(reader.pages)
+    for start, end in ranges:
+        with stage("pdf_write"):
+            writer = PdfWriter()
+            # convert 1-based inclusive to 0-based
+            for i in range(start - 1, min(end, total)):
+                writer.add_page(reader.pages[i])
+            buf = BytesIO()
+            writer.write(buf)
+        count_pages("split", max(0, min(end, total) - start + 1))
+        yield buf.getvalue()
+
+
+def iter_split_members(path: str, ranges: list[tuple[int, int]]) -> Iterator[tuple[str, bytes]]:
+    for idx, data in enumerate(iter_split_pdf(path, ranges), start=1):
+        yield f"part-{idx}.pdf", data
+
 
 def split_pdf(path: str, ranges: list[tuple[int, int]], out_paths: list[str]) -> list[str]:
-    reader = PdfReader(path)
-    total = len(reader.pages)
     assert len(ranges) == len(out_paths)
     result: list[str] = []
-    for (start, end), out_path in zip(ranges, out_paths, strict=True):
-        writer = PdfWriter()
-        # convert 1-based inclusive to 0-based
-        for i in range(start - 1, min(end, total)):
-            writer.add_page(reader.pages[i])
+    for data, out_path in zip(iter_split_pdf(path, ranges), out_paths, strict=True):
         with open(out_path, "wb") as f:
-            writer.write(f)
+            f.write(data)
         result.append(out_path)
     return result
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from app.config import get_settings
+from app.utils.security import is_uuid4
+
+WORKSPACES = "w"
+EXPIRY = ".expiry"
+CLAIMED = ".claimed"
+EXPIRES_FILE = ".expires"
+# Granularidade do índice: um diretório de marcadores por minuto de expiração
+BUCKET_SECONDS = 60
+# Marcador reivindicado por uma réplica que morreu no meio da remoção
+CLAIM_MAX_AGE_SECONDS = 600
+
+
+@dataclass(frozen=True)
+class Workspace:
+    """Diretório próprio de uma requisição ou job: TMP_DIR/w/<id>/."""
+
+    id: str
+    path: str
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, os.path.basename(name))
+
+
+class StorageManager:
+    """Área temporária com um diretório por requisição/job e índice de expiração.
+
+    O índice fica no próprio volume: .expiry/<minuto>/<id> é um marcador vazio.
+    A limpeza só lista os minutos já vencidos, em vez de varrer todos os arquivos.
+    Cada marcador é reivindicado com rename (atômico), então várias réplicas da
+    API e dos workers podem limpar o mesmo volume sem apagar nada duas vezes.
+    Prorrogar a validade grava um marcador novo e atualiza <id>/.expires; o
+    marcador antigo, ao vencer, vê a data nova e não apaga.
+    """
+
+    def __init__(self, root: str, ttl_seconds: int, min_free_bytes: int):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.min_free_bytes = min_free_bytes
+        self._workspaces = os.path.join(root, WORKSPACES)
+        self._expiry = os.path.join(root, EXPIRY)
+        self._claimed = os.path.join(self._expiry, CLAIMED)
+        for d in (self._workspaces, self._claimed):
+            os.makedirs(d, exist_ok=True)
+
+    def _ws_path(self, workspace_id: str) -> str:
+        return os.path.join(self._workspaces, workspace_id)
+
+    def create(self, ttl_seconds: int | None = None, workspace_id: str | None = None) -> Workspace:
+        """Cria o diretório e agenda a expiração (TTL_UPLOAD_MINUTES por padrão)."""
+        if self.min_free_bytes and self.free_bytes() < self.min_free_bytes:
+            self.ensure_free_space()
+        workspace_id = workspace_id or str(uuid.uuid4())
+        path = self._ws_path(workspace_id)
+        os.makedirs(path, exist_ok=True)
+        self.extend(workspace_id, ttl_seconds)
+        return Workspace(workspace_id, path)
+
+    def open(self, workspace_id: str) -> Workspace | None:
+        if not is_uuid4(workspace_id):
+            return None
+        path = self._ws_path(workspace_id)
+        return Workspace(workspace_id, path) if os.path.isdir(path) else None
+
+    def extend(self, workspace_id: str, ttl_seconds: int | None = None) -> float:
+        """(Re)agenda a expiração a partir de agora; retorna o instante de expiração."""
+        expires = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with open(os.path.join(self._ws_path(workspace_id), EXPIRES_FILE), "w") as f:
+            f.write(f"{expires:.0f}")
+        bucket = os.path.join(self._expiry, str(int(expires // BUCKET_SECONDS)))
+        os.makedirs(bucket, exist_ok=True)
+        open(os.path.join(bucket, workspace_id), "w").close()  # noqa: SIM115
+        return expires
+
+    def remove(self, workspace_id: str) -> None:
+        # O marcador pendente vira no-op: o diretório não existe mais
+        shutil.rmtree(self._ws_path(workspace_id), ignore_errors=True)
+
+    @contextmanager
+    def discard_on_error(self, ws: Workspace) -> Iterator[Workspace]:
+        """Apaga o diretório se a requisição falhar antes de entregar a resposta."""
+        try:
+            yield ws
+        except BaseException:
+            self.remove(ws.id)
+            raise
+
+    def _expires_at(self, workspace_id: str) -> float | None:
+        try:
+            with open(os.path.join(self._ws_path(workspace_id), EXPIRES_FILE)) as f:
+                return float(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return None
+
+    def _buckets(self) -> list[tuple[int, str]]:
+        buckets: list[tuple[int, str]] = []
+        for entry in os.scandir(self._expiry):
+            if entry.name.isdigit():
+                buckets.append((int(entry.name), entry.path))
+        buckets.sort()
+        return buckets
+
+    def _claim(self, bucket_path: str, workspace_id: str) -> str | None:
+        claimed = os.path.join(self._claimed, f"{workspace_id}.{uuid.uuid4().hex}")
+        try:
+            os.rename(os.path.join(bucket_path, workspace_id), claimed)
+        except OSError:
+            return None  # outra réplica pegou antes
+        return claimed
+
+    def _expire(self, bucket_path: str, workspace_id: str, now: float, force: bool) -> bool:
+        claimed = self._claim(bucket_path, workspace_id)
+        if claimed is None:
+            return False
+        try:
+            expires = self._expires_at(workspace_id)
+            if expires is None or force or expires <= now:
+                removed = os.path.isdir(self._ws_path(workspace_id))
+                self.remove(workspace_id)
+                return removed
+            return False
+        finally:
+            try:
+                os.remove(claimed)
+            except OSError:
+                pass
+
+    def sweep(self, now: float | None = None) -> int:
+        """Remove os diretórios vencidos; só lê os minutos do índice já vencidos."""
+        now = time.time() if now is None else now
+        due = int(now // BUCKET_SECONDS)
+        removed = 0
+        for bucket, path in self._buckets():
+            if bucket >= due:
+                break
+            removed += self._drain(path, now, force=False)
+        self._reap_claims(now)
+        if self.min_free_bytes and self.free_bytes() < self.min_free_bytes:
+            removed += self.ensure_free_space(now)
+        return removed
+
+    def _drain(self, bucket_path: str, now: float, force: bool, stop=None) -> int:
+        removed = 0
+        try:
+            names = os.listdir(bucket_path)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            if stop is not None and stop():
+                return removed
+            removed += self._expire(bucket_path, name, now, force)
+        try:
+            os.rmdir(bucket_path)  # só sai se vazio (outra réplica pode estar agendando)
+        except OSError:
+            pass
+        return removed
+
+    def _reap_claims(self, now: float) -> None:
+        # Reivindicação órfã (réplica morreu entre o rename e o rmtree)
+        for entry in os.scandir(self._claimed):
+            try:
+                if now - entry.stat().st_mtime > CLAIM_MAX_AGE_SECONDS:
+                    self.remove(entry.name.split(".", 1)[0])
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+    def free_bytes(self) -> int:
+        st = os.statvfs(self.root)
+        return st.f_bavail * st.f_frsize
+
+    def ensure_free_space(self, now: float | None = None) -> int:
+        """Abaixo da marca d'água (STORAGE_MIN_FREE_MB), remove os mais antigos primeiro.
+
+        A ordem vem do próprio índice: os que expiram antes foram criados antes.
+        """
+        now = time.time() if now is None else now
+        removed = 0
+
+        def enough() -> bool:
+            return self.free_bytes() >= self.min_free_bytes
+
+        for _bucket, path in self._buckets():
+            if enough():
+                break
+            removed += self._drain(path, now, force=True, stop=enough)
+        return removed
+
+
+_storages: dict[tuple[str, int, int], StorageManager] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage() -> StorageManager:
+    settings = get_settings()
+    conf = (
+        settings.TMP_DIR,
+        settings.TTL_UPLOAD_MINUTES * 60,
+        settings.STORAGE_MIN_FREE_MB * 1024 * 1024,
+    )
+    with _storages_lock:
+        storage = _storages.get(conf)
+        if storage is None:
+            storage = StorageManager(*conf)
+            _storages[conf] = storage
+    return storage
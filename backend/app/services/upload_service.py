@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from typing import IO, Any, Literal
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.services.storage_service import Workspace, get_storage
+from app.utils.ingest import IngestedFile, PdfScanner
+from app.utils.metrics import stage
+from app.utils.mime import is_image, is_pdf, looks_like_pdf
+from app.utils.security import is_uuid4
+from app.utils.validators import stream_save_image, stream_save_pdf, stream_save_pdfs_for_merge
+
+# Upload retomável: um diretório do storage por upload (w/<upload_id>/) com
+# os bytes recebidos até agora em DATA_NAME e o estado em META_NAME.
+# O offset é o tamanho de DATA_NAME: um PATCH interrompido mantém o que chegou.
+DATA_NAME = "data"
+META_NAME = "upload.json"
+READ_CHUNK = 1024 * 1024
+
+UploadKind = Literal["pdf", "image"]
+
+
+def _ws(upload_id: str) -> Workspace:
+    ws = get_storage().open(upload_id) if is_uuid4(upload_id) else None
+    if ws is None or not os.path.exists(ws.file(META_NAME)):
+        raise HTTPException(status_code=404, detail="Upload não encontrado")
+    return ws
+
+
+def _read_meta(ws: Workspace) -> dict[str, Any]:
+    with open(ws.file(META_NAME), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_meta(ws: Workspace, meta: dict[str, Any]) -> None:
+    tmp = ws.file(f"{META_NAME}.{uuid.uuid4().hex}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, ws.file(META_NAME))
+
+
+def _open_locked(ws: Workspace) -> IO[bytes]:
+    """Exclusivo por upload (flock): dois PATCH simultâneos não intercalam bytes.
+
+    Vale entre processos e réplicas que compartilham o volume.
+    """
+    f = open(ws.file(DATA_NAME), "ab")  # noqa: SIM115
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError as err:
+        f.close()
+        raise HTTPException(status_code=409, detail="Envio em andamento") from err
+    return f
+
+
+@contextmanager
+def _locked(ws: Workspace) -> Iterator[IO[bytes]]:
+    f = _open_locked(ws)
+    try:
+        yield f
+    finally:
+        f.close()
+
+
+def create_upload(filename: str, content_type: str | None, length: int, max_bytes: int) -> dict:
+    if length <= 0:
+        raise HTTPException(status_code=400, detail="Tamanho do upload inválido")
+    if length > max_bytes:
+        raise HTTPException(status_code=413, detail="Arquivo excede o limite de tamanho")
+    # Tipo e assinatura só são verificados no complete, com o arquivo inteiro
+    ws = get_storage().create()
+    open(ws.file(DATA_NAME), "wb").close()  # noqa: SIM115
+    meta = {
+        "filename": os.path.basename(filename),
+        "content_type": content_type,
+        "length": length,
+        "ingested": None,
+    }
+    _write_meta(ws, meta)
+    return {"uploadId": ws.id, "offset": 0, "length": length}
+
+
+def upload_offset(upload_id: str) -> tuple[int, int]:
+    """(offset, tamanho total) do upload."""
+    ws = _ws(upload_id)
+    meta = _read_meta(ws)
+    return os.path.getsize(ws.file(DATA_NAME)), meta["length"]
+
+
+def _open_for_append(upload_id: str, offset: int) -> tuple[Workspace, int, IO[bytes]]:
+    """(workspace, tamanho declarado, arquivo travado) para o PATCH em offset."""
+    ws = _ws(upload_id)
+    meta = _read_meta(ws)
+    if meta["ingested"] is not None:
+        raise HTTPException(status_code=409, detail="Upload já finalizado")
+    f = _open_locked(ws)
+    current = os.fstat(f.fileno()).st_size
+    if offset != current:
+        f.close()
+        raise HTTPException(
+            status_code=409,
+            detail="Upload-Offset não confere",
+            headers={"Upload-Offset": str(current)},
+        )
+    return ws, meta["length"], f
+
+
+def _finish_append(f: IO[bytes], tail: bytearray) -> None:
+    try:
+        f.write(tail)
+        f.flush()
+    finally:
+        f.close()
+
+
+async def append_chunk(upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+    """Grava o corpo do PATCH a partir de offset; retorna o novo offset.
+
+    offset tem que ser exatamente o que o servidor já tem (409 com o atual, senão):
+    o cliente pergunta (HEAD) e reenvia só o que falta. O disco só é tocado no
+    threadpool, em blocos de até READ_CHUNK: o event loop só junta os pedaços.
+    """
+    ws, length, f = await run_in_threadpool(_open_for_append, upload_id, offset)
+    current = offset
+    buf = bytearray()
+    try:
+        with stage("upload"):
+            async for chunk in chunks:
+                if current + len(chunk) > length:
+                    raise HTTPException(status_code=413, detail="Dados além do tamanho declarado")
+                buf += chunk
+                current += len(chunk)
+                if len(buf) >= READ_CHUNK:
+                    await run_in_threadpool(f.write, buf)
+                    buf.clear()
+    finally:
+        # O que chegou antes de uma queda conta para a retomada
+        await run_in_threadpool(_finish_append, f, buf)
+    await run_in_threadpool(get_storage().extend, ws.id)
+    return current
+
+
+def _scan(path: str, check_head, scanner: PdfScanner | None) -> tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK):
+            if not size:
+                check_head(chunk)
+            size += len(chunk)
+            digest.update(chunk)
+            if scanner is not None:
+                scanner.feed(chunk)
+    return size, digest.hexdigest()
+
+
+def _ingest_assembled(ws: Workspace, meta: dict[str, Any]) -> dict[str, Any]:
+    """Mesmas regras do stream_save_pdf/stream_save_image, sobre o arquivo montado."""
+    filename, content_type = meta["filename"], meta["content_type"]
+    path = ws.file(DATA_NAME)
+    kind: dict[str, UploadKind] = {}
+
+    def check_head(chunk: bytes) -> None:
+        if is_pdf(filename, content_type) or looks_like_pdf(chunk):
+            kind["value"] = "pdf"
+        elif is_image(filename, content_type):
+            kind["value"] = "image"
+        else:
+            raise HTTPException(status_code=415, detail="Apenas PDF/JPG/PNG são aceitos")
+
+    scanner = PdfScanner()
+    size, sha256 = _scan(path, check_head, scanner)
+    page_count = None
+    if kind["value"] == "pdf":
+        scanner.close()
+        if scanner.has_javascript:
+            raise HTTPException(status_code=415, detail="PDF contém JavaScript/ações embutidas")
+        page_count = scanner.page_count
+    return {"kind": kind["value"], "size": size, "sha256": sha256, "page_count": page_count}
+
+
+def complete_upload(upload_id: str) -> dict[str, Any]:
+    """Valida o arquivo montado (tamanho, assinatura, JS) e libera o uploadId para uso."""
+    ws = _ws(upload_id)
+    with _locked(ws) as f:
+        meta = _read_meta(ws)
+        if meta["ingested"] is None:
+            size = os.fstat(f.fileno()).st_size
+            if size != meta["length"]:
+                raise HTTPException(
+                    status_code=409,
+                    detail="Upload incompleto",
+                    headers={"Upload-Offset": str(size)},
+                )
+            try:
+                meta["ingested"] = _ingest_assembled(ws, meta)
+            except HTTPException:
+                get_storage().remove(ws.id)
+                raise
+            _write_meta(ws, meta)
+    info = meta["ingested"]
+    return {
+        "uploadId": ws.id,
+        "kind": info["kind"],
+        "size": info["size"],
+        "sha256": info["sha256"],
+        "pageCount": info["page_count"],
+    }
+
+
+def take_upload(upload_id: str, dest_dir: str, kind: UploadKind | None = None) -> IngestedFile:
+    """Coloca um upload finalizado em dest_dir (hard link; o upload continua
+    valendo até expirar, então pode alimentar mais de uma operação).
+    """
+    ws = _ws(upload_id)
+    meta = _read_meta(ws)
+    info = meta["ingested"]
+    if info is None:
+        raise HTTPException(status_code=409, detail="Upload não finalizado")
+    if kind is not None and info["kind"] != kind:
+        msg = "Apenas PDF é aceito" if kind == "pdf" else "Apenas JPG/PNG são aceitos"
+        raise HTTPException(status_code=415, detail=msg)
+    ext = os.path.splitext(meta["filename"])[1].lower()
+    out_path = os.path.join(dest_dir, f"{uuid.uuid4()}{ext}")
+    os.makedirs(dest_dir, exist_ok=True)
+    try:
+        os.link(ws.file(DATA_NAME), out_path)
+    except OSError:
+        shutil.copyfile(ws.file(DATA_NAME), out_path)
+    return IngestedFile(
+        path=out_path, size=info["size"], sha256=info["sha256"], page_count=info["page_count"]
+    )
+
+
+async def save_pdf_input(
+    file: UploadFile | None,
+    upload_id: str | None,
+    tmp_dir: str,
+    max_bytes: int,
+    type_error_msg: str = "Apenas PDF é aceito",
+) -> IngestedFile:
+    """PDF da requisição: multipart (file) ou upload retomável já finalizado (upload_id)."""
+    if upload_id:
+        return await run_in_threadpool(take_upload, upload_id, tmp_dir, "pdf")
+    if file is None:
+        raise HTTPException(status_code=400, detail="Envie o arquivo ou upload_id")
+    return await stream_save_pdf(file, tmp_dir, max_bytes, type_error_msg)
+
+
+async def save_any_input(
+    file: UploadFile | None, upload_id: str | None, tmp_dir: str, max_bytes: int
+) -> IngestedFile:
+    """PDF ou imagem (OCR), pelos mesmos dois caminhos."""
+    if upload_id:
+        return await run_in_threadpool(take_upload, upload_id, tmp_dir)
+    if file is None:
+        raise HTTPException(status_code=400, detail="Envie o arquivo ou upload_id")
+    if is_pdf(file.filename or "", file.content_type):
+        return await stream_save_pdf(file, tmp_dir, max_bytes, "Apenas PDF é aceito")
+    return await stream_save_image(file, tmp_dir, max_bytes)
+
+
+def parse_upload_ids(upload_ids: str | None) -> list[str]:
+    return [u.strip() for u in (upload_ids or "").split(",") if u.strip()]
+
+
+async def save_pdfs_for_merge_input(
+    files: list[UploadFile] | None,
+    upload_ids: list[str],
+    tmp_dir: str,
+    max_bytes: int,
+    total_limit_bytes: int,
+) -> list[IngestedFile]:
+    """Entradas do merge, na ordem: uploadIds (se vierem) ou os arquivos do multipart."""
+    if not upload_ids:
+        return await stream_save_pdfs_for_merge(files or [], tmp_dir, max_bytes, total_limit_bytes)
+    saved = [await run_in_threadpool(take_upload, u, tmp_dir, "pdf") for u in upload_ids]
+    if sum(item.size for item in saved) > total_limit_bytes:
+        raise HTTPException(status_code=413, detail="Soma dos arquivos excede 100MB")
+    return saved
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import pytest
+
+from app.config import get_settings
+
+
+@pytest.fixture(autouse=True)
+def fresh_settings():
+    """Configuração relida do ambiente em cada teste (get_settings é memoizada).
+
+    monkeypatch.setenv vale se vier antes do primeiro get_settings() do teste.
+    """
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from http import HTTPStatus
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.routes import ocr as ocr_route
+from app.tests.test_api import make_pdf_bytes
+from app.utils import admission
+from app.utils.admission import AdmissionController, AdmissionRejectedError
+from app.utils.cost import Budget, estimate_budget
+
+
+def test_budget_rejects_over_cpu_or_memory_and_releases():
+    ctl = AdmissionController(cpu_slots=2, memory_mb=100, retry_after=3)
+    a = ctl.acquire(Budget(1, 60))
+    with pytest.raises(AdmissionRejectedError) as exc:
+        ctl.acquire(Budget(1, 60))
+    assert exc.value.retry_after == 3  # noqa: PLR2004
+    b = ctl.acquire(Budget(1, 40))
+    with pytest.raises(AdmissionRejectedError):
+        ctl.acquire(Budget(1, 1))
+    a.release()
+    a.release()  # idempotente
+    b.release()
+    stats = ctl.stats()
+    assert stats["cpuInUse"] == 0
+    assert stats["memoryInUseMb"] == 0
+    assert stats["rejected"] == 2  # noqa: PLR2004
+
+
+def test_oversized_request_runs_alone():
+    ctl = AdmissionController(cpu_slots=1, memory_mb=10)
+    with ctl.acquire(Budget(4, 500)):
+        with pytest.raises(AdmissionRejectedError):
+            ctl.acquire(Budget(1, 1))
+    assert ctl.stats()["cpuInUse"] == 0
+
+
+def test_render_budget_grows_with_dpi():
+    low = estimate_budget("to-images", pages=50, dpi=72, render_batch=4)
+    high = estimate_budget("to-images", pages=50, dpi=300, render_batch=4)
+    assert high.memory_mb > low.memory_mb
+    # Só a janela de páginas fica em memória, não o documento inteiro
+    assert estimate_budget("to-images", pages=500, dpi=300, render_batch=4) == high
+
+
+@pytest.mark.asyncio
+async def test_compress_503_when_budget_exhausted(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    ctl = AdmissionController(cpu_slots=1, memory_mb=1024)
+    monkeypatch.setattr(admission, "_controller", ctl)
+    held = ctl.acquire(Budget(1, 1))
+    files = {"file": ("a.pdf", make_pdf_bytes(1), "application/pdf")}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/pdf/compress", files=files, data={"quality": "low"})
+        assert resp.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+        assert resp.headers["retry-after"] == "5"
+        assert resp.json()["jobs"] == "/api/jobs"
+        health = (await ac.get("/api/health")).json()
+    assert health["admission"]["cpuInUse"] == 1
+    assert health["admission"]["rejected"] == 1
+    held.release()
+
+
+@pytest.mark.asyncio
+async def test_ocr_admits_unknown_page_count_as_the_page_cap(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setenv("OCR_MAX_PAGES", "7")
+    admitted = []
+
+    def fake_admit(op, _settings, *, pages, size_bytes):  # noqa: ARG001
+        admitted.append(pages)
+        raise AdmissionRejectedError("cheio")
+
+    monkeypatch.setattr(ocr_route, "admit", fake_admit)
+    # Atualização incremental (dois startxref): a contagem barata fica None
+    pdf = make_pdf_bytes(2) + b"\nstartxref\n0\n%%EOF\n"
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        await ac.post("/api/ocr", files={"file": ("a.pdf", pdf, "application/pdf")})
+        await ac.post("/api/ocr", files={"file": ("a.pdf", make_pdf_bytes(2), "application/pdf")})
+    assert admitted == [7, 2]
+    assert ocr_route.admission_pages("scan.png", None, 7) == 1
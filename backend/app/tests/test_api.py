@@ -2,12 +2,16 @@ from __future__ import annotations
 
 import io
 from http import HTTPStatus
+from zipfile import ZipFile
 
 import pytest
 from httpx import ASGITransport, AsyncClient
+from PIL import Image
 from pypdf import PdfWriter
 
 from app.main import app
+from app.routes import pdf_compress
+from app.utils.executors import PoolBusyError
 
 
 def make_pdf_bytes(pages: int = 1) -> bytes:
@@ -46,6 +50,40 @@ async def test_split_invalid_ranges(tmp_path, monkeypatch):
         assert resp.status_code == HTTPStatus.BAD_REQUEST
 
 
+@pytest.mark.asyncio
+async def test_split_streams_zip(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    content = make_pdf_bytes(3)
+    files = {"file": ("src.pdf", content, "application/pdf")}
+    data = {"ranges": "1-2,3"}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/pdf/split", files=files, data=data)
+        assert resp.status_code == HTTPStatus.OK
+    with ZipFile(io.BytesIO(resp.content)) as zf:
+        EXPECTED_PARTS = 2
+        assert len(zf.namelist()) == EXPECTED_PARTS
+
+
+@pytest.mark.asyncio
+async def test_to_images_streams_png_zip(tmp_path, monkeypatch):
+    import app.services.images_service as images_svc  # noqa: PLC0415
+
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    # Imagens PIL de verdade: o PNG é codificado pelo próprio app
+    monkeypatch.setenv("RENDER_BACKEND", "pil")
+
+    def fake_convert_from_path(path, dpi=200, first_page=1, last_page=None, **_kw):  # noqa: ARG001
+        return [Image.new("RGB", (8, 8)) for _ in range(first_page, (last_page or 2) + 1)]
+
+    monkeypatch.setattr(images_svc, "convert_from_path", fake_convert_from_path)
+    files = {"file": ("src.pdf", make_pdf_bytes(2), "application/pdf")}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/pdf/to-images", files=files, data={"dpi": "72"})
+        assert resp.status_code == HTTPStatus.OK
+    with ZipFile(io.BytesIO(resp.content)) as zf:
+        assert zf.namelist() == ["page_1.png", "page_2.png"]
+
+
 @pytest.mark.asyncio
 async def test_upload_too_large_header(monkeypatch):
     # Força Content-Length alto para 413
@@ -53,3 +91,19 @@ async def test_upload_too_large_header(monkeypatch):
         headers = {"Content-Length": str(26 * 1024 * 1024)}
         resp = await ac.post("/api/pdf/merge", headers=headers)
         assert resp.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+
+@pytest.mark.asyncio
+async def test_compress_returns_503_when_gs_pool_busy(tmp_path, monkeypatch):
+    async def busy(name, *args, **kwargs):
+        raise PoolBusyError(name, retry_after=7)
+
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(pdf_compress, "run_in_pool", busy)
+    files = {"file": ("a.pdf", make_pdf_bytes(1), "application/pdf")}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/pdf/compress", files=files, data={"quality": "low"})
+    assert resp.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert resp.headers["retry-after"] == "7"
+    # Diretório da requisição (upload incluso) sai junto com o 503
+    assert not list((tmp_path / "w").iterdir())
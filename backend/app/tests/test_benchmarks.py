@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import hashlib
+
+from pypdf import PdfReader
+
+from benchmarks.corpus import write_text_pdf
+from benchmarks.report import compare
+
+
+def test_text_corpus_is_deterministic(tmp_path):
+    a, b = tmp_path / "a.pdf", tmp_path / "b.pdf"
+    write_text_pdf(str(a), 3)
+    write_text_pdf(str(b), 3)
+    assert hashlib.sha256(a.read_bytes()).digest() == hashlib.sha256(b.read_bytes()).digest()
+    reader = PdfReader(str(a))
+    assert len(reader.pages) == 3  # noqa: PLR2004
+    assert "Pagina 2" in reader.pages[1].extract_text()
+
+
+def test_compare_flags_only_relevant_regressions():
+    baseline = {"results": {"merge": {"seconds": 1.0}, "tiny": {"seconds": 0.001}}}
+    current = {
+        "results": {
+            "merge": {"seconds": 1.5},
+            "tiny": {"seconds": 0.003},  # 3x, mas abaixo do piso de ruído
+            "ocr": {"skipped": "ausente: tesseract"},
+        }
+    }
+    rows = {r["case"]: r for r in compare(current, baseline, threshold=0.25)}
+    assert rows["merge"]["regression"]
+    assert not rows["tiny"]["regression"]
+    assert "ocr" not in rows
+
+
+def test_loadtest_summary_keeps_rejections_out_of_percentiles():
+    from collections import Counter  # noqa: PLC0415
+
+    from benchmarks.loadtest import RouteStats, pick_scenarios, route_summary  # noqa: PLC0415
+
+    stats = RouteStats(
+        latencies=[0.1] * 98 + [2.0, 3.0],
+        statuses=Counter({200: 99, 500: 1, 429: 50, 503: 50}),
+    )
+    summary = route_summary(stats, elapsed=10.0)
+    assert summary["requests"] == 200  # noqa: PLR2004
+    assert summary["rate429"] == summary["rate503"] == 0.25  # noqa: PLR2004
+    assert summary["errorRate"] == 0.005  # noqa: PLR2004
+    assert summary["p50"] == 0.1  # noqa: PLR2004
+    assert (summary["p99"], summary["max"]) == (2.0, 3.0)
+    assert all(spec[0] == "light" for spec in pick_scenarios("light", []).values())
+    assert list(pick_scenarios("mixed", ["job/ocr"])) == ["job/ocr"]
+    # Scrape do Prometheus também entra na carga
+    assert "metrics/scrape" in pick_scenarios("light", [])
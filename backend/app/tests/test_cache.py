@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+
+import pytest
+
+from app.services import cache_service
+from app.services.cache_service import (
+    MANIFEST,
+    ResultCache,
+    cached_file,
+    cached_members,
+    make_key,
+)
+
+
+def test_make_key_normalizes_params():
+    a = make_key("compress", ["abc"], {"quality": "low", "x": 1})
+    b = make_key("compress", ["abc"], {"x": 1, "quality": "low"})
+    assert a == b
+    assert a != make_key("compress", ["abc"], {"quality": "high", "x": 1})
+
+
+def test_cache_hit_miss_and_ttl(tmp_path):
+    cache = ResultCache(str(tmp_path / "c"), max_bytes=1024 * 1024, ttl_seconds=60)
+    src = tmp_path / "out.pdf"
+    src.write_bytes(b"%PDF-1.4 result")
+    assert cache.get("k1") is None
+    cache.put_files("k1", [str(src)])
+    hit = cache.get("k1")
+    assert hit and hit[0][0] == "out.pdf"
+    assert open(hit[0][1], "rb").read() == b"%PDF-1.4 result"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.get("k1") is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / "c"), max_bytes=400, ttl_seconds=3600)
+    for key in ("old", "mid"):
+        stage = cache.stage(key)
+        stage.add_bytes("r.bin", b"x" * 100)
+        stage.commit()
+    # "old" acessado por último: "mid" passa a ser o menos usado
+    past = time.time() - 100
+    os.utime(cache._entry_dir("mid"), (past, past))
+    assert cache.get("old") is not None
+    stage = cache.stage("new")
+    stage.add_bytes("r.bin", b"x" * 100)
+    stage.commit()
+    assert cache.get("mid") is None
+    assert cache.get("old") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_evict_expires_by_creation_even_if_recently_read(tmp_path):
+    cache = ResultCache(str(tmp_path / "c"), max_bytes=1024 * 1024, ttl_seconds=60)
+    for key in ("hot", "fresh"):
+        stage = cache.stage(key)
+        stage.add_bytes("r.bin", b"x")
+        stage.commit()
+    manifest = os.path.join(cache._entry_dir("hot"), MANIFEST)
+    with open(manifest, encoding="utf-8") as f:
+        data = json.load(f)
+    data["created"] = time.time() - 120
+    with open(manifest, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    # Lida agora (mtime novo), mas criada há mais que o TTL: vence igual ao get
+    os.utime(cache._entry_dir("hot"))
+    assert cache.evict() == 1
+    assert not os.path.exists(cache._entry_dir("hot"))
+    assert cache.get("fresh") is not None
+
+
+def test_cached_helpers_skip_work_on_hit(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    calls = []
+
+    def produce_file(path):
+        calls.append(path)
+        with open(path, "wb") as f:
+            f.write(b"merged")
+
+    key = make_key("merge", ["h1", "h2"], {})
+    out1, out2 = str(tmp_path / "a.pdf"), str(tmp_path / "b.pdf")
+    cached_file(key, out1, lambda: produce_file(out1))
+    cached_file(key, out2, lambda: produce_file(out2))
+    assert calls == [out1]
+    assert open(out2, "rb").read() == b"merged"
+
+    def pages():
+        yield "p1.png", b"1"
+        yield "p2.png", b"2"
+
+    mkey = make_key("to-images", ["h"], {"dpi": 72})
+    assert [m[1] for m in cached_members(mkey, pages)] == [b"1", b"2"]
+    hit = list(cached_members(mkey, lambda: pytest.fail("não deveria renderizar")))
+    assert [name for name, _path in hit] == ["p1.png", "p2.png"]
+    assert cache_service.cache_stats()["hits"] == 2  # noqa: PLR2004
+
+
+def test_cached_members_discards_incomplete_results(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+
+    def failing():
+        yield "p1.png", b"1"
+        raise RuntimeError("falhou no meio")
+
+    key = make_key("to-images", ["h"], {"dpi": 150})
+    with pytest.raises(RuntimeError):
+        list(cached_members(key, failing))
+    assert cache_service.get_result_cache().get(key) is None
+
+
+def test_oversized_result_is_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path / "c"), max_bytes=400, ttl_seconds=3600)
+    small = cache.stage("small")
+    small.add_bytes("r.bin", b"x" * 100)
+    small.commit()
+    big = cache.stage("big")
+    for i in range(5):
+        big.add_bytes(f"p{i}.png", b"x" * 100)
+    big.commit()
+    assert big.oversize
+    assert cache.get("big") is None
+    assert cache.get("small") is not None
+    assert cache.stats()["evictions"] == 0
+    assert not os.listdir(tmp_path / "c" / ".staging")
+
+
+def test_evict_sweeps_orphaned_staging(tmp_path):
+    cache = ResultCache(str(tmp_path / "c"), max_bytes=1024, ttl_seconds=3600)
+    orphan = cache.stage("k")
+    orphan.add_bytes("r.bin", b"x")
+    fresh = cache.stage("k2")
+    staging = tmp_path / "c" / ".staging"
+    past = time.time() - cache_service.STAGING_MAX_AGE_SECONDS - 10
+    os.utime(orphan._dir, (past, past))
+    cache.evict()
+    assert [p.name for p in staging.iterdir()] == [os.path.basename(fresh._dir)]
+
+
+def test_commit_skips_full_scan_below_limit(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path / "c"), max_bytes=10_000, ttl_seconds=3600)
+    scans = []
+    real_entries = cache._entries
+    monkeypatch.setattr(cache, "_entries", lambda: scans.append(1) or real_entries())
+    for key in ("a", "b", "c"):
+        stage = cache.stage(key)
+        stage.add_bytes("r.bin", b"x" * 10)
+        stage.commit()
+    # Só a primeira gravação varre (tamanho ainda desconhecido)
+    assert len(scans) == 1
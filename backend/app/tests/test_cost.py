@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from app.utils.cost import PRIORITY_MAX, estimate_cost, priority_for, queue_for
+from app.workers.celery_app import route_task
+
+
+def test_small_jobs_get_higher_priority():
+    small_merge = estimate_cost("merge", pages=2, size_bytes=100_000)
+    big_ocr = estimate_cost("ocr", pages=50)
+    assert priority_for(small_merge) == 0
+    assert priority_for(big_ocr) == PRIORITY_MAX
+    # Mesmo PDF: 600 DPI custa 16× 150 DPI
+    assert estimate_cost("to-images", pages=4, dpi=600) == 16 * estimate_cost(
+        "to-images", pages=4, dpi=150
+    )
+
+
+def test_tasks_are_routed_per_operation():
+    assert queue_for("compress") == "gs"
+    assert route_task("app.workers.tasks.task_ocr", (), {}, {}) == {"queue": "ocr"}
+    assert route_task("app.workers.tasks.task_merge", (), {}, {}) == {"queue": "light"}
+    step = {"op": "to-images", "fmt": "png", "dpi": 150}
+    assert route_task("app.workers.tasks.task_pipeline_step", ({}, step), {}, {}) == {
+        "queue": "render"
+    }
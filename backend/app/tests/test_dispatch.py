@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import time
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.tests.test_api import make_pdf_bytes
+from app.utils import dispatch
+from app.utils.dispatch import COST_MESSAGE_HEADER, ServiceTimes
+from app.workers import tasks
+
+
+def test_service_times_learn_from_observations():
+    times = ServiceTimes(alpha=0.5)
+    assert times.predict("merge", 2.0) == 2.0  # noqa: PLR2004
+    times.observe("merge", 2.0, 0.2)
+    assert times.predict("merge", 2.0) == pytest.approx(0.2)
+    times.observe("merge", 1.0, 0.3)
+    # EWMA: metade do caminho entre 0.1 e 0.3 s por unidade
+    assert times.predict("merge", 1.0) == pytest.approx(0.2)
+    assert times.stats()["merge"]["samples"] == 2  # noqa: PLR2004
+
+
+def test_learned_rate_decays_toward_default_without_samples():
+    times = ServiceTimes(alpha=0.5, half_life=100.0)
+    times.observe("ocr", 1.0, 9.0, now=0.0)
+    assert times.predict("ocr", 1.0, now=0.0) == pytest.approx(9.0)
+    # Uma meia-vida depois: metade do caminho de volta para 1 s por unidade
+    assert times.predict("ocr", 1.0, now=100.0) == pytest.approx(5.0)
+    # A amostra nova entra sobre a taxa já decaída
+    times.observe("ocr", 1.0, 1.0, now=100.0)
+    assert times.predict("ocr", 1.0, now=100.0) == pytest.approx(3.0)
+
+
+def test_shared_rates_replace_local_ones():
+    times = ServiceTimes()
+    times.observe("ocr", 1.0, 0.1)
+    times.load({b"ocr:rate": b"4.0", b"ocr:at": str(time.time()).encode(), b"ocr:n": b"7"})
+    assert times.predict("ocr", 2.0) == pytest.approx(8.0, rel=1e-3)
+    assert times.stats()["ocr"]["samples"] == 7  # noqa: PLR2004
+    assert not times.needs_refresh()
+
+
+def test_worker_completion_feeds_the_model(monkeypatch):
+    monkeypatch.setenv("ASYNC_JOBS", "false")
+    monkeypatch.setattr(dispatch, "_times", ServiceTimes())
+    task = SimpleNamespace(name="t", request={COST_MESSAGE_HEADER: ["compress", 2.0]})
+    tasks._start_timer(task_id="j1")  # noqa: SLF001
+    tasks._observe_runtime(task_id="j1", task=task, state="SUCCESS")  # noqa: SLF001
+    assert dispatch.get_service_times().stats()["compress"]["samples"] == 1
+    # Falha não ensina nada: o tempo até o erro não é tempo de serviço
+    tasks._start_timer(task_id="j2")  # noqa: SLF001
+    tasks._observe_runtime(task_id="j2", task=task, state="FAILURE")  # noqa: SLF001
+    assert dispatch.get_service_times().stats()["compress"]["samples"] == 1
+
+
+@pytest.mark.asyncio
+async def test_auto_mode_runs_small_job_inline(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(dispatch, "_times", ServiceTimes())
+    files = [
+        ("files", ("a.pdf", make_pdf_bytes(1), "application/pdf")),
+        ("files", ("b.pdf", make_pdf_bytes(2), "application/pdf")),
+    ]
+    data = {"type": "merge", "mode": "auto"}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/jobs", files=files, data=data)
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.headers["content-type"] == "application/pdf"
+    assert resp.content.startswith(b"%PDF")
+    assert dispatch.get_service_times().stats()["merge"]["samples"] == 1
+
+
+@pytest.mark.asyncio
+async def test_auto_mode_queues_large_job(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setenv("AUTO_SYNC_MAX_SECONDS", "0")
+    submitted = {}
+
+    def fake_apply_async(kwargs=None, task_id=None, priority=None, headers=None):
+        submitted.update(kwargs=kwargs, task_id=task_id, priority=priority)
+
+    monkeypatch.setattr(tasks.task_compress, "apply_async", fake_apply_async)
+    files = {"file": ("a.pdf", make_pdf_bytes(1), "application/pdf")}
+    data = {"type": "compress", "quality": "low", "mode": "auto"}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/jobs", files=files, data=data)
+    assert resp.status_code == HTTPStatus.ACCEPTED
+    assert resp.json()["jobId"] == submitted["task_id"]
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import hashlib
+from http import HTTPStatus
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.routes import pdf_compress
+from app.services.artifact_service import describe_artifact
+from app.services.storage_service import get_storage
+from app.tests.test_api import make_pdf_bytes
+from app.workers import celery_app
+
+
+def _job_result(monkeypatch, tmp_path, body: bytes) -> tuple[str, dict]:
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    job_id = str(uuid4())
+    ws = get_storage().create(workspace_id=job_id)
+    out = ws.file(f"job-{job_id}.pdf")
+    with open(out, "wb") as f:
+        f.write(body)
+    info = describe_artifact(out, "application/pdf", "compressed.pdf")
+    monkeypatch.setattr(
+        celery_app.celery, "AsyncResult", lambda jid: SimpleNamespace(state="SUCCESS", info=info)
+    )
+    return job_id, info
+
+
+def test_describe_artifact(tmp_path):
+    path = tmp_path / "r.txt"
+    path.write_bytes(b"texto")
+    info = describe_artifact(str(path), "text/plain", "result.txt")
+    assert info == {
+        "path": str(path),
+        "size": 5,
+        "content_type": "text/plain",
+        "sha256": hashlib.sha256(b"texto").hexdigest(),
+        "filename": "result.txt",
+    }
+
+
+@pytest.mark.asyncio
+async def test_job_download_uses_recorded_artifact(tmp_path, monkeypatch):
+    job_id, info = _job_result(monkeypatch, tmp_path, b"%PDF-1.4 ok")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.get(f"/api/jobs/{job_id}/download")
+        missing = await ac.get(f"/api/jobs/{uuid4()}/download")
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.content == b"%PDF-1.4 ok"
+    assert resp.headers["etag"] == f'"{info["sha256"]}"'
+    assert 'filename="compressed.pdf"' in resp.headers["content-disposition"]
+    assert missing.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_job_download_x_accel(tmp_path, monkeypatch):
+    monkeypatch.setenv("DOWNLOAD_MODE", "x-accel")
+    job_id, _info = _job_result(monkeypatch, tmp_path, b"%PDF-1.4 ok")
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.get(f"/api/jobs/{job_id}/download")
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.headers["x-accel-redirect"] == f"/_protected/w/{job_id}/job-{job_id}.pdf"
+    assert resp.headers["content-type"] == "application/pdf"
+    assert resp.content == b""
+
+
+@pytest.mark.asyncio
+async def test_compress_x_accel_keeps_workspace_for_nginx(tmp_path, monkeypatch):
+    async def fake_pool(name, fn, key, out_path, produce):  # noqa: ARG001
+        with open(out_path, "wb") as f:
+            f.write(b"%PDF-1.4 small")
+
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setenv("DOWNLOAD_MODE", "x-accel")
+    monkeypatch.setattr(pdf_compress, "run_in_pool", fake_pool)
+    files = {"file": ("a.pdf", make_pdf_bytes(1), "application/pdf")}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/pdf/compress", files=files, data={"quality": "low"})
+    assert resp.status_code == HTTPStatus.OK
+    target = resp.headers["x-accel-redirect"]
+    assert target.startswith("/_protected/w/") and target.endswith("/compressed.pdf")
+    # O nginx ainda vai abrir o arquivo: ele só sai pela expiração
+    assert (tmp_path / target.removeprefix("/_protected/")).exists()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import io
+
+import pytest
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NumberObject,
+)
+
+import app.services.images_service as svc
+from app.config import get_settings
+from app.tests.test_to_images import fake_document
+from app.utils import embedded
+from app.utils.embedded import page_image
+
+MAX_BYTES = 1024 * 1024
+
+
+def scan_page(color: tuple[int, int, int]) -> PdfReader:
+    """Página como a de um scanner: um JPEG cobrindo a página inteira."""
+    buf = io.BytesIO()
+    Image.new("RGB", (40, 30), color).save(buf, "PDF", resolution=72)
+    return PdfReader(io.BytesIO(buf.getvalue()))
+
+
+def flate_gray_page(
+    content: bytes = b"q 3 0 0 2 0 0 cm /Im0 Do Q",
+    size: tuple[int, int] = (3, 2),
+    pixels: bytes = bytes([0, 64, 128, 192, 255, 10]),
+) -> DictionaryObject:
+    writer = PdfWriter()
+    page = writer.add_blank_page(width=3, height=2)
+    image = DecodedStreamObject()
+    image.set_data(pixels)
+    image.update(
+        {
+            NameObject("/Type"): NameObject("/XObject"),
+            NameObject("/Subtype"): NameObject("/Image"),
+            NameObject("/Width"): NumberObject(size[0]),
+            NameObject("/Height"): NumberObject(size[1]),
+            NameObject("/ColorSpace"): NameObject("/DeviceGray"),
+            NameObject("/BitsPerComponent"): NumberObject(8),
+        }
+    )
+    xobjects = DictionaryObject({NameObject("/Im0"): image.flate_encode()})
+    page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): xobjects})
+    stream = DecodedStreamObject()
+    stream.set_data(content)
+    page.replace_contents(stream)
+    return page
+
+
+def test_flate_image_is_rewrapped_as_png_without_rendering():
+    image = page_image(flate_gray_page(), {"jpg", "png"}, MAX_BYTES)
+    assert image is not None and image.ext == "png"
+    with Image.open(io.BytesIO(image.data)) as png:
+        assert png.size == (3, 2)
+        assert png.tobytes() == bytes([0, 64, 128, 192, 255, 10])
+    # Pedido em JPEG: Flate precisaria recodificar, então a página é renderizada
+    assert page_image(flate_gray_page(), {"jpg"}, MAX_BYTES) is None
+
+
+def test_flate_image_above_cap_is_rendered_without_decompressing(monkeypatch):
+    monkeypatch.setattr(embedded, "_inflate", lambda *a: pytest.fail("descomprimiu"))
+    # Arquivo minúsculo declarando 12000×12000 (137 MiB descomprimidos)
+    huge = flate_gray_page(size=(12000, 12000))
+    assert page_image(huge, {"png"}, MAX_BYTES) is None
+
+
+def test_flate_stream_larger_than_declared_is_rejected():
+    # Declara 3×2, mas o stream descomprime para 1 MiB
+    bomb = flate_gray_page(pixels=bytes(MAX_BYTES))
+    assert page_image(bomb, {"png"}, MAX_BYTES) is None
+
+
+def test_pages_that_need_rendering_are_rejected():
+    # Imagem que não cobre a página, texto junto da imagem, página girada
+    assert page_image(flate_gray_page(b"q 1 0 0 1 0 0 cm /Im0 Do Q"), {"png"}, MAX_BYTES) is None
+    assert (
+        page_image(flate_gray_page(b"q 3 0 0 2 0 0 cm /Im0 Do Q BT ET"), {"png"}, MAX_BYTES) is None
+    )
+    rotated = flate_gray_page()
+    rotated[NameObject("/Rotate")] = NumberObject(90)
+    assert page_image(rotated, {"png"}, MAX_BYTES) is None
+
+
+def test_scanned_pages_pass_through_and_the_rest_is_rendered(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    writer = PdfWriter()
+    writer.append(scan_page((255, 0, 0)))
+    writer.add_blank_page(width=40, height=30)
+    writer.append(scan_page((0, 0, 255)))
+    path = tmp_path / "scan.pdf"
+    writer.write(path)
+    jpeg = scan_page((255, 0, 0)).pages[0]["/Resources"]["/XObject"]["/image"].get_data()
+
+    calls: list[tuple[int, int]] = []
+    monkeypatch.setattr(svc, "convert_from_path", fake_document(3, calls))
+    pages = list(svc.iter_pdf_page_bytes(str(path), "png", 150))
+    assert [(idx, ext) for idx, ext, _data in pages] == [(1, "jpg"), (2, "png"), (3, "jpg")]
+    # O JPEG embutido sai byte a byte; só a página em branco foi ao pdftoppm
+    assert pages[0][2] == jpeg
+    assert calls == [(2, 2)]
+
+    monkeypatch.setenv("EXTRACT_EMBEDDED_IMAGES", "false")
+    get_settings.cache_clear()
+    calls.clear()
+    assert [ext for _idx, ext, _data in svc.iter_pdf_page_bytes(str(path), "png", 150)] == [
+        "png"
+    ] * 3
+    assert calls == [(1, 3)]
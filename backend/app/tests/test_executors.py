@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import Iterator
+
+import pytest
+
+from app.utils import executors
+from app.utils.executors import OperationPool, PoolBusyError, iterate_in_pool
+
+
+@pytest.mark.asyncio
+async def test_pool_runs_off_loop_and_returns_result():
+    pool = OperationPool("t", max_workers=1, max_queue=0)
+    try:
+        loop_thread = threading.get_ident()
+        ident = await pool.run(threading.get_ident)
+        assert ident != loop_thread
+        assert pool.stats()["running"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_pool_rejects_when_queue_full():
+    pool = OperationPool("t", max_workers=1, max_queue=1)
+    gate = threading.Event()
+    try:
+        f1 = pool.submit(gate.wait, 5)
+        f2 = pool.submit(gate.wait, 5)
+        stats = pool.stats()
+        assert stats["running"] == 1
+        assert stats["queued"] == 1
+        with pytest.raises(PoolBusyError):
+            pool.submit(gate.wait, 5)
+        assert pool.stats()["rejected"] == 1
+        gate.set()
+        f1.result(timeout=5)
+        f2.result(timeout=5)
+    finally:
+        gate.set()
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_iterator_is_closed_after_running_step_when_consumer_leaves(monkeypatch):
+    pool = OperationPool("t", max_workers=1, max_queue=0)
+    monkeypatch.setattr(executors, "get_pool", lambda _name: pool)
+    started, gate, closed = threading.Event(), threading.Event(), threading.Event()
+
+    def items() -> Iterator[int]:
+        try:
+            yield 1
+            started.set()
+            gate.wait(5)
+            yield 2
+        finally:
+            closed.set()
+
+    try:
+        it = items()  # referência viva: o fechamento não pode depender do GC
+        agen = iterate_in_pool("light", it)
+        assert await anext(agen) == 1
+        # Consumidor sai com a segunda etapa ainda rodando no pool
+        step = asyncio.ensure_future(anext(agen))
+        await asyncio.to_thread(started.wait, 5)
+        step.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await step
+        await agen.aclose()
+        assert not closed.is_set()
+        gate.set()
+        assert await asyncio.to_thread(closed.wait, 5)
+    finally:
+        gate.set()
+        pool.shutdown()
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import io
+import os
+import random
+import zlib
+from http import HTTPStatus
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from pypdf import PdfWriter
+from starlette import formparsers
+
+from app.main import app
+from app.services import ocr_service
+from app.utils.ingest import IngestedFile, PdfScanner, page_count
+from app.utils.security import pdf_has_javascript
+from app.utils.spool import UploadSpool, install_upload_spool, link_spooled_upload
+
+
+def _pdf_bytes(pages: int) -> bytes:
+    w = PdfWriter()
+    for _ in range(pages):
+        w.add_blank_page(width=72, height=72)
+    bio = io.BytesIO()
+    w.write(bio)
+    return bio.getvalue()
+
+
+def _scan(data: bytes, chunk: int) -> PdfScanner:
+    scanner = PdfScanner()
+    for i in range(0, len(data), chunk):
+        scanner.feed(data[i : i + chunk])
+    scanner.close()
+    return scanner
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64, 1 << 20])
+def test_scanner_counts_pages_for_any_chunking(chunk):
+    scanner = _scan(_pdf_bytes(5), chunk)
+    assert scanner.page_count == 5  # noqa: PLR2004
+    assert not scanner.has_javascript
+
+
+def test_scanner_finds_javascript_across_chunk_boundary():
+    data = _pdf_bytes(1) + b"\n% filler " + b"x" * 100 + b" /JavaScript (app.alert(1))\n"
+    boundary = data.index(b"/JavaScript") + 4
+    scanner = PdfScanner()
+    scanner.feed(data[:boundary])
+    scanner.feed(data[boundary:])
+    scanner.close()
+    assert scanner.has_javascript
+
+
+def test_js_beyond_first_megabytes_is_detected(tmp_path):
+    path = tmp_path / "big.pdf"
+    path.write_bytes(_pdf_bytes(1) + b"%" + b"0" * 3_000_000 + b"\n<< /S /JavaScript >>\n")
+    assert pdf_has_javascript(str(path))
+
+
+def test_binary_streams_do_not_trigger_javascript_false_positive():
+    # Bytes aleatórios (imagem comprimida) contêm "/JS" por acaso; só dicionários contam
+    blob = random.Random(0).randbytes(8 * 1024 * 1024) + b"/JS /JavaScript "
+    data = (
+        _pdf_bytes(1)
+        + b"9 0 obj\n<< /Length %d /Filter /DCTDecode >>\nstream\n" % len(blob)
+        + blob
+        + b"\nendstream\nendobj\n"
+    )
+    assert not _scan(data, 64 * 1024).has_javascript
+    data += b"10 0 obj\n<< /S /JavaScript /JS (app.alert(1)) >>\nendobj\n"
+    assert _scan(data, 64 * 1024).has_javascript
+
+
+def _objstm(body: bytes, filters: bytes = b"") -> bytes:
+    return (
+        _pdf_bytes(1)
+        + b"9 0 obj\n<< /Type /ObjStm /N 1 /First 5 /Length %d %s>>\nstream\n"
+        % (len(body), filters)
+        + body
+        + b"\nendstream\nendobj\n"
+    )
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 64 * 1024])
+def test_javascript_inside_object_stream_is_detected(chunk):
+    inner = b"10 0 << /S /JavaScript /JS (app.alert(1)) >>"
+    assert _scan(_objstm(inner), chunk).has_javascript
+    assert _scan(_objstm(zlib.compress(inner), b"/Filter /FlateDecode "), chunk).has_javascript
+    clean = b"10 0 << /Type /Annot /Subtype /Link >>"
+    assert not _scan(_objstm(clean), chunk).has_javascript
+    assert not _scan(_objstm(zlib.compress(clean), b"/Filter /FlateDecode "), chunk).has_javascript
+
+
+def test_object_stream_that_cannot_be_inspected_is_suspicious():
+    inner = b"10 0 << /Type /Annot >>"
+    # Filtro que o scanner não decodifica, ou zlib corrompido
+    assert _scan(_objstm(inner, b"/Filter /LZWDecode "), 1024).has_javascript
+    assert _scan(_objstm(b"not zlib", b"/Filter [/FlateDecode] "), 1024).has_javascript
+    assert _scan(_objstm(inner, b"/Filter [/ASCIIHexDecode /FlateDecode] "), 1024).has_javascript
+
+
+def test_incremental_update_falls_back_to_reader(tmp_path):
+    # Duas revisões (dois startxref): contagem barata não é confiável
+    data = _pdf_bytes(2) + _pdf_bytes(3)
+    assert _scan(data, 4096).page_count is None
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(_pdf_bytes(3))
+    item = IngestedFile(path=str(path), size=0, sha256="", page_count=None)
+    assert page_count(item) == 3  # noqa: PLR2004
+
+
+def test_upload_spool_is_hard_linked_into_place(tmp_path):
+    UploadSpool.spool_dir = str(tmp_path)
+    try:
+        spool = UploadSpool(max_size=16)
+        spool.write(b"%PDF-1.4 " + b"x" * 64)
+        dest = tmp_path / "final.pdf"
+        assert link_spooled_upload(spool, str(dest))
+        assert os.stat(dest).st_ino == os.fstat(spool.fileno()).st_ino
+        spool.close()
+        assert dest.read_bytes().startswith(b"%PDF-1.4 ")
+        small = UploadSpool(max_size=1024)
+        small.write(b"em memoria")
+        assert not link_spooled_upload(small, str(tmp_path / "small.pdf"))
+    finally:
+        UploadSpool.spool_dir = None
+
+
+@pytest.mark.asyncio
+async def test_ocr_image_upload_is_hard_linked_from_spool(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(formparsers, "SpooledTemporaryFile", formparsers.SpooledTemporaryFile)
+    monkeypatch.setattr(UploadSpool, "spool_dir", None)
+    spool_dir = install_upload_spool(str(tmp_path))
+    seen = {}
+
+    def fake_ocr(path, langs):  # noqa: ARG001
+        st = os.stat(path)
+        seen["size"], seen["links"] = st.st_size, st.st_nlink
+        return "texto"
+
+    monkeypatch.setattr(ocr_service, "ocr_pdf_or_image", fake_ocr)
+    body = b"\x89PNG\r\n\x1a\n" + os.urandom(2 * 1024 * 1024)
+    files = {"file": ("scan.png", body, "image/png")}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/ocr", files=files, data={"lang": "por"})
+    assert resp.status_code == HTTPStatus.OK
+    assert seen["size"] == len(body)
+    # Hard link: o spool (ainda aberto) e o arquivo final são o mesmo inode
+    assert seen["links"] == 2  # noqa: PLR2004
+    assert not os.listdir(spool_dir)
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import os
+import socket
+from http import HTTPStatus
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.tests.test_api import make_pdf_bytes
+from app.utils import metrics
+from app.utils.metrics import STAGE_SECONDS, clean_multiproc_dir, mark_process_dead, stage
+
+
+def _count(stage_name: str) -> float:
+    samples = STAGE_SECONDS.labels(stage_name).collect()[0].samples
+    return next(s.value for s in samples if s.name.endswith("_count"))
+
+
+def test_stage_observes_even_on_error():
+    before = _count("test_stage")
+    with pytest.raises(RuntimeError), stage("test_stage"):
+        raise RuntimeError("falhou")
+    assert _count("test_stage") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_exposes_route_and_stage_histograms(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    files = [
+        ("files", ("a.pdf", make_pdf_bytes(1), "application/pdf")),
+        ("files", ("b.pdf", make_pdf_bytes(2), "application/pdf")),
+    ]
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/pdf/merge", files=files)
+        assert resp.status_code == HTTPStatus.OK
+        metrics = await ac.get("/metrics")
+    assert metrics.status_code == HTTPStatus.OK
+    text = metrics.text
+    assert 'convertaja_stage_duration_seconds_count{stage="pdf_parse"}' in text
+    assert 'route="/api/pdf/merge"' in text
+    assert 'convertaja_pages_processed_total{op="merge"}' in text
+    assert 'convertaja_http_bytes_total{direction="out",route="/api/pdf/merge"}' in text
+    assert "convertaja_tmp_bytes" in text
+
+
+def test_multiproc_dir_cleanup_keeps_live_and_foreign_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "MULTIPROC_DIR", str(tmp_path))
+    host = socket.gethostname()
+    dead = 2**31 - 1  # acima de qualquer pid_max
+    names = [
+        f"counter_{host}-{dead}.db",
+        f"histogram_{host}-{dead}.db",
+        f"counter_{host}-{os.getpid()}.db",
+        f"counter_outro-host-{dead}.db",
+        f"gauge_livesum_{host}-{os.getpid()}.db",
+    ]
+    for name in names:
+        (tmp_path / name).write_bytes(b"")
+    clean_multiproc_dir()
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(names[2:])
+    # Saída do processo: os gauges "live" dele somem, os contadores ficam
+    mark_process_dead()
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(names[2:4])
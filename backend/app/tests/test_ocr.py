@@ -1,5 +1,14 @@
 from __future__ import annotations
 
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+
 import app.services.ocr_service as svc
 from app.services.ocr_service import ocr_pdf_or_image
 
@@ -34,9 +43,10 @@ def test_ocr_pdf_scanned_uses_tesseract(tmp_path, monkeypatch):
             self.pages = [FakePage()]
 
     class FakeImage:
-        pass
+        def close(self):
+            pass
 
-    def fake_convert_from_path(path, dpi=200):  # noqa: ARG001
+    def fake_convert_from_path(path, dpi=200, first_page=1, last_page=None):  # noqa: ARG001
         return [FakeImage()]
 
     def fake_ocr(img, lang="eng"):
@@ -50,3 +60,127 @@ def test_ocr_pdf_scanned_uses_tesseract(tmp_path, monkeypatch):
 
     text = ocr_pdf_or_image(str(pdf), ["por", "eng"])  # triggers OCR
     assert "texto-ocr" in text
+
+
+def test_ocr_pdf_pages_keeps_page_order(tmp_path, monkeypatch):
+    class FakeImage:
+        def __init__(self, page):
+            self.page = page
+
+        def close(self):
+            pass
+
+    def fake_convert_from_path(path, dpi=200, first_page=1, last_page=None):  # noqa: ARG001
+        return [FakeImage(first_page)]
+
+    monkeypatch.setenv("OCR_WORKERS", "1")
+    monkeypatch.setattr(svc, "convert_from_path", fake_convert_from_path)
+    monkeypatch.setattr(svc.pytesseract, "image_to_string", lambda img, lang=None: f"p{img.page}")
+    assert svc.ocr_pdf_pages("x.pdf", [3, 1, 2], ["por"]) == ["p3", "p1", "p2"]
+
+
+def test_ocr_pdf_pages_uses_threads_in_daemonic_worker(monkeypatch):
+    # Filho do prefork do Celery: ProcessPoolExecutor levantaria AssertionError
+    class FakeImage:
+        def __init__(self, page):
+            self.page = page
+
+        def close(self):
+            pass
+
+    def fake_convert_from_path(path, dpi=200, first_page=1, last_page=None):  # noqa: ARG001
+        return [FakeImage(first_page)]
+
+    threads = set()
+
+    def fake_image_to_string(img, lang=None):  # noqa: ARG001
+        threads.add(threading.current_thread().name)
+        return f"p{img.page}"
+
+    monkeypatch.setenv("OCR_WORKERS", "2")
+    monkeypatch.setenv("OMP_THREAD_LIMIT", "")
+    monkeypatch.setattr(
+        svc.multiprocessing, "current_process", lambda: SimpleNamespace(daemon=True)
+    )
+    monkeypatch.setattr(svc, "_get_ocr_pool", lambda workers: pytest.fail("criou processos"))
+    monkeypatch.setattr(svc, "convert_from_path", fake_convert_from_path)
+    monkeypatch.setattr(svc.pytesseract, "image_to_string", fake_image_to_string)
+    assert svc.ocr_pdf_pages("x.pdf", [2, 1, 3], ["por"]) == ["p2", "p1", "p3"]
+    assert all(name.startswith("ocr") for name in threads)
+
+
+def test_ocr_pdf_pages_fails_request_when_pool_breaks(monkeypatch):
+    class BrokenPool:
+        def map(self, *args, **kwargs):
+            raise BrokenProcessPool("worker morto")
+
+    monkeypatch.setenv("OCR_WORKERS", "2")
+    monkeypatch.setattr(svc, "_get_ocr_pool", lambda workers: BrokenPool())
+    monkeypatch.setattr(svc, "_ocr_page", lambda *a: pytest.fail("OCR refeito no processo da API"))
+    with pytest.raises(RuntimeError):
+        svc.ocr_pdf_pages("x.pdf", [1, 2], ["por"])
+
+
+def _text_page_pdf(path, text: str = "Documento digital com camada de texto") -> None:
+    w = PdfWriter()
+    page = w.add_blank_page(width=200, height=200)
+    font = DictionaryObject(
+        {
+            NameObject("/Type"): NameObject("/Font"),
+            NameObject("/Subtype"): NameObject("/Type1"),
+            NameObject("/BaseFont"): NameObject("/Helvetica"),
+        }
+    )
+    page[NameObject("/Resources")] = DictionaryObject(
+        {NameObject("/Font"): DictionaryObject({NameObject("/F1"): w._add_object(font)})}
+    )
+    stream = DecodedStreamObject()
+    stream.set_data(f"BT /F1 10 Tf 10 100 Td ({text}) Tj ET".encode())
+    page[NameObject("/Contents")] = w._add_object(stream)
+    with open(path, "wb") as f:
+        w.write(f)
+
+
+def test_profile_page_classifies_text_scan_and_blank(tmp_path):
+    text_pdf = tmp_path / "text.pdf"
+    _text_page_pdf(str(text_pdf))
+    scan_pdf = tmp_path / "scan.pdf"
+    Image.new("L", (200, 200), color=255).save(str(scan_pdf), "PDF", resolution=72)
+    blank_pdf = tmp_path / "blank.pdf"
+    w = PdfWriter()
+    w.add_blank_page(width=72, height=72)
+    with open(blank_pdf, "wb") as f:
+        w.write(f)
+
+    text_profile = svc.profile_page(PdfReader(str(text_pdf)).pages[0])
+    assert text_profile.has_fonts and not text_profile.needs_ocr
+
+    scan_profile = svc.profile_page(PdfReader(str(scan_pdf)).pages[0])
+    assert scan_profile.image_coverage > svc.SCAN_IMAGE_COVERAGE
+    assert scan_profile.needs_ocr
+
+    assert not svc.profile_page(PdfReader(str(blank_pdf)).pages[0]).needs_ocr
+
+
+def test_ocr_mixed_pdf_only_ocrs_image_pages(tmp_path, monkeypatch):
+    text_pdf = tmp_path / "text.pdf"
+    _text_page_pdf(str(text_pdf), "Pagina digital")
+    scan_pdf = tmp_path / "scan.pdf"
+    Image.new("L", (200, 200), color=255).save(str(scan_pdf), "PDF", resolution=72)
+    mixed = tmp_path / "mixed.pdf"
+    w = PdfWriter()
+    for src in (text_pdf, scan_pdf, text_pdf):
+        w.add_page(PdfReader(str(src)).pages[0])
+    with open(mixed, "wb") as f:
+        w.write(f)
+
+    calls: list[list[int]] = []
+
+    def fake_ocr_pdf_pages(path, pages, langs, on_page=None):  # noqa: ARG001
+        calls.append(list(pages))
+        return ["texto-ocr" for _ in pages]
+
+    monkeypatch.setattr(svc, "ocr_pdf_pages", fake_ocr_pdf_pages)
+    text = ocr_pdf_or_image(str(mixed), ["por"])
+    assert calls == [[2]]
+    assert text.split("\n\n") == ["Pagina digital", "texto-ocr", "Pagina digital"]
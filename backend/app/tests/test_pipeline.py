@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import json
+import os
+from http import HTTPStatus
+from zipfile import ZipFile
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import get_settings
+from app.main import app
+from app.services.pipeline_service import PipelineError, parse_steps
+from app.tests.test_api import make_pdf_bytes
+from app.workers import progress, tasks
+
+
+def test_parse_steps_enforces_order():
+    settings = get_settings()
+    plan = parse_steps(
+        '[{"op": "merge"}, {"op": "compress", "quality": "low"}, {"op": "to-images"}]',
+        2,
+        settings,
+    )
+    assert [s["op"] for s in plan] == ["merge", "compress", "to-images"]
+    assert plan[2] == {"op": "to-images", "fmt": "png", "dpi": 150}
+    bad = [
+        ('[{"op": "compress", "quality": "low"}]', 2),  # vários PDFs sem merge
+        ('[{"op": "split", "ranges": "1"}, {"op": "compress", "quality": "low"}]', 1),
+        ('[{"op": "merge"}]', 1),
+        ('[{"op": "rotate"}]', 1),
+        ("{}", 1),
+    ]
+    for raw, inputs in bad:
+        with pytest.raises(PipelineError):
+            parse_steps(raw, inputs, settings)
+
+
+def test_pipeline_steps_pass_files_on_the_worker(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(progress, "publish_event", lambda *a: None)
+    monkeypatch.setattr(tasks.task_pipeline_step, "update_state", lambda **kw: None)
+    inputs = []
+    for n in (1, 2):
+        path = tmp_path / f"in{n}.pdf"
+        path.write_bytes(make_pdf_bytes(n))
+        inputs.append(str(path))
+    plan = [{"op": "merge"}, {"op": "split", "ranges": "1,2-3"}]
+    state = {
+        "job_id": "job1",
+        "tmp_dir": str(tmp_path),
+        "paths": inputs,
+        "digests": ["a", "b"],
+        "index": 0,
+        "last": 1,
+        "page_count": None,
+    }
+    state = tasks.task_pipeline_step(state, plan[0])
+    (merged,) = state["paths"]
+    assert merged.endswith("job-job1-step1.pdf")
+    assert not any(os.path.exists(p) for p in inputs)
+
+    artifact = tasks.task_pipeline_step(state, plan[1])
+    assert not os.path.exists(merged)
+    assert artifact["filename"] == "split.zip"
+    with ZipFile(artifact["path"]) as zf:
+        assert len(zf.namelist()) == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_create_pipeline_job(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    submitted = {}
+
+    def fake_submit(job_id, _tmp_dir, paths, _digests, steps, **kwargs):
+        submitted.update(job_id=job_id, paths=paths, steps=steps, **kwargs)
+
+    monkeypatch.setattr(tasks, "submit_pipeline", fake_submit)
+    files = [
+        ("files", ("a.pdf", make_pdf_bytes(1), "application/pdf")),
+        ("files", ("b.pdf", make_pdf_bytes(2), "application/pdf")),
+    ]
+    steps = json.dumps([{"op": "merge"}, {"op": "compress", "quality": "medium"}])
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/jobs", data={"type": "pipeline", "steps": steps}, files=files)
+        bad = await ac.post(
+            "/api/jobs",
+            data={"type": "pipeline", "steps": '[{"op": "compress", "quality": "x"}]'},
+            files=files[:1],
+        )
+    assert resp.status_code == HTTPStatus.OK
+    assert submitted["job_id"] == resp.json()["jobId"]
+    assert [s["op"] for s in submitted["steps"]] == ["merge", "compress"]
+    assert len(submitted["paths"]) == 2  # noqa: PLR2004
+    assert bad.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import dataclasses
+import json
+import os
+import time
+from http import HTTPStatus
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app import main
+from app.config import get_settings
+from app.tests.test_api import make_pdf_bytes
+from app.utils.profiling import PROFILE_HEADER, should_profile, trim_profiles
+
+
+def test_should_profile_token_and_sampling():
+    settings = dataclasses.replace(get_settings(), PROFILE_TOKEN="", PROFILE_SAMPLE_RATE=0.0)
+    assert not should_profile("qualquer", settings)
+    with_token = dataclasses.replace(settings, PROFILE_TOKEN="segredo")
+    assert should_profile("segredo", with_token)
+    assert not should_profile("errado", with_token)
+    assert should_profile(None, dataclasses.replace(settings, PROFILE_SAMPLE_RATE=1.0))
+
+
+def test_trim_profiles_removes_oldest_first(tmp_path):
+    for n in range(4):
+        path = tmp_path / f"p{n}.folded"
+        path.write_bytes(b"x" * 100)
+        os.utime(path, (time.time() - 100 + n, time.time() - 100 + n))
+    trim_profiles(str(tmp_path), 250)
+    assert sorted(os.listdir(tmp_path)) == ["p2.folded", "p3.folded"]
+
+
+@pytest.mark.asyncio
+async def test_profiled_request_writes_folded_stacks_and_stages(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    settings = dataclasses.replace(get_settings(), PROFILE_TOKEN="segredo", PROFILE_INTERVAL_MS=1)
+    monkeypatch.setattr(main, "settings", settings)
+
+    def files(pages: int) -> list[tuple]:
+        # Entradas diferentes por requisição: acerto no cache pularia as etapas
+        return [
+            ("files", ("a.pdf", make_pdf_bytes(pages), "application/pdf")),
+            ("files", ("b.pdf", make_pdf_bytes(20), "application/pdf")),
+        ]
+
+    headers = {PROFILE_HEADER: "segredo"}
+    async with AsyncClient(transport=ASGITransport(app=main.app), base_url="http://test") as ac:
+        plain = await ac.post("/api/pdf/merge", files=files(3))
+        resp = await ac.post("/api/pdf/merge", files=files(30), headers=headers)
+    assert plain.status_code == resp.status_code == HTTPStatus.OK
+    assert "X-Profile-Id" not in plain.headers
+    request_id = resp.headers["X-Profile-Id"]
+    assert request_id == resp.headers["X-Request-ID"]
+
+    profiles = tmp_path / "profiles"
+    assert sorted(os.listdir(profiles)) == [f"{request_id}.folded", f"{request_id}.json"]
+    summary = json.loads((profiles / f"{request_id}.json").read_text())
+    assert summary["name"] == "POST /api/pdf/merge"
+    assert {"pdf_parse", "pdf_write"} <= set(summary["stages"])
+    assert summary["rssPeakMiB"] > 0
+    for line in (profiles / f"{request_id}.folded").read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import json
+from http import HTTPStatus
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from redis import asyncio as redis_asyncio
+
+from app.main import app
+from app.routes import jobs as jobs_route
+from app.workers import celery_app, progress
+from app.workers.progress import Progress, status_payload
+
+
+class FakeTask:
+    def __init__(self, job_id="job-1"):
+        self.request = SimpleNamespace(id=job_id)
+        self.states: list[dict] = []
+
+    def update_state(self, state, meta):
+        assert state == progress.PROGRESS_STATE
+        self.states.append(dict(meta))
+
+
+def test_progress_reports_real_counts(monkeypatch):
+    published = []
+    monkeypatch.setattr(progress, "publish_event", lambda job_id, ev: published.append(ev))
+    monkeypatch.setattr(progress, "MIN_REPORT_INTERVAL_SECONDS", 3600)
+    task = FakeTask()
+    p = Progress(task, "render", total=3)
+    assert list(p.track(["a", "b", "c"])) == ["a", "b", "c"]
+    # Inicial + final da etapa; intermediárias limitadas pelo intervalo
+    assert task.states[0] == {"stage": "render", "done": 0, "total": 3}
+    assert task.states[-1] == {"stage": "render", "done": 3, "total": 3}
+    assert len(task.states) == 2  # noqa: PLR2004
+    assert published[-1]["progress"] == 99  # noqa: PLR2004
+    assert published[-1]["stage"] == "render"
+
+
+def test_status_payload_maps_progress_state():
+    ev = status_payload("x", "PROGRESS", {"stage": "ocr", "done": 1, "total": 4})
+    assert ev == {"status": "running", "progress": 25, "stage": "ocr", "done": 1, "total": 4}
+    done = status_payload("x", "SUCCESS", {"content_type": "application/zip"})
+    assert done["status"] == "done"
+    assert done["resultUrl"] == "/api/jobs/x/download"
+
+
+@pytest.mark.asyncio
+async def test_job_events_streams_until_terminal(monkeypatch):
+    job_id = str(uuid4())
+    queued = [
+        None,
+        status_payload(job_id, "PROGRESS", {"stage": "render", "done": 2, "total": 4}),
+        status_payload(job_id, "SUCCESS", {"content_type": "application/zip"}),
+    ]
+    closed = []
+
+    class FakeEvents:
+        @classmethod
+        async def open(cls, jid):
+            assert jid == job_id
+            return cls()
+
+        async def next(self, timeout):  # noqa: ARG002
+            return queued.pop(0)
+
+        async def close(self):
+            closed.append(True)
+
+    monkeypatch.setattr(jobs_route, "JobEvents", FakeEvents)
+    monkeypatch.setattr(
+        celery_app.celery, "AsyncResult", lambda jid: SimpleNamespace(state="STARTED", info=None)
+    )
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.get(f"/api/jobs/{job_id}/events")
+    assert resp.status_code == HTTPStatus.OK
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    data = [
+        json.loads(line[len("data: ") :])
+        for line in resp.text.splitlines()
+        if line.startswith("data: ")
+    ]
+    assert [d["status"] for d in data] == ["running", "running", "done"]
+    assert data[1]["progress"] == 50  # noqa: PLR2004
+    assert ": ping" in resp.text
+    assert closed == [True]
+
+
+@pytest.mark.asyncio
+async def test_job_events_share_one_redis_client(monkeypatch):
+    created, closed = [], []
+
+    class FakePubSub:
+        async def subscribe(self, channel):
+            self.channel = channel
+
+        async def aclose(self):
+            closed.append(self.channel)
+
+    class FakeRedis:
+        def pubsub(self):
+            return FakePubSub()
+
+        async def aclose(self):
+            closed.append("client")
+
+    def from_url(*_args, **_kwargs):
+        created.append(True)
+        return FakeRedis()
+
+    monkeypatch.setattr(redis_asyncio.Redis, "from_url", from_url)
+    monkeypatch.setattr(progress, "_async_redis", None)
+    first = await progress.JobEvents.open("a")
+    second = await progress.JobEvents.open("b")
+    await first.close()
+    await second.close()
+    # Um cliente (e um pool) por processo; fechar a assinatura não fecha o cliente
+    assert created == [True]
+    assert closed == [progress.events_channel("a"), progress.events_channel("b")]
+    await progress.close_async_client()
+    assert closed[-1] == "client"
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import pytest
+
+from app.utils.ratelimit import MemoryRateLimiter, RedisRateLimiter
+
+LIMIT = 3
+
+
+def test_memory_limiter_blocks_after_limit():
+    rl = MemoryRateLimiter(LIMIT, 60)
+    assert [rl.allow("a", now=0.0) for _ in range(4)] == [True, True, True, False]
+    # Outra chave tem orçamento próprio
+    assert rl.allow("b", now=0.0)
+
+
+def test_memory_limiter_window_slides():
+    rl = MemoryRateLimiter(LIMIT, 60)
+    for _ in range(LIMIT):
+        assert rl.allow("a", now=59.0)
+    # Início da janela seguinte: a anterior ainda pesa quase inteira (2,95)
+    assert rl.allow("a", now=61.0)
+    assert not rl.allow("a", now=61.0)
+    # Dois terços depois a anterior pesa 1: 1 + 1 deixa espaço para mais uma
+    assert rl.allow("a", now=100.0)
+    assert not rl.allow("a", now=100.0)
+
+
+def test_memory_limiter_evicts_idle_keys():
+    rl = MemoryRateLimiter(LIMIT, 60)
+    for n in range(100):
+        rl.allow(f"ip-{n}", now=0.0)
+    assert len(rl) == 100  # noqa: PLR2004
+    rl.allow("ativo", now=130.0)
+    assert len(rl) == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_limiter_fails_open_when_unreachable():
+    rl = RedisRateLimiter("redis://127.0.0.1:1/0", LIMIT, 60)
+    assert await rl.hit("a")
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+# Bibliotecas pesadas que só os handlers/serviços importam, no primeiro uso
+DEFERRED = {"pypdf", "PIL", "pdf2image", "pytesseract"}
+# Tempo de import dos módulos do próprio app (sem FastAPI e dependências);
+# folgado para CI lento, pega um import pesado que volte para o topo de um módulo
+OWN_IMPORT_BUDGET_MS = 300
+
+
+def _importtime(module: str) -> dict[str, int]:
+    """Tempo próprio (µs) de cada módulo importado, via python -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _cumulative, name = line.removeprefix("import time:").split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = int(own)
+    return times
+
+
+def test_app_import_defers_heavy_libraries():
+    times = _importtime("app.main")
+    assert "app.routes.jobs" in times
+    assert not DEFERRED & {name.split(".")[0] for name in times}
+    own_ms = sum(us for name, us in times.items() if name.split(".")[0] == "app") / 1000
+    assert own_ms < OWN_IMPORT_BUDGET_MS
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+import time
+
+from app.services.storage_service import BUCKET_SECONDS, StorageManager
+
+
+def _storage(tmp_path, ttl=60, min_free=0) -> StorageManager:
+    return StorageManager(str(tmp_path), ttl_seconds=ttl, min_free_bytes=min_free)
+
+
+def test_workspace_lifecycle(tmp_path):
+    storage = _storage(tmp_path)
+    ws = storage.create()
+    with open(ws.file("../in.pdf"), "wb") as f:
+        f.write(b"%PDF")
+    # Nome com caminho não escapa do diretório
+    assert os.path.exists(os.path.join(ws.path, "in.pdf"))
+    assert storage.open(ws.id) == ws
+    storage.remove(ws.id)
+    assert storage.open(ws.id) is None
+    assert storage.open("../etc") is None
+
+
+def test_sweep_only_removes_due_workspaces(tmp_path):
+    storage = _storage(tmp_path)
+    short = storage.create(ttl_seconds=0)
+    long = storage.create(ttl_seconds=3600)
+    later = time.time() + 2 * BUCKET_SECONDS
+    assert storage.sweep(now=later) == 1
+    assert storage.open(short.id) is None
+    assert storage.open(long.id) is not None
+
+
+def test_extended_workspace_survives_old_marker(tmp_path):
+    storage = _storage(tmp_path)
+    ws = storage.create(ttl_seconds=0)
+    storage.extend(ws.id, ttl_seconds=3600)
+    assert storage.sweep(now=time.time() + 2 * BUCKET_SECONDS) == 0
+    assert storage.open(ws.id) is not None
+    assert storage.sweep(now=time.time() + 3600 + 2 * BUCKET_SECONDS) == 1
+
+
+def test_replicas_share_the_index(tmp_path):
+    # Duas réplicas no mesmo volume: cada marcador é removido uma vez só
+    a, b = _storage(tmp_path), _storage(tmp_path)
+    ids = [a.create(ttl_seconds=0).id for _ in range(3)]
+    later = time.time() + 2 * BUCKET_SECONDS
+    assert a.sweep(now=later) + b.sweep(now=later) == len(ids)
+    assert all(b.open(i) is None for i in ids)
+    assert not [n for n in os.listdir(tmp_path / ".expiry") if n.isdigit()]
+
+
+def test_low_free_space_evicts_oldest_first(tmp_path, monkeypatch):
+    storage = _storage(tmp_path, min_free=1)
+    oldest = storage.create(ttl_seconds=60)
+    newest = storage.create(ttl_seconds=3600)
+    free = iter([0, 0, 1, 1])
+    monkeypatch.setattr(storage, "free_bytes", lambda: next(free))
+    assert storage.ensure_free_space() == 1
+    assert storage.open(oldest.id) is None
+    assert storage.open(newest.id) is not None
@@ -3,29 +3,101 @@ from __future__ import annotations
 import os
 
 import app.services.images_service as svc
-from app.services.images_service import pdf_to_images
+from app.services.images_service import (
+    iter_pdf_images,
+    iter_pdf_page_bytes,
+    pdf_to_images,
+    render_processes,
+)
 
 
 class FakeImage:
     def __init__(self, idx: int):
         self.idx = idx
 
-    def save(self, path: str, format: str):  # noqa: A003
+    def save(self, path, format: str):  # noqa: A003
+        if hasattr(path, "write"):
+            path.write(b"fakeimg")
+            return
         with open(path, "wb") as f:
             f.write(b"fakeimg")
 
+    def close(self):
+        pass
+
+
+def fake_document(pages: int, calls: list | None = None):
+    def fake_convert_from_path(path, dpi=200, first_page=1, last_page=None, **kw):  # noqa: ARG001
+        last = pages if last_page is None else min(last_page, pages)
+        if calls is not None:
+            calls.append((first_page, last))
+        if not kw.get("paths_only"):
+            return [FakeImage(i) for i in range(first_page, last + 1)]
+        # Como o pdftoppm: um arquivo por página na pasta de saída
+        out = []
+        for i in range(first_page, last + 1):
+            path = os.path.join(kw["output_folder"], f"{kw['output_file']}{i:04d}.{kw['fmt']}")
+            with open(path, "wb") as f:
+                f.write(f"{kw['fmt']}:{i}:{kw['thread_count']}".encode())
+            out.append(path)
+        return out
+
+    return fake_convert_from_path
+
 
 def test_pdf_to_images_mocks_pdf2image(tmp_path, monkeypatch):
     input_path = tmp_path / "src.pdf"
     input_path.write_bytes(b"%PDF-1.4\n%%EOF\n")
 
-    def fake_convert_from_path(path, dpi=200):  # noqa: ARG001
-        return [FakeImage(1), FakeImage(2)]
-
-    monkeypatch.setattr(svc, "convert_from_path", fake_convert_from_path)
+    monkeypatch.setattr(svc, "convert_from_path", fake_document(2))
     out_dir = tmp_path / "out"
     res = pdf_to_images(str(input_path), str(out_dir), "jpg", 150)
     EXPECTED_COUNT = 2
     assert len(res) == EXPECTED_COUNT
     for p in res:
         assert os.path.exists(p)
+
+
+def test_iter_pdf_images_renders_in_windows_up_to_limit(monkeypatch):
+    calls: list[tuple[int, int]] = []
+    monkeypatch.setattr(svc, "convert_from_path", fake_document(10, calls))
+    pages = [idx for idx, _img in iter_pdf_images("x.pdf", 72, last_page=5, batch_pages=2)]
+    assert pages == [1, 2, 3, 4, 5]
+    # Nenhuma página além do limite é renderizada
+    assert calls == [(1, 2), (3, 4), (5, 5)]
+
+
+def test_poppler_backend_passes_files_through_in_parallel(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setenv("RENDER_PROCESSES", "3")
+    calls: list[tuple[int, int]] = []
+    monkeypatch.setattr(svc, "convert_from_path", fake_document(5, calls))
+    pages = list(iter_pdf_page_bytes("x.pdf", "jpg", 72, batch_pages=4))
+    # Bytes do pdftoppm sem recodificar; cada janela de 4 páginas dividida em 3 processos
+    assert pages == [
+        (1, "jpg", b"jpeg:1:3"),
+        (2, "jpg", b"jpeg:2:3"),
+        (3, "jpg", b"jpeg:3:3"),
+        (4, "jpg", b"jpeg:4:3"),
+        (5, "jpg", b"jpeg:5:3"),
+    ]
+    assert calls == [(1, 4), (5, 5)]
+    # Pasta temporária da renderização já removida
+    assert os.listdir(tmp_path) == []
+
+
+def test_pil_backend_encodes_rendered_images(monkeypatch):
+    monkeypatch.setenv("RENDER_BACKEND", "pil")
+    monkeypatch.setattr(svc, "convert_from_path", fake_document(2))
+    assert list(iter_pdf_page_bytes("x.pdf", "png", 72)) == [
+        (1, "png", b"fakeimg"),
+        (2, "png", b"fakeimg"),
+    ]
+
+
+def test_render_processes_split_cores_between_render_workers(monkeypatch):
+    monkeypatch.setattr(svc.os, "cpu_count", lambda: 8)
+    monkeypatch.setenv("POOL_RENDER_WORKERS", "2")
+    assert render_processes(10) == 4  # noqa: PLR2004
+    # Nunca mais processos que páginas na janela
+    assert render_processes(1) == 1
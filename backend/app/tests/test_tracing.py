@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import dataclasses
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.config import get_settings
+from app.main import app
+from app.tests.test_api import make_pdf_bytes
+from app.utils.executors import run_in_pool
+from app.utils.metrics import stage
+from app.utils.tracing import TRACE_HEADER, begin, inject, read_spans, span, timeline
+from app.workers import tasks
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_pool_threads(tmp_path):
+    sink = tmp_path / "spans.jsonl"
+    settings = dataclasses.replace(get_settings(), TRACE_FILE=str(sink))
+    root = begin("req-1", "POST /x", settings)
+    assert root is not None
+
+    def work() -> None:
+        with stage("pdf_parse"):
+            pass
+
+    with span("outer"):
+        await run_in_pool("light", work)
+        headers: dict = {}
+        inject(headers)
+    root.end()
+
+    spans = {s["name"]: s for s in read_spans(str(sink))}
+    assert {s["traceId"] for s in spans.values()} == {"req-1"}
+    assert spans["outer"]["parentSpanId"] == root.span_id
+    assert spans["pdf_parse"]["parentSpanId"] == spans["outer"]["spanId"]
+    assert headers[TRACE_HEADER]["parentId"] == spans["outer"]["spanId"]
+    assert timeline(list(spans.values()))["spans"][0]["name"] == "POST /x"
+
+
+def test_span_is_noop_without_trace(tmp_path):
+    with span("solto"):
+        pass
+    settings = dataclasses.replace(get_settings(), TRACE_ENABLED=False, TRACE_FILE="")
+    assert begin("req-2", "GET /y", settings) is None
+
+
+@pytest.mark.asyncio
+async def test_job_timeline_joins_request_queue_and_worker(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    published: dict = {}
+
+    def fake_apply_async(kwargs=None, task_id=None, priority=None, headers=None):
+        # O que o Celery faz ao publicar: before_task_publish com os headers
+        headers: dict = {}
+        tasks._propagate_trace(headers=headers)  # noqa: SLF001
+        published.update(task_id=task_id, headers=headers)
+
+    monkeypatch.setattr(tasks.task_compress, "apply_async", fake_apply_async)
+    files = {"file": ("a.pdf", make_pdf_bytes(1), "application/pdf")}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        resp = await ac.post("/api/jobs", files=files, data={"type": "compress", "quality": "low"})
+        assert resp.status_code == HTTPStatus.OK
+        job_id = resp.json()["jobId"]
+        request_id = resp.headers["X-Request-ID"]
+        assert published["headers"][TRACE_HEADER]["traceId"] == request_id
+
+        # Worker: prerun/postrun com o header recebido
+        task = SimpleNamespace(name="task_compress", request=published["headers"])
+        tasks._start_span(task_id=job_id, task=task)  # noqa: SLF001
+        with stage("ghostscript"):
+            pass
+        tasks._end_span(task_id=job_id, task=task, state="SUCCESS")  # noqa: SLF001
+
+        trace = await ac.get(f"/api/jobs/{job_id}/trace")
+        missing = await ac.get("/api/jobs/00000000-0000-4000-8000-000000000000/trace")
+    assert missing.status_code == HTTPStatus.NOT_FOUND
+    body = trace.json()
+    assert body["traceId"] == request_id
+    names = [s["name"] for s in body["spans"]]
+    assert names[0] == "POST /api/jobs"
+    assert {"ingest", "enqueue", "queue", "task_compress", "ghostscript"} <= set(names)
+    by_name = {s["name"]: s for s in body["spans"]}
+    assert by_name["queue"]["parentSpanId"] == by_name["enqueue"]["spanId"]
+    assert by_name["ghostscript"]["parentSpanId"] == by_name["task_compress"]["spanId"]
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import io
+from http import HTTPStatus
+from zipfile import ZipFile
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.main import app
+from app.services import upload_service
+from app.services.storage_service import get_storage
+from app.tests.test_api import make_pdf_bytes
+
+
+async def _create(ac: AsyncClient, data: bytes, filename: str = "a.pdf") -> str:
+    resp = await ac.post("/api/uploads", data={"filename": filename, "length": str(len(data))})
+    assert resp.status_code == HTTPStatus.CREATED
+    return resp.json()["uploadId"]
+
+
+async def _patch(ac: AsyncClient, upload_id: str, offset: int, chunk: bytes):
+    return await ac.patch(
+        f"/api/uploads/{upload_id}", content=chunk, headers={"Upload-Offset": str(offset)}
+    )
+
+
+@pytest.mark.asyncio
+async def test_resumable_upload_feeds_split(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    pdf = make_pdf_bytes(3)
+    half = len(pdf) // 2
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        upload_id = await _create(ac, pdf)
+        first = await _patch(ac, upload_id, 0, pdf[:half])
+        assert first.status_code == HTTPStatus.NO_CONTENT
+        assert first.headers["upload-offset"] == str(half)
+
+        # Reenvio a partir do offset errado: 409 com o offset certo
+        stale = await _patch(ac, upload_id, 0, pdf[:half])
+        assert stale.status_code == HTTPStatus.CONFLICT
+        assert stale.headers["upload-offset"] == str(half)
+
+        early = await ac.post(f"/api/uploads/{upload_id}/complete")
+        assert early.status_code == HTTPStatus.CONFLICT
+
+        head = await ac.head(f"/api/uploads/{upload_id}")
+        offset = int(head.headers["upload-offset"])
+        await _patch(ac, upload_id, offset, pdf[offset:])
+        done = await ac.post(f"/api/uploads/{upload_id}/complete")
+        assert done.status_code == HTTPStatus.OK
+        assert done.json()["pageCount"] == 3  # noqa: PLR2004
+
+        resp = await ac.post("/api/pdf/split", data={"upload_id": upload_id, "ranges": "1,3"})
+    assert resp.status_code == HTTPStatus.OK
+    with ZipFile(io.BytesIO(resp.content)) as zf:
+        assert len(zf.namelist()) == 2  # noqa: PLR2004
+
+
+@pytest.mark.asyncio
+async def test_upload_rejects_overflow_and_javascript(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    js_pdf = b"%PDF-1.4\n1 0 obj << /S /JavaScript /JS (app.alert(1)) >> endobj\n%%EOF\n"
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        upload_id = await _create(ac, js_pdf)
+        over = await _patch(ac, upload_id, 0, js_pdf + b"x")
+        assert over.status_code == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        await _patch(ac, upload_id, 0, js_pdf)
+        done = await ac.post(f"/api/uploads/{upload_id}/complete")
+        assert done.status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
+        # Upload rejeitado é descartado
+        gone = await ac.head(f"/api/uploads/{upload_id}")
+        assert gone.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.asyncio
+async def test_patch_body_is_written_in_blocks(tmp_path, monkeypatch):
+    monkeypatch.setenv("TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(upload_service, "READ_CHUNK", 100)
+    data = bytes(range(256)) * 8
+
+    async def body():
+        for i in range(0, len(data), 30):
+            yield data[i : i + 30]
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        upload_id = await _create(ac, data, "a.bin")
+        resp = await ac.patch(
+            f"/api/uploads/{upload_id}", content=body(), headers={"Upload-Offset": "0"}
+        )
+    assert resp.headers["upload-offset"] == str(len(data))
+    ws = get_storage().open(upload_id)
+    with open(ws.file(upload_service.DATA_NAME), "rb") as f:
+        assert f.read() == data
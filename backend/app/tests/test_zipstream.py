@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import io
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile
+
+from app.utils.zipstream import iter_zip, write_zip
+
+DATA_DESCRIPTOR_FLAG = 0x08
+
+
+def test_iter_zip_streams_entries_with_data_descriptors(tmp_path):
+    on_disk = tmp_path / "part.pdf"
+    on_disk.write_bytes(b"%PDF-1.4\n" + b"0" * 5000)
+    members = [
+        ("notes.txt", b"texto " * 1000),
+        ("page_1.png", b"\x89PNG" + b"x" * 100),
+        ("part.pdf", str(on_disk)),
+    ]
+    chunks = list(iter_zip(members))
+    # Cada membro é emitido assim que escrito (não um único bloco no final)
+    assert len(chunks) > len(members)
+
+    with ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.testzip() is None
+        infos = {i.filename: i for i in zf.infolist()}
+        assert infos["notes.txt"].compress_type == ZIP_DEFLATED
+        assert infos["page_1.png"].compress_type == ZIP_STORED
+        assert infos["part.pdf"].compress_type == ZIP_STORED
+        assert all(i.flag_bits & DATA_DESCRIPTOR_FLAG for i in infos.values())
+        assert zf.read("part.pdf") == on_disk.read_bytes()
+
+
+def test_write_zip_to_file(tmp_path):
+    out = tmp_path / "out.zip"
+    write_zip(str(out), [("a.pdf", b"%PDF-1.4\n%%EOF\n")])
+    with ZipFile(out) as zf:
+        assert zf.namelist() == ["a.pdf"]
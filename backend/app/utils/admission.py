@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections.abc import AsyncIterator
+
+from app.config import Settings, get_settings
+from app.utils.cost import Budget, estimate_budget
+from app.utils.executors import PoolBusyError
+
+
+class AdmissionRejectedError(PoolBusyError):
+    """Orçamento de CPU/memória esgotado: 503 + Retry-After (mesmo handler dos pools)."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("admission", retry_after)
+
+
+class Ticket:
+    """Reserva de orçamento; release() é idempotente."""
+
+    def __init__(self, controller: AdmissionController, budget: Budget):
+        self._controller = controller
+        self.budget = budget
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._controller._release(self.budget)
+
+    def __enter__(self) -> Ticket:
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.release()
+
+
+class AdmissionController:
+    """Orçamento global do processo para o trabalho pesado das rotas síncronas.
+
+    Cada requisição reserva os slots de CPU e a memória estimados (app/utils/cost.py)
+    antes de chamar gs/poppler/tesseract; se não cabe, recusa na hora em vez de
+    enfileirar e arriscar OOM. Uma requisição maior que o orçamento inteiro só
+    entra com o processo ocioso, para não ficar recusada para sempre.
+    """
+
+    def __init__(self, cpu_slots: int, memory_mb: int, retry_after: int = 5):
+        self.cpu_slots = max(1, cpu_slots)
+        self.memory_mb = max(1, memory_mb)
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._cpu = 0
+        self._memory = 0
+        self._admitted = 0
+        self._rejected = 0
+
+    def acquire(self, budget: Budget) -> Ticket:
+        with self._lock:
+            idle = self._cpu == 0 and self._memory == 0
+            fits = (
+                self._cpu + budget.cpu <= self.cpu_slots
+                and self._memory + budget.memory_mb <= self.memory_mb
+            )
+            if not (fits or idle):
+                self._rejected += 1
+                raise AdmissionRejectedError(self.retry_after)
+            self._cpu += budget.cpu
+            self._memory += budget.memory_mb
+            self._admitted += 1
+        return Ticket(self, budget)
+
+    def _release(self, budget: Budget) -> None:
+        with self._lock:
+            self._cpu -= budget.cpu
+            self._memory -= budget.memory_mb
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "cpuSlots": self.cpu_slots,
+                "cpuInUse": self._cpu,
+                "memoryMb": self.memory_mb,
+                "memoryInUseMb": self._memory,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+            }
+
+
+_controller: AdmissionController | None = None
+_controller_lock = threading.Lock()
+
+
+def build_admission(settings: Settings) -> AdmissionController:
+    slots = settings.ADMISSION_CPU_SLOTS or (os.cpu_count() or 1)
+    return AdmissionController(slots, settings.ADMISSION_MEMORY_MB)
+
+
+def get_admission() -> AdmissionController:
+    global _controller  # noqa: PLW0603
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = build_admission(get_settings())
+    return _controller
+
+
+def admit(
+    op: str,
+    settings: Settings,
+    *,
+    pages: int | None = None,
+    size_bytes: int = 0,
+    dpi: int | None = None,
+) -> Ticket:
+    """Reserva o orçamento de op com o que o upload já disse (páginas, tamanho)."""
+    budget = estimate_budget(
+        op,
+        pages=pages,
+        size_bytes=size_bytes,
+        dpi=dpi,
+        render_batch=settings.RENDER_BATCH_PAGES,
+        ocr_workers=settings.OCR_WORKERS or (os.cpu_count() or 1),
+    )
+    return get_admission().acquire(budget)
+
+
+async def release_after(body: AsyncIterator[bytes], ticket: Ticket) -> AsyncIterator[bytes]:
+    """Mantém a reserva enquanto o streaming gera conteúdo (inclusive se o cliente cai)."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        ticket.release()
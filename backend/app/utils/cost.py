@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Literal
+
+# Estimativa grosseira do custo de uma operação, em "segundos de CPU" relativos.
+# Serve para ordenar trabalho (prioridade na fila), não para prever latência:
+# só importa que OCR de 50 páginas custe muito mais que um merge de 2.
+Operation = Literal["merge", "split", "compress", "to-images", "ocr"]
+
+# Fila do Celery por operação (mesma divisão dos pools da API)
+QUEUES: dict[str, str] = {
+    "merge": "light",
+    "split": "light",
+    "compress": "gs",
+    "to-images": "render",
+    "ocr": "ocr",
+}
+DEFAULT_QUEUE = "light"
+
+_MB = 1024 * 1024
+# DPI de referência do custo de renderização (custo ~ área em pixels)
+_BASE_DPI = 150
+# Páginas assumidas quando a contagem barata do upload não está disponível
+_UNKNOWN_PAGES = 10
+
+# Prioridades do Celery com Redis: 0 sai primeiro. Limites de custo (inclusive)
+# para cada degrau; acima do último fica PRIORITY_MAX.
+_PRIORITY_STEPS = ((1.0, 0), (5.0, 2), (20.0, 4), (60.0, 6))
+PRIORITY_MAX = 8
+
+
+# Página de referência (A4) e bytes por pixel decodificado (RGB)
+_PAGE_INCHES = (8.27, 11.69)
+_BYTES_PER_PIXEL = 3
+_OCR_DPI = 300
+# Piso por processo externo (gs/pdftoppm/tesseract carregados)
+_PROCESS_BASE_MB = 40
+
+
+@dataclass(frozen=True)
+class Budget:
+    """Recursos que uma requisição síncrona prende enquanto roda."""
+
+    cpu: int
+    memory_mb: int
+
+
+def page_mb(dpi: int) -> float:
+    """Memória de uma página decodificada no DPI dado (A4, RGB)."""
+    w, h = _PAGE_INCHES
+    return w * dpi * h * dpi * _BYTES_PER_PIXEL / _MB
+
+
+def estimate_budget(  # noqa: PLR0913
+    op: str,
+    *,
+    pages: int | None = None,
+    size_bytes: int = 0,
+    dpi: int | None = None,
+    render_batch: int = 4,
+    ocr_workers: int = 1,
+) -> Budget:
+    """CPU (slots) e memória de pico estimados de uma operação."""
+    n = pages if pages is not None else _UNKNOWN_PAGES
+    mb = size_bytes / _MB
+    if op == "compress":
+        return Budget(1, int(_PROCESS_BASE_MB + 2 * mb))
+    if op == "to-images":
+        # Janela de páginas decodificadas + PNG/ZIP do lote
+        window = min(n, render_batch)
+        return Budget(1, int(_PROCESS_BASE_MB + window * page_mb(dpi or _BASE_DPI) * 1.5))
+    if op == "ocr":
+        workers = max(1, min(n, ocr_workers))
+        per_worker = _PROCESS_BASE_MB + page_mb(_OCR_DPI) * 2
+        return Budget(workers, int(per_worker * workers))
+    # pypdf mantém o documento inteiro em memória (objetos Python ~3× o arquivo)
+    return Budget(1, int(10 + 3 * mb))
+
+
+def queue_for(op: str) -> str:
+    return QUEUES.get(op, DEFAULT_QUEUE)
+
+
+def estimate_cost(
+    op: str, *, pages: int | None = None, size_bytes: int = 0, dpi: int | None = None
+) -> float:
+    """Custo relativo a partir do que se sabe logo após o upload."""
+    n = pages if pages is not None else _UNKNOWN_PAGES
+    mb = size_bytes / _MB
+    if op in {"merge", "split"}:
+        return 0.05 * mb + 0.01 * n
+    if op == "compress":
+        return 0.2 * mb + 0.3 * n
+    if op == "to-images":
+        scale = ((dpi or _BASE_DPI) / _BASE_DPI) ** 2
+        return 0.25 * n * scale
+    if op == "ocr":
+        # Cada página é rasterizada a 300 DPI e passa pelo tesseract
+        return 2.0 * n
+    return 0.05 * mb
+
+
+def priority_for(cost: float) -> int:
+    """Trabalho barato primeiro: p99 de jobs pequenos não depende dos grandes."""
+    for limit, priority in _PRIORITY_STEPS:
+        if cost <= limit:
+            return priority
+    return PRIORITY_MAX
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any
+
+from starlette.concurrency import run_in_threadpool
+
+from app.config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+# Peso da amostra nova na média móvel (EWMA) de segundos por unidade de custo
+EWMA_ALPHA = 0.2
+# Sem amostras, assume que uma unidade de custo (app/utils/cost.py) ~ 1 s
+DEFAULT_SECONDS_PER_COST = 1.0
+# Sem amostras novas a taxa volta para o padrão, metade do caminho a cada
+# meia-vida: uma execução lenta não manda tudo para a fila para sempre
+DECAY_HALF_LIFE_SECONDS = 1800.0
+# Com ASYNC_JOBS as taxas ficam num hash do Redis, alimentado pela API (inline)
+# e pelos workers (task concluída); cada processo da API relê a cada tanto
+SHARED_KEY = "dispatch:service-times"
+SHARED_REFRESH_SECONDS = 10.0
+# Header da mensagem do Celery com [operação, custo], para o worker registrar o tempo
+COST_MESSAGE_HEADER = "convertaja_cost"
+
+# Mesma conta de ServiceTimes.observe, atômica entre API e workers.
+# KEYS[1] = hash; ARGV = operação, amostra (s/custo), alfa, agora, meia-vida, padrão
+_SHARED_SCRIPT = """
+local op = ARGV[1]
+local sample, alpha, now = tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local half, default = tonumber(ARGV[5]), tonumber(ARGV[6])
+local rate = tonumber(redis.call('HGET', KEYS[1], op .. ':rate'))
+if rate then
+    local at = tonumber(redis.call('HGET', KEYS[1], op .. ':at') or ARGV[4])
+    rate = default + (rate - default) * 0.5 ^ (math.max(0, now - at) / half)
+    rate = rate + alpha * (sample - rate)
+else
+    rate = sample
+end
+redis.call('HSET', KEYS[1], op .. ':rate', tostring(rate), op .. ':at', ARGV[4])
+redis.call('HINCRBY', KEYS[1], op .. ':n', 1)
+return tostring(rate)
+"""
+
+_redis: Any = None
+_script: Any = None
+
+
+def decayed(rate: float, at: float, now: float, half_life: float) -> float:
+    """Taxa aprendida puxada de volta para o padrão conforme envelhece."""
+    weight = 0.5 ** (max(0.0, now - at) / half_life)
+    return DEFAULT_SECONDS_PER_COST + (rate - DEFAULT_SECONDS_PER_COST) * weight
+
+
+class ServiceTimes:
+    """Tempo de serviço aprendido por operação: segundos por unidade de custo.
+
+    Alimentado pelas execuções inline do mode=auto e pelas tasks concluídas nos
+    workers (via Redis); a previsão decide se o próximo pedido roda na
+    requisição ou vira job.
+    """
+
+    def __init__(self, alpha: float = EWMA_ALPHA, half_life: float = DECAY_HALF_LIFE_SECONDS):
+        self.alpha = alpha
+        self.half_life = half_life
+        self._lock = threading.Lock()
+        # operação -> (segundos por custo, time.time() da última amostra, amostras)
+        self._entries: dict[str, tuple[float, float, int]] = {}
+        self._pulled_at = float("-inf")
+
+    def _rate(self, op: str, now: float) -> float:
+        entry = self._entries.get(op)
+        if entry is None:
+            return DEFAULT_SECONDS_PER_COST
+        return decayed(entry[0], entry[1], now, self.half_life)
+
+    def predict(self, op: str, cost: float, now: float | None = None) -> float:
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._rate(op, now) * cost
+
+    def observe(self, op: str, cost: float, seconds: float, now: float | None = None) -> None:
+        if cost <= 0:
+            return
+        now = time.time() if now is None else now
+        sample = seconds / cost
+        with self._lock:
+            entry = self._entries.get(op)
+            if entry is None:
+                self._entries[op] = (sample, now, 1)
+            else:
+                prev = self._rate(op, now)
+                self._entries[op] = (prev + self.alpha * (sample - prev), now, entry[2] + 1)
+
+    def needs_refresh(self) -> bool:
+        return time.monotonic() - self._pulled_at >= SHARED_REFRESH_SECONDS
+
+    def load(self, fields: dict[Any, Any]) -> None:
+        """Substitui as taxas locais pelo hash compartilhado (HGETALL)."""
+        values = {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in fields.items()}
+        entries = {}
+        for key, rate in values.items():
+            op, _, field = key.rpartition(":")
+            if field == "rate":
+                entries[op] = (rate, values.get(f"{op}:at", 0.0), int(values.get(f"{op}:n", 0)))
+        with self._lock:
+            self._entries.update(entries)
+            self._pulled_at = time.monotonic()
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        now = time.time()
+        with self._lock:
+            return {
+                op: {"secondsPerCost": round(self._rate(op, now), 4), "samples": entry[2]}
+                for op, entry in self._entries.items()
+            }
+
+
+_times = ServiceTimes()
+
+
+def get_service_times() -> ServiceTimes:
+    return _times
+
+
+def cost_header(op: str, cost: float) -> dict[str, Any]:
+    """Headers da mensagem da task: o worker devolve o tempo medido para o modelo."""
+    return {COST_MESSAGE_HEADER: [op, cost]}
+
+
+def _client() -> Any:
+    global _redis, _script  # noqa: PLW0603
+    if _redis is None:
+        import redis  # noqa: PLC0415  # import tardio
+
+        _redis = redis.Redis.from_url(get_settings().REDIS_URL, socket_timeout=1)
+        _script = _redis.register_script(_SHARED_SCRIPT)
+    return _redis
+
+
+def record(op: str, cost: float, seconds: float, settings: Settings) -> None:
+    """Execução concluída (inline na API ou task no worker). Com ASYNC_JOBS
+    escreve no Redis: chame fora do event loop.
+    """
+    _times.observe(op, cost, seconds)
+    if not settings.ASYNC_JOBS or cost <= 0:
+        return
+    args = [op, seconds / cost, _times.alpha, time.time(), _times.half_life]
+    try:
+        _client()
+        _script(keys=[SHARED_KEY], args=[*args, DEFAULT_SECONDS_PER_COST])
+    except Exception as err:  # noqa: BLE001
+        logger.debug("tempo de serviço não compartilhado: %s", err)
+
+
+def _pull() -> None:
+    try:
+        fields = _client().hgetall(SHARED_KEY)
+    except Exception as err:  # noqa: BLE001
+        # Sem Redis segue com as taxas locais; nova tentativa no próximo intervalo
+        logger.debug("tempos de serviço compartilhados indisponíveis: %s", err)
+        fields = {}
+    _times.load(fields)
+
+
+async def refresh(settings: Settings) -> None:
+    """Relê as taxas compartilhadas, no máximo a cada SHARED_REFRESH_SECONDS."""
+    if settings.ASYNC_JOBS and _times.needs_refresh():
+        await run_in_threadpool(_pull)
+
+
+def predict_seconds(ops: list[tuple[str, float]]) -> float:
+    """Soma das previsões de (operação, custo) de cada etapa."""
+    return sum(_times.predict(op, cost) for op, cost in ops)
+
+
+def run_inline(ops: list[tuple[str, float]], settings: Settings) -> bool:
+    """mode=auto: inline se a previsão cabe no limite (ou se não há fila)."""
+    if not settings.ASYNC_JOBS:
+        return True
+    return predict_seconds(ops) <= settings.AUTO_SYNC_MAX_SECONDS
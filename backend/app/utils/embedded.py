@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import struct
+import zlib
+from collections.abc import Collection
+from dataclasses import dataclass
+from typing import Any
+
+# Página de scanner típica: um content stream "q W 0 0 H x y cm /Im0 Do Q" e
+# uma única imagem cobrindo a página. Essa imagem já é o resultado de
+# PDF→imagens: sai direto do PDF, sem renderizar nem recodificar.
+# - DCT (JPEG) em cinza/RGB: os bytes do stream, como .jpg;
+# - Flate em cinza/RGB: linhas descomprimidas reembrulhadas num PNG (sem perdas),
+#   até EXTRACT_EMBEDDED_MAX_MB descomprimidos (checado antes de descomprimir).
+# Qualquer outra coisa (texto, vetores, máscaras, /Decode, CMYK, paleta,
+# JPX/CCITT/JBIG2, página girada, anotações, imagem que não cobre a página
+# exatamente) volta para a renderização.
+# Só estes operadores podem aparecer no content stream de uma página elegível
+_ALLOWED_OPERATORS = {b"q", b"Q", b"cm", b"Do"}
+# Folga, em pontos, entre a imagem desenhada e a área visível da página
+_TOLERANCE_PT = 1.0
+_COLORS = {"/DeviceGray": 1, "/DeviceRGB": 3}
+_PNG_BITS = {1: {1, 2, 4, 8, 16}, 3: {8, 16}}
+# Tipo de cor do PNG (IHDR) por número de componentes
+_PNG_COLOR_TYPE = {1: 0, 3: 2}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+@dataclass(frozen=True)
+class EmbeddedImage:
+    ext: str  # jpg | png
+    data: bytes
+
+
+def _single_filter(xobj: Any) -> str | None:
+    filters = xobj.get("/Filter")
+    if filters is None:
+        return None
+    filters = filters.get_object()
+    if isinstance(filters, list):
+        return str(filters[0]) if len(filters) == 1 else None
+    return str(filters)
+
+
+def _components(xobj: Any) -> int | None:
+    """Componentes de cor para cinza/RGB (ICCBased com N 1 ou 3 conta); None nos demais."""
+    space = xobj.get("/ColorSpace")
+    if space is None:
+        return None
+    space = space.get_object()
+    if isinstance(space, list):
+        if len(space) == 2 and str(space[0]) == "/ICCBased":  # noqa: PLR2004
+            n = int(space[1].get_object().get("/N", 0))
+            return n if n in _PNG_COLOR_TYPE else None
+        return None
+    return _COLORS.get(str(space))
+
+
+def _drawn_image(page: Any) -> tuple[str, list[float]] | None:
+    """Nome e CTM da única imagem desenhada, se o content stream só faz isso."""
+    contents = page.get_contents()
+    if contents is None:
+        return None
+    ctm = [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+    stack: list[list[float]] = []
+    drawn = None
+    for operands, operator in contents.operations:
+        if operator not in _ALLOWED_OPERATORS:
+            return None
+        if operator == b"q":
+            stack.append(ctm)
+        elif operator == b"Q":
+            ctm = stack.pop() if stack else [1.0, 0.0, 0.0, 1.0, 0.0, 0.0]
+        elif operator == b"cm":
+            a, b, c, d, e, f = (float(v) for v in operands)
+            # Nova CTM = matriz do cm × CTM atual
+            ctm = [
+                a * ctm[0] + b * ctm[2],
+                a * ctm[1] + b * ctm[3],
+                c * ctm[0] + d * ctm[2],
+                c * ctm[1] + d * ctm[3],
+                e * ctm[0] + f * ctm[2] + ctm[4],
+                e * ctm[1] + f * ctm[3] + ctm[5],
+            ]
+        else:  # Do
+            if drawn is not None:
+                return None
+            drawn = (str(operands[0]), ctm)
+    return drawn
+
+
+def _covers_page(page: Any, ctm: list[float]) -> bool:
+    """Imagem sem giro/espelho ocupando exatamente a área visível (cropbox)."""
+    box = page.cropbox
+    expected = (float(box.width), 0.0, 0.0, float(box.height), float(box.left), float(box.bottom))
+    return all(abs(got - want) <= _TOLERANCE_PT for got, want in zip(ctm, expected, strict=True))
+
+
+def _png_chunk(kind: bytes, body: bytes) -> bytes:
+    return (
+        struct.pack(">I", len(body))
+        + kind
+        + body
+        + struct.pack(">I", zlib.crc32(kind + body) & 0xFFFFFFFF)
+    )
+
+
+def _inflate(data: bytes, size: int) -> bytes | None:
+    """Descomprime no máximo size bytes; None se o stream declara menos do que traz."""
+    inflater = zlib.decompressobj()
+    out = inflater.decompress(data, size)
+    if inflater.unconsumed_tail:
+        return None
+    return out
+
+
+def _png_rows(xobj: Any, components: int, bits: int, stride: int, height: int) -> bytes | None:
+    """Linhas com o byte de filtro do PNG na frente, sem descomprimir além do declarado."""
+    params = xobj.get("/DecodeParms")
+    params = params.get_object() if params is not None else {}
+    if isinstance(params, list):
+        params = params[0].get_object() if len(params) == 1 else None
+    if params is None:
+        return None
+    # Stream cru: os bytes ainda comprimidos (get_data() descomprimiria tudo)
+    raw = xobj._data  # noqa: SLF001
+    predictor = int(params.get("/Predictor", 1))
+    if predictor == 1:
+        data = _inflate(raw, stride * height)
+        if data is None or len(data) != stride * height:
+            return None
+        return b"".join(
+            b"\x00" + data[offset : offset + stride] for offset in range(0, len(data), stride)
+        )
+    # Preditores PNG (10-15): as linhas já vêm com o byte de filtro, como no IDAT
+    same_layout = (
+        int(params.get("/Colors", 1)) == components
+        and int(params.get("/BitsPerComponent", 8)) == bits
+        and int(params.get("/Columns", 1)) == int(xobj["/Width"])
+    )
+    if predictor < 10 or not same_layout:  # noqa: PLR2004
+        return None
+    data = _inflate(raw, (stride + 1) * height)
+    return data if data is not None and len(data) == (stride + 1) * height else None
+
+
+def _to_png(xobj: Any, components: int, max_bytes: int) -> bytes | None:
+    width, height = int(xobj["/Width"]), int(xobj["/Height"])
+    bits = int(xobj.get("/BitsPerComponent", 8))
+    if bits not in _PNG_BITS[components] or width <= 0 or height <= 0:
+        return None
+    stride = (width * components * bits + 7) // 8
+    # Tamanho declarado antes de descomprimir: um PDF pequeno pode declarar
+    # 12000×12000; acima do teto, quem decodifica é o pdftoppm (outro processo)
+    if stride * height > max_bytes:
+        return None
+    rows = _png_rows(xobj, components, bits, stride, height)
+    if rows is None:
+        return None
+    header = struct.pack(">IIBBBBB", width, height, bits, _PNG_COLOR_TYPE[components], 0, 0, 0)
+    return (
+        _PNG_SIGNATURE
+        + _png_chunk(b"IHDR", header)
+        + _png_chunk(b"IDAT", zlib.compress(rows))
+        + _png_chunk(b"IEND", b"")
+    )
+
+
+def _full_page_image(page: Any) -> Any | None:
+    """XObject desenhado sozinho cobrindo a página; None se a página tem mais que isso."""
+    if int(page.get("/Rotate", 0)) % 360 or page.get("/Annots"):
+        return None
+    drawn = _drawn_image(page)
+    if drawn is None or not _covers_page(page, drawn[1]):
+        return None
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    xobj = xobjects.get_object().get(drawn[0]) if xobjects is not None else None
+    return xobj.get_object() if xobj is not None else None
+
+
+def _extract(page: Any, formats: Collection[str], max_bytes: int) -> EmbeddedImage | None:
+    xobj = _full_page_image(page)
+    if (
+        xobj is None
+        or xobj.get("/Subtype") != "/Image"
+        or xobj.get("/ImageMask")
+        or any(key in xobj for key in ("/SMask", "/Mask", "/Decode"))
+    ):
+        return None
+    components = _components(xobj)
+    kind = _single_filter(xobj)
+    if components is not None and kind == "/DCTDecode" and "jpg" in formats:
+        data = xobj.get_data()
+        return EmbeddedImage("jpg", data) if data.startswith(b"\xff\xd8") else None
+    if components is not None and kind == "/FlateDecode" and "png" in formats:
+        data = _to_png(xobj, components, max_bytes)
+        return EmbeddedImage("png", data) if data is not None else None
+    return None
+
+
+def page_image(page: Any, formats: Collection[str], max_bytes: int) -> EmbeddedImage | None:
+    """Imagem única que forma a página, já no formato final; None = renderizar.
+
+    formats: extensões aceitas na saída (jpg, png). max_bytes: teto da imagem
+    Flate descomprimida (o JPEG sai sem descomprimir).
+    """
+    try:
+        return _extract(page, formats, max_bytes)
+    except Exception:  # noqa: BLE001
+        # Estrutura inesperada: a renderização decide
+        return None
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Literal, TypeVar
+
+from app.config import Settings, get_settings
+from app.utils.profiling import current_profile
+
+T = TypeVar("T")
+
+# Classes de operação:
+# - light: pypdf (merge/split/contagem de páginas), rápido e em memória
+# - gs: Ghostscript (subprocesso, limitado por tempo de parede)
+# - render: poppler/PIL/tesseract (CPU-bound, renderização e OCR)
+PoolName = Literal["light", "gs", "render"]
+
+
+class PoolBusyError(RuntimeError):
+    """Fila do pool cheia: a requisição deve ser recusada (503)."""
+
+    def __init__(self, pool: str, retry_after: int = 5):
+        super().__init__(f"Pool '{pool}' sem capacidade no momento")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+class OperationPool:
+    """ThreadPoolExecutor com limite de fila e contadores de ocupação.
+
+    O trabalho pesado (gs, pdftoppm, tesseract) roda em subprocessos, então
+    threads bastam para tirar o bloqueio do event loop sem disputar o GIL.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=f"pool-{name}"
+        )
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future[T]:
+        return self._submit(True, fn, *args, **kwargs)
+
+    def submit_continuation(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future[T]:
+        """Submete sem checar a fila: etapa seguinte de um trabalho já admitido."""
+        return self._submit(False, fn, *args, **kwargs)
+
+    def _submit(self, admit: bool, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Future[T]:
+        with self._lock:
+            if admit and self._inflight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise PoolBusyError(self.name)
+            self._inflight += 1
+        profile = current_profile()
+        if profile is not None:
+            # Requisição/task com perfil: a thread do pool entra na amostragem
+            fn, args = profile.run_attached, (fn, *args)
+        # Contexto da requisição (trace, perfil) segue para a thread do pool
+        ctx = contextvars.copy_context()
+        try:
+            fut = self._executor.submit(ctx.run, fn, *args, **kwargs)
+        except BaseException:
+            self._release()
+            raise
+        fut.add_done_callback(lambda _f: self._release())
+        return fut
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _release(self) -> None:
+        with self._lock:
+            self._inflight -= 1
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            inflight = self._inflight
+            rejected = self._rejected
+        return {
+            "workers": self.max_workers,
+            "running": min(inflight, self.max_workers),
+            "queued": max(0, inflight - self.max_workers),
+            "queueLimit": self.max_queue,
+            "rejected": rejected,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pools: dict[str, OperationPool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_sizes(settings: Settings) -> dict[str, tuple[int, int]]:
+    return {
+        "light": (settings.POOL_LIGHT_WORKERS, settings.POOL_LIGHT_QUEUE),
+        "gs": (settings.POOL_GS_WORKERS, settings.POOL_GS_QUEUE),
+        "render": (settings.POOL_RENDER_WORKERS, settings.POOL_RENDER_QUEUE),
+    }
+
+
+def get_pool(name: PoolName) -> OperationPool:
+    pool = _pools.get(name)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            workers, queue = _pool_sizes(get_settings())[name]
+            pool = OperationPool(name, workers, queue)
+            _pools[name] = pool
+    return pool
+
+
+async def run_in_pool(name: PoolName, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa função bloqueante no pool da classe de operação, fora do event loop."""
+    return await get_pool(name).run(fn, *args, **kwargs)
+
+
+async def iterate_in_pool(name: PoolName, iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Consome um iterador bloqueante no pool, um item por etapa.
+
+    Só a primeira etapa passa pelo limite de fila; as seguintes não são
+    recusadas no meio de uma resposta em streaming.
+    """
+    pool = get_pool(name)
+    sentinel: Any = object()
+    close = getattr(iterator, "close", None)
+    try:
+        fut = pool.submit(next, iterator, sentinel)
+    except BaseException:
+        if close is not None:
+            close()
+        raise
+    try:
+        while True:
+            item = await asyncio.wrap_future(fut)
+            if item is sentinel:
+                break
+            yield item
+            fut = pool.submit_continuation(next, iterator, sentinel)
+    finally:
+        if close is not None:
+            # Etapa ainda rodando (cliente desconectou no meio): fechar agora
+            # daria "generator already executing"; fecha na thread do pool,
+            # assim que ela terminar. Já concluída, o callback roda aqui mesmo.
+            fut.add_done_callback(lambda _fut: close())
+
+
+async def primed_iterate_in_pool(name: PoolName, iterator: Iterator[T]) -> AsyncIterator[T]:
+    """Produz o primeiro item já, para que erros iniciais virem resposta HTTP
+    antes de o streaming começar, e devolve um iterador com o restante.
+    """
+    agen = iterate_in_pool(name, iterator)
+    try:
+        first = await anext(agen)
+    except StopAsyncIteration:
+        return _empty_async()
+    except BaseException:
+        await agen.aclose()
+        raise
+
+    async def _rest() -> AsyncIterator[T]:
+        yield first
+        async for item in agen:
+            yield item
+
+    return _rest()
+
+
+async def _empty_async() -> AsyncIterator[Any]:
+    return
+    yield
+
+
+def pools_stats() -> dict[str, dict[str, int]]:
+    return {name: get_pool(name).stats() for name in ("light", "gs", "render")}
+
+
+def shutdown_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
@@ -3,9 +3,7 @@ from __future__ import annotations
 import os
 import shutil
 import uuid
-from collections.abc import Iterable
 from datetime import datetime, timedelta
-from zipfile import ZIP_DEFLATED, ZipFile
 
 
 def ensure_dir(path: str) -> None:
@@ -23,21 +21,15 @@ def save_upload(tmp_dir: str, filename: str, data: bytes) -> str:
     return out_path
 
 
-def zip_paths(output_zip: str, paths: Iterable[str]) -> str:
-    with ZipFile(output_zip, "w", ZIP_DEFLATED) as z:
-        for p in paths:
-            arc_name = os.path.basename(p)
-            z.write(p, arcname=arc_name)
-    return output_zip
-
-
-def remove_old_files(tmp_dir: str, ttl_minutes: int) -> int:
+def remove_old_files(tmp_dir: str, ttl_minutes: int, keep: frozenset[str] = frozenset()) -> int:
     now = datetime.utcnow()
     cutoff = now - timedelta(minutes=ttl_minutes)
     removed = 0
     if not os.path.isdir(tmp_dir):
         return removed
     for name in os.listdir(tmp_dir):
+        if name in keep:
+            continue
         path = os.path.join(tmp_dir, name)
         try:
             st = os.stat(path)
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import re
+import zlib
+from dataclasses import dataclass
+from typing import Any
+
+from app.utils.metrics import stage
+
+# Heurística conservadora: só marca quando há indícios diretos de JavaScript.
+# /OpenAction e /AA ocorrem em PDFs legítimos (ex.: abrir em página X) e geram falso-positivo.
+# /JS e /JavaScript só contam como nomes completos (seguidos de delimitador) fora de
+# streams: 3 bytes aleatórios em imagens comprimidas davam falso 415 em PDFs grandes.
+# A exceção são as object streams, cujo corpo é feito de dicionários.
+# Quantificadores limitados: sequências longas de dígitos não viram backtracking quadrático.
+_DELIM = rb"(?=[\s()<>\[\]{}/%]|$)"
+_TOKENS = re.compile(
+    rb"(?P<js>/(?:JavaScript|JS)" + _DELIM + rb")"
+    rb"|(?P<stream>>>\s{0,32}stream(?:\r\n|\n|\r))"
+    rb"|(?P<obj>(?<!\d)\d{1,10}\s+\d{1,5}\s+obj\b)"
+    rb"|(?P<endobj>endobj)"
+    rb"|(?P<pages>/Type\s*/Pages\b)"
+    rb"|(?P<count>/Count\s+(?P<n>\d{1,9}))"
+    rb"|(?P<objstm>/Type\s*/ObjStm\b)"
+    rb"|(?P<startxref>startxref)"
+    rb"|(?P<filter>/Filter\s{0,32}(?P<array>\[)?\s{0,32}/(?P<fname>[A-Za-z0-9]{1,32})"
+    rb"\s{0,32}(?P<close>\])?)"
+)
+_ENDSTREAM = re.compile(rb"endstream")
+_JS = re.compile(rb"/(?:JavaScript|JS)" + _DELIM)
+# Bytes mantidos entre chunks: tokens partidos na fronteira ainda são encontrados
+_OVERLAP = 64
+# Object streams (/Type /ObjStm) guardam dicionários dentro do stream: o corpo
+# delas é varrido (cru ou FlateDecode). Sem como inspecionar (outro filtro,
+# zlib corrompido, acima do teto descomprimido), o arquivo conta como suspeito.
+_OBJSTM_MAX_BYTES = 64 * 1024 * 1024
+_INFLATE_STEP = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class IngestedFile:
+    """Upload gravado em disco + metadados calculados durante o streaming."""
+
+    path: str
+    size: int
+    sha256: str
+    # None quando a contagem barata não é confiável (ver PdfScanner)
+    page_count: int | None = None
+
+
+class PdfScanner:
+    """Varre o PDF chunk a chunk, no mesmo passe da gravação em disco.
+
+    Procura /JavaScript e /JS nos dicionários do arquivo inteiro (o conteúdo
+    entre stream/endstream é pulado, exceto o das object streams, que guardam
+    dicionários) e lê o /Count dos objetos
+    /Type /Pages (a raiz da árvore tem o maior). A contagem só é aceita com um
+    único startxref (sem atualizações incrementais) e sem object streams, onde
+    os dicionários ficam comprimidos; fora disso page_count fica None.
+    """
+
+    def __init__(self) -> None:
+        self.has_javascript = False
+        self._tail = b""
+        self._skip = 0
+        self._in_stream = False
+        self._in_pages = False
+        self._count: int | None = None
+        self._max_count: int | None = None
+        self._startxrefs = 0
+        self._objstm = False
+        # Objeto atual: é object stream? com qual filtro (None = cru, "" = ilegível)?
+        self._obj_objstm = False
+        self._obj_filter: str | None = None
+        # Corpo da object stream em varredura: "raw", um decompressobj ou None
+        self._body: Any = None
+        self._body_tail = b""
+        self._inflated = 0
+
+    def feed(self, chunk: bytes) -> None:
+        self._scan(self._tail + chunk, final=False)
+
+    def close(self) -> None:
+        self._scan(self._tail, final=True)
+        self._tail = b""
+
+    @property
+    def page_count(self) -> int | None:
+        if self._objstm or self._startxrefs != 1:
+            return None
+        return self._max_count
+
+    def _scan(self, buf: bytes, final: bool) -> None:
+        cut = len(buf) if final else max(0, len(buf) - _OVERLAP)
+        pos = self._skip
+        while pos < cut:
+            if self._in_stream:
+                end = _ENDSTREAM.search(buf, pos)
+                found = end is not None and end.start() < cut
+                if self._body is not None:
+                    self._scan_body(buf[pos : end.start() if found else cut], last=found)
+                if not found:
+                    pos = cut
+                    break
+                self._in_stream = False
+                pos = end.end()
+                continue
+            m = _TOKENS.search(buf, pos)
+            if m is None or m.start() >= cut:
+                break
+            self._token(m)
+            pos = m.end()
+        self._tail = buf[cut:]
+        self._skip = max(0, pos - cut)
+
+    def _token(self, m: re.Match[bytes]) -> None:
+        kind = m.lastgroup
+        if kind == "js":
+            self.has_javascript = True
+        elif kind == "stream":
+            self._in_stream = True
+            if self._obj_objstm:
+                self._start_body()
+        elif kind == "obj":
+            self._in_pages, self._count = False, None
+            self._obj_objstm, self._obj_filter = False, None
+        elif kind == "pages":
+            self._in_pages = True
+        elif kind == "count":
+            self._count = int(m.group("n"))
+        elif kind == "endobj":
+            if self._in_pages and self._count is not None:
+                self._max_count = max(self._max_count or 0, self._count)
+            self._in_pages, self._count = False, None
+        elif kind == "objstm":
+            self._objstm = self._obj_objstm = True
+        elif kind == "startxref":
+            self._startxrefs += 1
+        elif kind == "filter":
+            single = not m.group("array") or m.group("close")
+            self._obj_filter = m.group("fname").decode() if single else ""
+
+    def _start_body(self) -> None:
+        if self._obj_filter is None:
+            self._body = "raw"
+        elif self._obj_filter == "FlateDecode":
+            self._body = zlib.decompressobj()
+        else:
+            self.has_javascript = True
+            return
+        self._body_tail = b""
+
+    def _scan_body(self, data: bytes, last: bool) -> None:
+        """Corpo de uma object stream, pedaço a pedaço (cru ou descomprimido)."""
+        if self._body == "raw":
+            self._search_body(data, last)
+        else:
+            try:
+                while data:
+                    out = self._body.decompress(data, _INFLATE_STEP)
+                    self._inflated += len(out)
+                    if self._inflated > _OBJSTM_MAX_BYTES:
+                        raise zlib.error("object streams acima do teto")
+                    self._search_body(out, last=False)
+                    data = self._body.unconsumed_tail
+            except zlib.error:
+                self.has_javascript = True
+                self._body = None
+                return
+            if last:
+                self._search_body(b"", last=True)
+        if last:
+            self._body = None
+
+    def _search_body(self, data: bytes, last: bool) -> None:
+        text = self._body_tail + data
+        for m in _JS.finditer(text):
+            # No fim do pedaço o delimitador ainda não chegou: fica para o próximo
+            if last or m.end() < len(text):
+                self.has_javascript = True
+                return
+        self._body_tail = text[-_OVERLAP:]
+
+
+def page_count(item: IngestedFile) -> int:
+    """Número de páginas: valor do upload, ou abre o PDF quando não foi possível."""
+    if item.page_count is not None:
+        return item.page_count
+    # pypdf sob demanda: o scanner do upload não precisa dele, e a partida também não
+    from pypdf import PdfReader  # noqa: PLC0415  # import tardio
+
+    with stage("pdf_parse"):
+        return len(PdfReader(item.path).pages)
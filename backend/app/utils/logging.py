@@ -39,3 +39,11 @@ def log_request(request, status_code: int, request_id: str, duration_ms: int) ->
         logging.info(_mask_pii(message))
     except Exception:  # noqa: BLE001
         logging.exception("failed to log request")
+
+
+def log_task(event: str, **fields: Any) -> None:
+    """Linha JSON do worker; requestId liga a task à requisição que a criou."""
+    try:
+        logging.info(json.dumps({"event": event, **fields}, ensure_ascii=False))
+    except Exception:  # noqa: BLE001
+        logging.exception("failed to log task")
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import shutil
+import socket
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    values,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+from app.config import get_settings
+from app.utils.cost import QUEUES
+from app.utils.profiling import current_profile
+from app.utils.tracing import span
+
+# Multiprocesso (workers do uvicorn, prefork do Celery, pool de OCR): com
+# PROMETHEUS_MULTIPROC_DIR cada processo grava os valores em arquivos mmap e
+# /metrics agrega todos. API e workers podem compartilhar o diretório (volume):
+# o id do processo leva o hostname, já que o PID 1 se repete entre containers.
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+
+def _process_id(pid: int | None = None) -> str:
+    return f"{socket.gethostname()}-{os.getpid() if pid is None else pid}"
+
+
+if MULTIPROC_DIR:
+    values.ValueClass = values.MultiProcessValue(_process_id)
+
+# De 5 ms (parse de PDF pequeno) a 2 min (gs/OCR no limite de tempo)
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+REQUEST_SECONDS = Histogram(
+    "convertaja_request_duration_seconds",
+    "Tempo até os cabeçalhos da resposta, por rota",
+    ["route", "method", "status"],
+    buckets=_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "convertaja_stage_duration_seconds",
+    "Tempo por etapa de processamento (upload, render, ghostscript, tesseract...)",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+HTTP_BYTES = Counter(
+    "convertaja_http_bytes",
+    "Bytes recebidos (in) e enviados (out), por rota",
+    ["route", "direction"],
+)
+PAGES = Counter("convertaja_pages_processed", "Páginas processadas por operação", ["op"])
+TASK_SECONDS = Histogram(
+    "convertaja_task_duration_seconds",
+    "Tempo de execução das tasks do Celery",
+    ["task", "state"],
+    buckets=_BUCKETS,
+)
+RATE_LIMITED = Counter("convertaja_rate_limited", "Requisições recusadas pelo rate limit (429)")
+REJECTED = Counter("convertaja_rejected", "Requisições recusadas por capacidade (503)", ["reason"])
+CACHE_LOOKUPS = Counter("convertaja_cache_lookups", "Consultas ao cache de resultados", ["result"])
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Mede uma etapa; fica nos serviços, então rotas síncronas e tasks reportam igual.
+
+    Também vira span no trace da requisição/job, se houver.
+    """
+    started = time.perf_counter()
+    try:
+        with span(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        profile = current_profile()
+        if profile is not None:
+            profile.add_stage(name, elapsed)
+
+
+def count_pages(op: str, n: int = 1) -> None:
+    PAGES.labels(op).inc(n)
+
+
+async def count_bytes_out(body: AsyncIterator[Any], route: str) -> AsyncIterator[Any]:
+    """Repassa o corpo da resposta contando os bytes (vale para streaming)."""
+    sent = 0
+    try:
+        async for chunk in body:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        HTTP_BYTES.labels(route, "out").inc(sent)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except (ProcessLookupError, OverflowError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def clean_multiproc_dir() -> None:
+    """Partida da API/worker: apaga os arquivos deste host cujo processo não existe
+    mais (execuções anteriores do container). Outros hosts e processos vivos do
+    mesmo host (irmãos do uvicorn, filhos do prefork) ficam intactos.
+    """
+    if not MULTIPROC_DIR:
+        return
+    prefix = f"{socket.gethostname()}-"
+    for name in os.listdir(MULTIPROC_DIR):
+        # <tipo>_<hostname>-<pid>.db (counter_..., histogram_..., gauge_livesum_...)
+        ident = name.removesuffix(".db").rpartition("_")[2]
+        pid = ident.removeprefix(prefix)
+        if pid == ident or not pid.isdigit() or _pid_alive(int(pid)):
+            continue
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(os.path.join(MULTIPROC_DIR, name))
+
+
+def mark_process_dead(pid: int | None = None) -> None:
+    """Processo saindo (pool de OCR, filho do Celery, API): os gauges "live" dele
+    saem do diretório multiprocesso; contadores ficam até a próxima partida.
+    """
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(_process_id(pid), MULTIPROC_DIR)
+
+
+def _queue_keys(name: str) -> list[str]:
+    # Com prioridade no Redis cada degrau é uma lista: "<fila>" (0) e "<fila>:N"
+    return [name] + [f"{name}:{n}" for n in range(1, 10)]
+
+
+class RuntimeCollector(Collector):
+    """Valores lidos na hora da coleta: profundidade das filas e uso de TMP_DIR."""
+
+    def describe(self) -> list[GaugeMetricFamily]:
+        # Sem describe o registry chamaria collect() (e o Redis) já no register
+        return []
+
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        settings = get_settings()
+        depth = GaugeMetricFamily(
+            "convertaja_queue_depth", "Mensagens aguardando na fila do Celery", labels=["queue"]
+        )
+        try:
+            import redis  # noqa: PLC0415
+
+            queues = sorted(set(QUEUES.values()))
+            with (
+                redis.Redis.from_url(settings.REDIS_URL, socket_timeout=0.5) as client,
+                client.pipeline() as pipe,
+            ):
+                for q in queues:
+                    for key in _queue_keys(q):
+                        pipe.llen(key)
+                lengths = pipe.execute()
+            for i, q in enumerate(queues):
+                depth.add_metric([q], sum(lengths[i * 10 : (i + 1) * 10]))
+            yield depth
+        except Exception:  # noqa: BLE001, S110
+            # Sem Redis (dev/testes): a métrica some em vez de derrubar o scrape
+            pass
+
+        tmp = GaugeMetricFamily(
+            "convertaja_tmp_bytes", "Uso do sistema de arquivos de TMP_DIR", labels=["kind"]
+        )
+        try:
+            usage = shutil.disk_usage(settings.TMP_DIR)
+        except OSError:
+            return
+        tmp.add_metric(["used"], usage.used)
+        tmp.add_metric(["free"], usage.free)
+        yield tmp
+        try:
+            count = len(os.listdir(os.path.join(settings.TMP_DIR, "w")))
+        except OSError:
+            count = 0
+        yield GaugeMetricFamily(
+            "convertaja_workspaces", "Diretórios de requisição/job em TMP_DIR", value=count
+        )
+
+
+def _build_registry() -> CollectorRegistry:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    registry.register(RuntimeCollector())
+    return registry
+
+
+_registry: CollectorRegistry | None = None
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Texto no formato do Prometheus e o content-type correspondente."""
+    global _registry  # noqa: PLW0603
+    if _registry is None:
+        _registry = _build_registry()
+    return generate_latest(_registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import hmac
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import AsyncIterator, Callable
+from contextvars import ContextVar
+from typing import Any, TypeVar
+
+from app.config import Settings
+from app.utils.files import ensure_dir
+
+T = TypeVar("T")
+
+# Perfil sob demanda de uma requisição ou task, desligado por padrão:
+# - X-Profile-Token igual a PROFILE_TOKEN, ou sorteio com PROFILE_SAMPLE_RATE;
+# - amostragem de pilhas (wall clock) das threads que trabalham para ela: a que
+#   abriu o perfil e as dos pools enquanto executam trabalho dela;
+# - tracemalloc, pico de RSS e tempo por etapa (metrics.stage);
+# - saída em TMP_DIR/profiles/<X-Request-ID>.folded (flamegraph.pl, speedscope)
+#   e .json, com o diretório limitado a PROFILE_MAX_MB (mais antigos saem).
+# Desligado, o custo é ler um ContextVar em run_in_pool e em stage().
+# Subprocessos (gs, pdftoppm, tesseract, pool de OCR) não aparecem nas pilhas:
+# o tempo deles fica na etapa correspondente.
+PROFILE_HEADER = "X-Profile-Token"
+PROFILES_DIRNAME = "profiles"
+# Perfis simultâneos por processo (cada um tem uma thread de amostragem)
+MAX_ACTIVE = 2
+# Snapshots do tracemalloc só quando a memória rastreada cresce este fator
+_SNAPSHOT_GROWTH = 1.25
+_SNAPSHOT_MIN_BYTES = 1024 * 1024
+_TOP_ALLOCATIONS = 15
+
+_current: ContextVar[Profile | None] = ContextVar("convertaja_profile", default=None)
+_lock = threading.Lock()
+_active = 0
+# Só para o tracemalloc se fomos nós que o ligamos (PYTHONTRACEMALLOC fica)
+_owns_tracing = False
+
+
+def should_profile(token: str | None, settings: Settings) -> bool:
+    if settings.PROFILE_TOKEN and token:
+        return hmac.compare_digest(token, settings.PROFILE_TOKEN)
+    return (
+        settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+    )  # noqa: S311
+
+
+def current_profile() -> Profile | None:
+    return _current.get()
+
+
+def _frame_name(frame: Any) -> str:
+    code = frame.f_code
+    path = code.co_filename.replace(os.sep, "/")
+    # Só os dois últimos componentes: app/services/x.py, asyncio/events.py
+    short = "/".join(path.rsplit("/", 2)[-2:])
+    return f"{code.co_name} ({short})"
+
+
+def _fold(frame: Any) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Sem /proc: pico do processo inteiro (KiB no Linux, bytes no macOS)
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class Profile:
+    """Amostras de pilha, etapas e memória de uma requisição/task."""
+
+    def __init__(self, key: str, name: str, settings: Settings, root: str | None = None):
+        self.key = key
+        # Requisição de origem: etapas de pipeline enfileiradas pela task herdam esta
+        self.root = root or key
+        self.name = name
+        self.out_dir = os.path.join(settings.TMP_DIR, PROFILES_DIRNAME)
+        self.max_bytes = settings.PROFILE_MAX_MB * 1024 * 1024
+        self.interval = max(1, settings.PROFILE_INTERVAL_MS) / 1000
+        self.stacks: Counter[str] = Counter()
+        self.stages: dict[str, list[float]] = {}
+        self.samples = 0
+        self.rss_peak = _rss_bytes()
+        self._threads: dict[int, str] = {threading.get_ident(): threading.current_thread().name}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._snapshot: tracemalloc.Snapshot | None = None
+        self._snapshot_size = _SNAPSHOT_MIN_BYTES
+        self._started = time.perf_counter()
+        self._children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        self._token = _current.set(self)
+        self._sampler = threading.Thread(
+            target=self._sample_loop, name=f"profile-{key[:8]}", daemon=True
+        )
+        self._sampler.start()
+
+    def run_attached(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Executa fn numa thread de pool contando-a como parte deste perfil."""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = threading.current_thread().name
+        token = _current.set(self)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            with self._lock:
+                self._threads.pop(ident, None)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def _sample_loop(self) -> None:
+        tick = 0
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()  # noqa: SLF001
+            with self._lock:
+                threads = list(self._threads.items())
+            for ident, thread_name in threads:
+                frame = frames.get(ident)
+                # Event loop parado no select é espera, não trabalho deste perfil
+                if frame is None or frame.f_code.co_filename.endswith("selectors.py"):
+                    continue
+                self.stacks[f"{thread_name};{_fold(frame)}"] += 1
+            del frames
+            self.samples += 1
+            tick += 1
+            if tick % 10 == 0:
+                self._watch_memory()
+
+    def _watch_memory(self) -> None:
+        self.rss_peak = max(self.rss_peak, _rss_bytes())
+        traced, _peak = tracemalloc.get_traced_memory()
+        if traced > self._snapshot_size * _SNAPSHOT_GROWTH:
+            # Perto do pico (crescimento geométrico: poucas fotos por perfil)
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_size = traced
+
+    def finish(self) -> str | None:
+        """Para a amostragem e grava o perfil; devolve o caminho do .folded."""
+        wall = time.perf_counter() - self._started
+        self._stop.set()
+        self._sampler.join()
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Terminado em outro contexto (fim do streaming da resposta)
+            pass
+        self.rss_peak = max(self.rss_peak, _rss_bytes())
+        _traced, traced_peak = tracemalloc.get_traced_memory()
+        snapshot = (self._snapshot or tracemalloc.take_snapshot()).filter_traces(
+            [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        _release_tracemalloc()
+        children_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        summary = {
+            "key": self.key,
+            "name": self.name,
+            "wallSeconds": round(wall, 4),
+            "intervalMs": round(self.interval * 1000, 1),
+            "samples": self.samples,
+            "stages": {
+                name: {"calls": calls, "seconds": round(secs, 4)}
+                for name, (calls, secs) in sorted(self.stages.items())
+            },
+            "rssPeakMiB": round(self.rss_peak / 2**20, 1),
+            # Pico dos subprocessos só aparece se superou o de filhos anteriores
+            "childrenPeakMiB": (
+                round(children_peak / 1024, 1) if children_peak > self._children_rss else None
+            ),
+            # Processo inteiro: perfis simultâneos compartilham o tracemalloc
+            "tracemallocPeakMiB": round(traced_peak / 2**20, 1),
+            "topAllocations": [
+                {
+                    "where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                    "sizeKiB": round(s.size / 1024, 1),
+                    "count": s.count,
+                }
+                for s in snapshot.statistics("lineno")[:_TOP_ALLOCATIONS]
+            ],
+        }
+        try:
+            ensure_dir(self.out_dir)
+            base = os.path.join(self.out_dir, self.key)
+            with open(f"{base}.folded", "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+            with open(f"{base}.json", "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2, ensure_ascii=False)
+            trim_profiles(self.out_dir, self.max_bytes)
+        except OSError:
+            return None
+        return f"{base}.folded"
+
+
+def _acquire_tracemalloc() -> bool:
+    global _active, _owns_tracing  # noqa: PLW0603
+    with _lock:
+        if _active >= MAX_ACTIVE:
+            return False
+        _active += 1
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owns_tracing = True
+        elif _active == 1:
+            tracemalloc.reset_peak()
+    return True
+
+
+def _release_tracemalloc() -> None:
+    global _active, _owns_tracing  # noqa: PLW0603
+    with _lock:
+        _active -= 1
+        if _active == 0 and _owns_tracing:
+            tracemalloc.stop()
+            _owns_tracing = False
+
+
+def start_profile(
+    key: str, name: str, settings: Settings, root: str | None = None
+) -> Profile | None:
+    """Abre um perfil no contexto atual; None se já há MAX_ACTIVE rodando."""
+    if not _acquire_tracemalloc():
+        return None
+    try:
+        return Profile(key, name, settings, root)
+    except BaseException:
+        _release_tracemalloc()
+        raise
+
+
+async def finish_after(body: AsyncIterator[Any], profile: Profile) -> AsyncIterator[Any]:
+    """Repassa o corpo da resposta e fecha o perfil ao fim do streaming."""
+    from starlette.concurrency import run_in_threadpool  # noqa: PLC0415
+
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        await run_in_threadpool(profile.finish)
+
+
+def trim_profiles(out_dir: str, max_bytes: int) -> None:
+    """Remove os perfis mais antigos até o diretório caber em max_bytes."""
+    entries = []
+    for name in os.listdir(out_dir):
+        path = os.path.join(out_dir, name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _mtime, size, _path in entries)
+    for _mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
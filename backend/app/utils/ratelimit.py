@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Protocol
+
+from app.config import Settings, get_settings
+
+logger = logging.getLogger(__name__)
+
+# Janela deslizante aproximada (sliding window counter): por chave só dois
+# contadores, o da janela atual e o da anterior. A estimativa é
+#   anterior × (fração da janela anterior ainda dentro do intervalo) + atual
+# — memória constante por cliente, sem lista de timestamps.
+
+# Script único e atômico: lê os dois contadores, decide e incrementa.
+# KEYS[1] = contador da janela atual, KEYS[2] = da anterior
+# ARGV = limite, fração decorrida da janela atual, TTL (s)
+_REDIS_SCRIPT = """
+local cur = tonumber(redis.call('GET', KEYS[1]) or '0')
+local prev = tonumber(redis.call('GET', KEYS[2]) or '0')
+local estimate = prev * (1 - tonumber(ARGV[2])) + cur
+if estimate >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class RateLimiter(Protocol):
+    async def hit(self, key: str) -> bool:
+        """Conta uma requisição; False se a chave passou do limite."""
+        ...
+
+
+class MemoryRateLimiter:
+    """Limitador no processo: dois contadores por chave e remoção de chaves ociosas.
+
+    Roda no event loop sem await no meio, então não precisa de lock. Cada worker
+    do uvicorn conta à parte; para um limite compartilhado use o backend Redis.
+    """
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window = float(window_seconds)
+        # chave -> [índice da janela, contagem atual, contagem anterior]
+        self._counters: dict[str, list[int]] = {}
+        self._swept_window = 0
+
+    def _sweep(self, window: int) -> None:
+        # Uma vez por janela: chave sem acesso nas duas últimas janelas não pesa mais
+        stale = [k for k, c in self._counters.items() if c[0] < window - 1]
+        for k in stale:
+            del self._counters[k]
+        self._swept_window = window
+
+    def allow(self, key: str, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        window, offset = divmod(now, self.window)
+        window = int(window)
+        if window != self._swept_window:
+            self._sweep(window)
+        c = self._counters.get(key)
+        if c is None:
+            c = self._counters[key] = [window, 0, 0]
+        elif c[0] != window:
+            # Avança: a atual vira anterior (ou zera, se pulou mais de uma janela)
+            c[2] = c[1] if c[0] == window - 1 else 0
+            c[1] = 0
+            c[0] = window
+        estimate = c[2] * (1 - offset / self.window) + c[1]
+        if estimate >= self.limit:
+            return False
+        c[1] += 1
+        return True
+
+    async def hit(self, key: str) -> bool:
+        return self.allow(key)
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+class RedisRateLimiter:
+    """Limitador compartilhado entre workers e réplicas (um script Lua por requisição).
+
+    Se o Redis estiver indisponível a requisição passa (fail open): o limitador
+    protege a API, não deve derrubá-la.
+    """
+
+    def __init__(self, url: str, limit: int, window_seconds: float, prefix: str = "rl"):
+        from redis.asyncio import Redis  # noqa: PLC0415  # só quando configurado
+
+        self.limit = limit
+        self.window = float(window_seconds)
+        self.prefix = prefix
+        self._redis = Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._redis.register_script(_REDIS_SCRIPT)
+
+    async def hit(self, key: str) -> bool:
+        window, offset = divmod(time.time(), self.window)
+        window = int(window)
+        # Hash tag {key}: as duas chaves caem no mesmo slot em Redis Cluster
+        keys = [f"{self.prefix}:{{{key}}}:{window}", f"{self.prefix}:{{{key}}}:{window - 1}"]
+        args = [self.limit, offset / self.window, int(self.window * 2)]
+        try:
+            return bool(await self._script(keys=keys, args=args))
+        except Exception as err:  # noqa: BLE001
+            logger.warning("rate limit: Redis indisponível, liberando (%s)", err)
+            return True
+
+
+_limiter: RateLimiter | None = None
+
+
+def build_rate_limiter(settings: Settings) -> RateLimiter:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisRateLimiter(
+            settings.REDIS_URL, settings.RATE_LIMIT, settings.RATE_LIMIT_WINDOW_SECONDS
+        )
+    return MemoryRateLimiter(settings.RATE_LIMIT, settings.RATE_LIMIT_WINDOW_SECONDS)
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _limiter  # noqa: PLW0603
+    if _limiter is None:
+        _limiter = build_rate_limiter(get_settings())
+    return _limiter
@@ -4,15 +4,20 @@ import uuid
 
 from starlette.responses import Response
 
+from app.utils.ingest import PdfScanner
+
 
 def pdf_has_javascript(path: str) -> bool:
+    """Procura /JavaScript e /JS no arquivo inteiro (uploads já varrem no streaming)."""
+    scanner = PdfScanner()
     try:
         with open(path, "rb") as f:
-            data = f.read(2_000_000)  # lê até 2MB para heurística simples
-        # Heurística conservadora: só marca quando há indícios diretos de JavaScript
-        # /OpenAction e /AA ocorrem em PDFs legítimos (ex.: abrir em página X) e geram falso-positivo.
-        tokens = [b"/JavaScript", b"/JS"]
-        return any(t in data for t in tokens)
+            while chunk := f.read(1024 * 1024):
+                scanner.feed(chunk)
+                if scanner.has_javascript:
+                    return True
+        scanner.close()
+        return scanner.has_javascript
     except Exception:  # noqa: BLE001
         return False
 
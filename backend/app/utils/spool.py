@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from typing import Any
+
+from starlette import formparsers
+
+from app.utils.files import ensure_dir
+
+SPOOL_DIRNAME = "spool"
+
+
+class UploadSpool(tempfile.SpooledTemporaryFile):
+    """Spool do parser multipart que, ao sair da memória, vira arquivo nomeado.
+
+    O padrão é um temporário anônimo, que não pode ser ligado em outro lugar;
+    com nome em TMP_DIR/spool (mesmo sistema de arquivos) o upload entra no
+    destino final por hard link, sem ser gravado uma segunda vez.
+    """
+
+    spool_dir: str | None = None
+
+    def __init__(self, max_size: int = 0, *args: Any, **kwargs: Any):
+        kwargs.setdefault("dir", self.spool_dir)
+        super().__init__(max_size, *args, **kwargs)
+
+    def rollover(self) -> None:
+        if self._rolled:
+            return
+        file = self._file
+        # Removido no close() do Starlette; o hard link mantém o conteúdo
+        newfile = self._file = tempfile.NamedTemporaryFile(**self._TemporaryFileArgs)
+        del self._TemporaryFileArgs
+        pos = file.tell()
+        newfile.write(file.getvalue())
+        newfile.seek(pos, 0)
+        self._rolled = True
+
+
+def install_upload_spool(tmp_dir: str) -> str:
+    """Faz o parser multipart do Starlette gravar os uploads em TMP_DIR/spool."""
+    spool = os.path.join(tmp_dir, SPOOL_DIRNAME)
+    ensure_dir(spool)
+    UploadSpool.spool_dir = spool
+    formparsers.SpooledTemporaryFile = UploadSpool  # type: ignore[misc]
+    return spool
+
+
+def link_spooled_upload(file: object, dest: str) -> bool:
+    """Hard link do spool do upload em dest.
+
+    Retorna False se o upload ainda está em memória ou não tem nome ligável
+    (spool padrão, outro sistema de arquivos) — aí o chamador grava a cópia.
+    """
+    if not getattr(file, "_rolled", False):
+        return False
+    inner = getattr(file, "_file", None)
+    name = getattr(inner, "name", None)
+    if not isinstance(name, str):
+        return False
+    try:
+        inner.flush()
+        os.link(name, dest)
+    except OSError:
+        return False
+    return True
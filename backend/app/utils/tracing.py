@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from typing import Any
+
+from app.config import Settings
+
+# Spans leves, exportados em JSON lines com os campos do OTLP (traceId, spanId,
+# parentSpanId, name, start/end em segundos Unix, attributes):
+# - trace = uma requisição; o traceId é o X-Request-ID do middleware;
+# - o contexto segue para os pools (executors copia o contexto) e para o Celery
+#   (header da mensagem), então as etapas do worker caem no mesmo trace;
+# - a linha do tempo de um job fica no próprio diretório dele
+#   (TMP_DIR/w/<jobId>/.trace.jsonl, TRACE_ENABLED) e vence junto;
+# - TRACE_FILE (opcional) recebe todos os spans de todos os processos, para um
+#   coletor (filelog do OpenTelemetry Collector, Vector...) importar.
+# Sem destino (requisição síncrona sem TRACE_FILE), span() só lê um ContextVar.
+TRACE_HEADER = "convertaja_trace"
+TRACE_FILENAME = ".trace.jsonl"
+PROCESS = f"{socket.gethostname()}-{os.getpid()}"
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    # Mutável: create_job acrescenta o arquivo do job depois de abrir o trace
+    sinks: list[str] = field(default_factory=list)
+    job_id: str | None = None
+    jobs_enabled: bool = True
+
+
+_trace: ContextVar[Trace | None] = ContextVar("convertaja_trace", default=None)
+_parent: ContextVar[str | None] = ContextVar("convertaja_span", default=None)
+
+
+def _new_id() -> str:
+    return os.urandom(8).hex()
+
+
+def _export(trace: Trace, record: dict[str, Any]) -> None:
+    line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+    for path in trace.sinks:
+        try:
+            # Append de uma linha curta: atômico entre processos no mesmo arquivo
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+        except OSError:
+            # Diretório do job já removido: o span se perde, a requisição não
+            pass
+
+
+class Span:
+    """Intervalo com nome; exportado ao terminar (end)."""
+
+    def __init__(
+        self,
+        trace: Trace,
+        name: str,
+        parent_id: str | None,
+        start: float | None = None,
+        attributes: dict[str, Any] | None = None,
+    ):
+        self.trace = trace
+        self.name = name
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.start = time.time() if start is None else start
+        self.attributes = dict(attributes or {})
+        self._t0 = time.perf_counter()
+        self._tokens: tuple[Token, Token] | None = None
+
+    def end(self, end: float | None = None, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+        if end is None:
+            end = self.start + (time.perf_counter() - self._t0)
+        _export(
+            self.trace,
+            {
+                "traceId": self.trace.trace_id,
+                "spanId": self.span_id,
+                "parentSpanId": self.parent_id,
+                "name": self.name,
+                "start": round(self.start, 6),
+                "end": round(end, 6),
+                "process": PROCESS,
+                "attributes": self.attributes,
+            },
+        )
+        if self._tokens is not None:
+            trace_token, parent_token = self._tokens
+            self._tokens = None
+            try:
+                _parent.reset(parent_token)
+                _trace.reset(trace_token)
+            except ValueError:
+                # Encerrado em outro contexto (fim do streaming da resposta)
+                pass
+
+
+def begin(  # noqa: PLR0913
+    trace_id: str,
+    name: str,
+    settings: Settings,
+    *,
+    parent_id: str | None = None,
+    job_id: str | None = None,
+    job_file: str | None = None,
+    **attributes: Any,
+) -> Span | None:
+    """Abre um trace no contexto atual e devolve o span raiz (None se desligado)."""
+    if not settings.TRACE_ENABLED and not settings.TRACE_FILE:
+        return None
+    trace = Trace(trace_id, jobs_enabled=settings.TRACE_ENABLED, job_id=job_id)
+    if settings.TRACE_FILE:
+        trace.sinks.append(settings.TRACE_FILE)
+    if job_file and settings.TRACE_ENABLED:
+        trace.sinks.append(job_file)
+    root = Span(trace, name, parent_id, attributes=attributes)
+    root._tokens = (_trace.set(trace), _parent.set(root.span_id))  # noqa: SLF001
+    return root
+
+
+def bind_job(job_id: str, job_dir: str) -> None:
+    """Grava também na linha do tempo do job os spans desta requisição."""
+    trace = _trace.get()
+    if trace is not None and trace.jobs_enabled and trace.job_id is None:
+        trace.job_id = job_id
+        trace.sinks.append(os.path.join(job_dir, TRACE_FILENAME))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[None]:
+    trace = _trace.get()
+    if trace is None or not trace.sinks:
+        yield
+        return
+    s = Span(trace, name, _parent.get(), attributes=attributes)
+    token = _parent.set(s.span_id)
+    try:
+        yield
+    except BaseException as err:
+        s.attributes["error"] = type(err).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        s.end()
+
+
+def record(
+    name: str, start: float, end: float, *, parent_id: str | None = None, **attributes: Any
+) -> None:
+    """Span já encerrado, com instantes conhecidos (ex.: espera na fila)."""
+    trace = _trace.get()
+    if trace is not None and trace.sinks:
+        parent = parent_id or _parent.get()
+        Span(trace, name, parent, start=start, attributes=attributes).end(end)
+
+
+def inject(headers: dict[str, Any]) -> None:
+    """Contexto atual no header da mensagem do Celery."""
+    trace = _trace.get()
+    if trace is not None:
+        headers[TRACE_HEADER] = {
+            "traceId": trace.trace_id,
+            "parentId": _parent.get(),
+            "jobId": trace.job_id,
+            "publishedAt": time.time(),
+        }
+
+
+async def end_after(body: AsyncIterator[Any], root: Span) -> AsyncIterator[Any]:
+    """Repassa o corpo da resposta e encerra o span raiz no último chunk."""
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        root.end()
+
+
+def read_spans(path: str) -> list[dict[str, Any]]:
+    spans = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    # Linha cortada por uma escrita interrompida
+                    continue
+    except FileNotFoundError:
+        return []
+    return spans
+
+
+def timeline(spans: list[dict[str, Any]]) -> dict[str, Any]:
+    """Spans em ordem, com início relativo ao primeiro e o total por etapa."""
+    ordered = sorted(spans, key=lambda s: s["start"])
+    t0 = ordered[0]["start"]
+    end = max(s["end"] for s in ordered)
+    by_name: dict[str, float] = {}
+    for s in ordered:
+        by_name[s["name"]] = by_name.get(s["name"], 0.0) + (s["end"] - s["start"])
+    return {
+        "traceId": ordered[0]["traceId"],
+        "durationMs": round((end - t0) * 1000, 1),
+        "stagesMs": {name: round(secs * 1000, 1) for name, secs in sorted(by_name.items())},
+        "spans": [
+            {
+                "name": s["name"],
+                "spanId": s["spanId"],
+                "parentSpanId": s.get("parentSpanId"),
+                "startMs": round((s["start"] - t0) * 1000, 1),
+                "durationMs": round((s["end"] - s["start"]) * 1000, 1),
+                "process": s.get("process"),
+                "attributes": s.get("attributes", {}),
+            }
+            for s in ordered
+        ],
+    }
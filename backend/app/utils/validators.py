@@ -1,13 +1,21 @@
 from __future__ import annotations
 
+import hashlib
 import os
 import uuid
+from collections.abc import Callable
+from dataclasses import replace
 
 from fastapi import HTTPException, UploadFile
 
 from app.utils.files import ensure_dir, save_upload
+from app.utils.ingest import IngestedFile, PdfScanner
+from app.utils.metrics import stage
 from app.utils.mime import is_image, is_pdf, looks_like_pdf
 from app.utils.security import pdf_has_javascript
+from app.utils.spool import link_spooled_upload
+
+INGEST_CHUNK = 1024 * 1024
 
 
 def _ensure_size(data: bytes, max_bytes: int) -> None:
@@ -70,47 +78,103 @@ async def validate_and_save_pdf_or_image_for_ocr(
     return save_upload(tmp_dir, upload.filename, data)
 
 
-async def stream_save_pdf(
+async def _ingest(
     upload: UploadFile,
     tmp_dir: str,
     max_bytes: int,
-    type_error_msg: str = "Apenas PDF é aceito",
-) -> str:
-    """Grava UploadFile em disco em chunks, validando tamanho e assinatura real de PDF.
-    - Aceita como PDF se (ext/MIME) OU (cabeçalho mágico "%PDF-").
-    - Bloqueia PDFs com JS/ações embutidas.
-    Retorna o caminho salvo.
+    check_head: Callable[[bytes], None],
+    scanner: PdfScanner | None = None,
+) -> IngestedFile:
+    """Coloca o upload em tmp_dir e calcula tamanho/SHA-256 (e a varredura) num passe.
+
+    Se o spool do multipart já está em disco, entra por hard link e o passe só
+    lê; senão (upload pequeno, ainda em memória) o conteúdo é gravado aqui.
     """
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail="Arquivo excede o limite de tamanho")
     ensure_dir(tmp_dir)
     ext = os.path.splitext(upload.filename or "")[1].lower()
     out_path = os.path.join(tmp_dir, f"{uuid.uuid4()}{ext}")
     total = 0
     head_checked = False
+    digest = hashlib.sha256()
+    linked = link_spooled_upload(upload.file, out_path)
     try:
-        with open(out_path, "wb") as f:
-            while True:
-                chunk = await upload.read(1024 * 64)
-                if not chunk:
-                    break
-                if not head_checked:
-                    if not (is_pdf(upload.filename, upload.content_type) or looks_like_pdf(chunk)):
-                        raise HTTPException(status_code=415, detail=type_error_msg)
-                    head_checked = True
-                total += len(chunk)
-                if total > max_bytes:
-                    raise HTTPException(
-                        status_code=413, detail="Arquivo excede o limite de tamanho"
-                    )
-                f.write(chunk)
-        if pdf_has_javascript(out_path):
-            raise HTTPException(status_code=415, detail="PDF contém JavaScript/ações embutidas")
-        return out_path
-    except HTTPException:
+        await upload.seek(0)
+        sink = None if linked else open(out_path, "wb")  # noqa: SIM115
         try:
-            os.remove(out_path)
-        except Exception:
-            pass
+            # Hash + varredura + cópia do spool (o corpo já chegou no parse do form)
+            with stage("ingest"):
+                while chunk := await upload.read(INGEST_CHUNK):
+                    if not head_checked:
+                        check_head(chunk)
+                        head_checked = True
+                    total += len(chunk)
+                    if total > max_bytes:
+                        raise HTTPException(
+                            status_code=413, detail="Arquivo excede o limite de tamanho"
+                        )
+                    digest.update(chunk)
+                    if scanner is not None:
+                        scanner.feed(chunk)
+                    if sink is not None:
+                        sink.write(chunk)
+        finally:
+            if sink is not None:
+                sink.close()
+    except HTTPException:
+        _remove_quietly(out_path)
         raise
+    return IngestedFile(path=out_path, size=total, sha256=digest.hexdigest())
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+async def stream_save_pdf(
+    upload: UploadFile,
+    tmp_dir: str,
+    max_bytes: int,
+    type_error_msg: str = "Apenas PDF é aceito",
+) -> IngestedFile:
+    """Coloca o UploadFile em disco validando tamanho e assinatura real de PDF.
+    - Aceita como PDF se (ext/MIME) OU (cabeçalho mágico "%PDF-").
+    - Bloqueia PDFs com JS/ações embutidas.
+    - No mesmo passe: SHA-256 (chave do cache), busca de JS no arquivo inteiro e
+      contagem de páginas barata, sem reabrir o arquivo depois.
+    Retorna caminho e metadados (IngestedFile).
+    """
+
+    def check_head(chunk: bytes) -> None:
+        if not (is_pdf(upload.filename, upload.content_type) or looks_like_pdf(chunk)):
+            raise HTTPException(status_code=415, detail=type_error_msg)
+
+    scanner = PdfScanner()
+    item = await _ingest(upload, tmp_dir, max_bytes, check_head, scanner)
+    scanner.close()
+    if scanner.has_javascript:
+        _remove_quietly(item.path)
+        raise HTTPException(status_code=415, detail="PDF contém JavaScript/ações embutidas")
+    return replace(item, page_count=scanner.page_count)
+
+
+async def stream_save_image(
+    upload: UploadFile,
+    tmp_dir: str,
+    max_bytes: int,
+    type_error_msg: str = "Apenas PDF/JPG/PNG são aceitos",
+) -> IngestedFile:
+    """Mesmo caminho do PDF para imagens (OCR): sem carregar o corpo em memória."""
+
+    def check_head(_chunk: bytes) -> None:
+        if not is_image(upload.filename, upload.content_type):
+            raise HTTPException(status_code=415, detail=type_error_msg)
+
+    return await _ingest(upload, tmp_dir, max_bytes, check_head)
 
 
 async def stream_save_pdfs_for_merge(
@@ -118,27 +182,24 @@ async def stream_save_pdfs_for_merge(
     tmp_dir: str,
     max_bytes: int,
     total_limit_bytes: int,
-) -> list[str]:
+) -> list[IngestedFile]:
     """Versão streaming para merge com limite total acumulado.
     Limpa arquivos já salvos caso exceda o limite.
     """
-    paths: list[str] = []
+    saved: list[IngestedFile] = []
     total = 0
     try:
         for up in files:
-            p = await stream_save_pdf(up, tmp_dir, max_bytes, "Apenas PDFs são aceitos")
-            paths.append(p)
-            try:
-                total += os.path.getsize(p)
-            except OSError:
-                pass
+            item = await stream_save_pdf(up, tmp_dir, max_bytes, "Apenas PDFs são aceitos")
+            saved.append(item)
+            total += item.size
             if total > total_limit_bytes:
                 raise HTTPException(status_code=413, detail="Soma dos arquivos excede 100MB")
-        return paths
+        return saved
     except HTTPException:
-        for p in paths:
+        for item in saved:
             try:
-                os.remove(p)
+                os.remove(item.path)
             except Exception:
                 pass
         raise
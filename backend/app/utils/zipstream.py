@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import io
+import os
+import time
+from collections.abc import Iterable, Iterator
+from zipfile import ZIP_DEFLATED, ZIP_STORED, ZipFile, ZipInfo
+
+from app.utils.metrics import stage
+
+# Formatos já comprimidos: DEFLATE só gastaria CPU sem reduzir tamanho
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".jp2", ".pdf", ".zip", ".gz"}
+READ_CHUNK = 1024 * 1024
+
+# (nome no arquivo, conteúdo em bytes OU caminho de arquivo em disco)
+ZipMember = tuple[str, bytes | str]
+
+
+class _Sink(io.RawIOBase):
+    """Destino não-seekable: o ZipFile passa a usar data descriptors."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:  # type: ignore[override]
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(name: str) -> int:
+    ext = os.path.splitext(name)[1].lower()
+    return ZIP_STORED if ext in STORED_EXTENSIONS else ZIP_DEFLATED
+
+
+def renumbered(members: Iterable[ZipMember], pattern: str) -> Iterator[ZipMember]:
+    """Renomeia os membros em ordem com pattern.format(n=1, 2, ..., ext=extensão original)."""
+    for n, (name, payload) in enumerate(members, start=1):
+        ext = os.path.splitext(name)[1].lstrip(".")
+        yield pattern.format(n=n, ext=ext), payload
+
+
+def iter_zip(members: Iterable[ZipMember]) -> Iterator[bytes]:
+    """Gera o ZIP em pedaços à medida que cada membro é produzido.
+
+    Sem seek: cada entrada usa data descriptor e cabeçalho ZIP64, então o
+    tamanho não precisa ser conhecido antes de escrever o conteúdo.
+    """
+    sink = _Sink()
+    with ZipFile(sink, "w", allowZip64=True) as zf:
+        for name, payload in members:
+            zinfo = ZipInfo(name, date_time=time.localtime(time.time())[:6])
+            zinfo.compress_type = compress_type_for(name)
+            zinfo.external_attr = 0o644 << 16
+            with zf.open(zinfo, "w", force_zip64=True) as dest:
+                if isinstance(payload, bytes):
+                    # Só a escrita (DEFLATE/CRC): entre os membros corre o produtor
+                    with stage("zip"):
+                        dest.write(payload)
+                else:
+                    with open(payload, "rb") as src:
+                        while chunk := src.read(READ_CHUNK):
+                            dest.write(chunk)
+                            if data := sink.drain():
+                                yield data
+            if data := sink.drain():
+                yield data
+    if data := sink.drain():
+        yield data
+
+
+def write_zip(output_zip: str, members: Iterable[ZipMember]) -> str:
+    """Grava o ZIP direto no destino, sem cópias intermediárias dos membros."""
+    with open(output_zip, "wb") as f:
+        for chunk in iter_zip(members):
+            f.write(chunk)
+    return output_zip
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
 import os
+from typing import Any
 
 from celery import Celery
+from kombu import Queue
+
+from app.utils.cost import DEFAULT_QUEUE, QUEUES, queue_for
 
 broker_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 backend_url = broker_url
@@ -18,3 +22,34 @@ celery.conf.task_serializer = "json"
 celery.conf.result_serializer = "json"
 celery.conf.task_track_started = True
 celery.conf.worker_prefetch_multiplier = 1
+
+# Uma fila por classe de operação: OCR longo não fica na frente de um merge.
+# Cada worker escolhe as filas que consome (-Q, ver docker/Dockerfile.worker).
+celery.conf.task_queues = [Queue(name) for name in sorted(set(QUEUES.values()))]
+celery.conf.task_default_queue = DEFAULT_QUEUE
+# Prioridade dentro da fila (Redis: 0 sai primeiro), derivada do custo estimado
+celery.conf.broker_transport_options = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+celery.conf.task_default_priority = 4
+
+_TASK_OPS = {
+    "app.workers.tasks.task_merge": "merge",
+    "app.workers.tasks.task_split": "split",
+    "app.workers.tasks.task_compress": "compress",
+    "app.workers.tasks.task_to_images": "to-images",
+    "app.workers.tasks.task_ocr": "ocr",
+}
+
+
+def route_task(name: str, args: Any, kwargs: Any, _options: Any, **_kw: Any) -> dict:
+    """Fila pela operação; etapas de pipeline vão para a fila da própria etapa."""
+    if name == "app.workers.tasks.task_pipeline_step":
+        step = (kwargs or {}).get("step") or (args[-1] if args else {})
+        return {"queue": queue_for(step.get("op", ""))}
+    return {"queue": queue_for(_TASK_OPS.get(name, ""))}
+
+
+celery.conf.task_routes = (route_task,)
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any, TypeVar
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Estado customizado do Celery enquanto a task reporta progresso
+PROGRESS_STATE = "PROGRESS"
+TERMINAL_STATUSES = {"done", "error"}
+# Intervalo mínimo entre atualizações (cada uma é uma escrita no backend + publish)
+MIN_REPORT_INTERVAL_SECONDS = 0.5
+
+_redis: Any = None
+# Cliente redis.asyncio da API, por event loop: cada assinatura SSE pega uma
+# conexão do pool dele (e a devolve ao fechar) em vez de criar cliente e pool
+_async_redis: tuple[asyncio.AbstractEventLoop, Any] | None = None
+
+
+def events_channel(job_id: str) -> str:
+    return f"jobs:{job_id}:events"
+
+
+def status_payload(job_id: str, state: str, info: Any) -> dict[str, Any]:
+    """Formato único do status do job (GET /jobs/{id}, SSE e eventos publicados)."""
+    if state == "PENDING":
+        return {"status": "queued", "progress": 0}
+    if state == "STARTED":
+        return {"status": "running", "progress": 0}
+    if state == PROGRESS_STATE:
+        meta: dict[str, Any] = info if isinstance(info, dict) else {}
+        done, total = meta.get("done", 0), meta.get("total")
+        return {
+            "status": "running",
+            "progress": percent(done, total),
+            "stage": meta.get("stage"),
+            "done": done,
+            "total": total,
+        }
+    if state == "SUCCESS":
+        payload: dict[str, Any] = info if isinstance(info, dict) else {}
+        return {
+            "status": "done",
+            "progress": 100,
+            "resultUrl": f"/api/jobs/{job_id}/download",
+            "contentType": payload.get("content_type"),
+        }
+    if state == "FAILURE":
+        return {"status": "error", "progress": 100}
+    return {"status": state.lower(), "progress": 0}
+
+
+def percent(done: int, total: int | None) -> int:
+    # 100 só com SUCCESS: ainda falta gravar/registrar o resultado
+    if not total:
+        return 0
+    return min(99, int(done * 100 / total))
+
+
+def _client() -> Any:
+    global _redis  # noqa: PLW0603
+    if _redis is None:
+        import redis  # noqa: PLC0415
+
+        _redis = redis.Redis.from_url(get_settings().REDIS_URL, socket_timeout=1)
+    return _redis
+
+
+def publish_event(job_id: str, event: dict[str, Any]) -> None:
+    """Publica no canal do job; falha de Redis não derruba a task."""
+    try:
+        _client().publish(events_channel(job_id), json.dumps(event))
+    except Exception as err:  # noqa: BLE001
+        logger.debug("publish de progresso falhou: %s", err)
+
+
+class Progress:
+    """Progresso real de uma task: update_state(PROGRESS) + evento no pub/sub.
+
+    stage: etapa atual (render, ocr, split...); done/total em unidades da etapa
+    (páginas, partes, arquivos). Atualizações são limitadas a uma a cada
+    MIN_REPORT_INTERVAL_SECONDS, exceto a última da etapa.
+    """
+
+    def __init__(self, task: Any, stage: str, total: int | None = None, job_id: str | None = None):
+        self._task = task
+        # Etapas de pipeline rodam em tasks próprias, mas reportam no id do job
+        self._job_id = job_id
+        self.stage = stage
+        self.total = total
+        self.done = 0
+        self._last = 0.0
+        self._report(force=True)
+
+    def set_stage(self, stage: str, total: int | None = None) -> None:
+        self.stage, self.total, self.done = stage, total, 0
+        self._report(force=True)
+
+    def advance(self, n: int = 1) -> None:
+        self.done += n
+        self._report(force=self.total is not None and self.done >= self.total)
+
+    def page(self, done: int, total: int) -> None:
+        """Callback (feitas, total) para os serviços."""
+        self.done, self.total = done, total
+        self._report(force=done >= total)
+
+    def track(self, items: Iterable[T]) -> Iterator[T]:
+        for item in items:
+            yield item
+            self.advance()
+
+    def _report(self, force: bool = False) -> None:
+        # task None: execução inline na API (mode=auto), sem job para atualizar
+        job_id = self._job_id or getattr(getattr(self._task, "request", None), "id", None)
+        now = time.monotonic()
+        if not job_id or (not force and now - self._last < MIN_REPORT_INTERVAL_SECONDS):
+            return
+        self._last = now
+        meta = {"stage": self.stage, "done": self.done, "total": self.total}
+        target = {"task_id": self._job_id} if self._job_id else {}
+        try:
+            self._task.update_state(state=PROGRESS_STATE, meta=meta, **target)
+        except Exception as err:  # noqa: BLE001
+            logger.debug("update_state falhou: %s", err)
+        publish_event(job_id, status_payload(job_id, PROGRESS_STATE, meta))
+
+
+def _async_client() -> Any:
+    global _async_redis  # noqa: PLW0603
+    loop = asyncio.get_running_loop()
+    if _async_redis is None or _async_redis[0] is not loop:
+        from redis.asyncio import Redis  # noqa: PLC0415
+
+        client = Redis.from_url(get_settings().REDIS_URL, socket_connect_timeout=2)
+        _async_redis = (loop, client)
+    return _async_redis[1]
+
+
+async def close_async_client() -> None:
+    """Fecha o pool compartilhado das assinaturas (shutdown da API)."""
+    global _async_redis  # noqa: PLW0603
+    if _async_redis is not None:
+        client, _async_redis = _async_redis[1], None
+        await client.aclose()
+
+
+class JobEvents:
+    """Assinatura do canal de eventos de um job (redis.asyncio, lado da API)."""
+
+    def __init__(self, pubsub: Any):
+        self._pubsub = pubsub
+
+    @classmethod
+    async def open(cls, job_id: str) -> JobEvents:
+        pubsub = _async_client().pubsub()
+        try:
+            await pubsub.subscribe(events_channel(job_id))
+        except BaseException:
+            await pubsub.aclose()
+            raise
+        return cls(pubsub)
+
+    async def next(self, timeout: float) -> dict[str, Any] | None:
+        """Próximo evento, ou None se nada chegou em timeout segundos."""
+        deadline = time.monotonic() + timeout
+        while (left := deadline - time.monotonic()) > 0:
+            msg = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=left)
+            if msg and msg.get("type") == "message":
+                return json.loads(msg["data"])
+        return None
+
+    async def close(self) -> None:
+        # Devolve a conexão ao pool; o cliente segue para as próximas assinaturas
+        await self._pubsub.aclose()
@@ -1,59 +1,340 @@
 from __future__ import annotations
 
 import os
+import time
 from typing import Any, Literal
 
-from app.services.compress_service import Quality, compress_pdf
-from app.services.images_service import pdf_to_images
-from app.services.merge_service import merge_pdfs
-from app.services.ocr_service import ocr_pdf_or_image
-from app.services.split_service import split_pdf
-from app.utils.files import zip_paths
+from celery import chain
+from celery.signals import (
+    before_task_publish,
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_success,
+    worker_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
+
+from app.config import get_settings
+from app.services.artifact_service import describe_artifact
+from app.services.cache_service import file_sha256
+from app.services.compress_service import Quality
+from app.services.pipeline_service import run_step
+from app.services.storage_service import get_storage
+from app.utils.dispatch import COST_MESSAGE_HEADER, cost_header, record
+from app.utils.logging import log_task
+from app.utils.metrics import TASK_SECONDS, clean_multiproc_dir, mark_process_dead
+from app.utils.profiling import Profile, current_profile, should_profile, start_profile
+from app.utils.tracing import TRACE_FILENAME, TRACE_HEADER, Span, inject
+from app.utils.tracing import begin as begin_trace
+from app.utils.tracing import record as record_span
 from app.workers.celery_app import celery
+from app.workers.progress import publish_event, status_payload
+
+
+def _digests(paths: list[str], digests: list[str] | None) -> list[str]:
+    # Hash vem da API (calculado no upload); recalcula só para chamadas antigas
+    return digests or [file_sha256(p) for p in paths]
+
+
+def _run(task: Any, tmp_dir: str, step: dict[str, Any], paths: list[str], **kwargs) -> dict:
+    digests = _digests(paths, kwargs.pop("digests", None))
+    out_base = os.path.join(tmp_dir, f"job-{task.request.id}")
+    out = run_step(task, step, paths, digests, out_base, **kwargs)
+    return describe_artifact(out.paths[0], out.content_type, out.filename)
 
 
 @celery.task(bind=True)
-def task_merge(self, tmp_dir: str, inputs: list[str]) -> dict[str, Any]:
-    out = os.path.join(tmp_dir, f"job-{self.request.id}.pdf")
-    merge_pdfs(inputs, out)
-    return {"path": out, "content_type": "application/pdf"}
+def task_merge(
+    self, tmp_dir: str, inputs: list[str], *, digests: list[str] | None = None
+) -> dict[str, Any]:
+    return _run(self, tmp_dir, {"op": "merge"}, inputs, digests=digests)
 
 
 @celery.task(bind=True)
 def task_split(
-    self, tmp_dir: str, input_path: str, ranges: list[tuple[int, int]]
+    self,
+    tmp_dir: str,
+    input_path: str,
+    ranges: list[tuple[int, int]],
+    *,
+    digests: list[str] | None = None,
 ) -> dict[str, Any]:
-    out_paths = []
-    for idx, (_a, _b) in enumerate(ranges, start=1):
-        out_paths.append(os.path.join(tmp_dir, f"job-{self.request.id}-{idx}.pdf"))
-    res = split_pdf(input_path, ranges, out_paths)
-    zip_path = os.path.join(tmp_dir, f"job-{self.request.id}.zip")
-    zip_paths(zip_path, res)
-    return {"path": zip_path, "content_type": "application/zip"}
+    return _run(self, tmp_dir, {"op": "split", "ranges": ranges}, [input_path], digests=digests)
 
 
 @celery.task(bind=True)
-def task_compress(self, tmp_dir: str, input_path: str, quality: Quality) -> dict[str, Any]:
-    out = os.path.join(tmp_dir, f"job-{self.request.id}.pdf")
-    compress_pdf(input_path, out, quality)
-    return {"path": out, "content_type": "application/pdf"}
+def task_compress(
+    self, tmp_dir: str, input_path: str, quality: Quality, *, digests: list[str] | None = None
+) -> dict[str, Any]:
+    step = {"op": "compress", "quality": quality}
+    return _run(self, tmp_dir, step, [input_path], digests=digests)
 
 
 @celery.task(bind=True)
-def task_to_images(
-    self, tmp_dir: str, input_path: str, fmt: Literal["jpg", "png"], dpi: int
+def task_to_images(  # noqa: PLR0913
+    self,
+    tmp_dir: str,
+    input_path: str,
+    fmt: Literal["jpg", "png"],
+    dpi: int,
+    *,
+    digests: list[str] | None = None,
+    page_count: int | None = None,
 ) -> dict[str, Any]:
-    out_dir = os.path.join(tmp_dir, f"job-{self.request.id}")
-    images = pdf_to_images(input_path, out_dir, fmt, dpi)
-    zip_path = os.path.join(tmp_dir, f"job-{self.request.id}.zip")
-    zip_paths(zip_path, images)
-    return {"path": zip_path, "content_type": "application/zip"}
+    step = {"op": "to-images", "fmt": fmt, "dpi": dpi}
+    return _run(self, tmp_dir, step, [input_path], digests=digests, page_count=page_count)
 
 
 @celery.task(bind=True)
-def task_ocr(self, tmp_dir: str, input_path: str, langs: list[str]) -> dict[str, Any]:
-    text = ocr_pdf_or_image(input_path, langs)
-    out = os.path.join(tmp_dir, f"job-{self.request.id}.txt")
-    with open(out, "w", encoding="utf-8") as f:
-        f.write(text)
-    return {"path": out, "content_type": "text/plain"}
+def task_ocr(
+    self, tmp_dir: str, input_path: str, langs: list[str], *, digests: list[str] | None = None
+) -> dict[str, Any]:
+    return _run(self, tmp_dir, {"op": "ocr", "langs": langs}, [input_path], digests=digests)
+
+
+@celery.task(bind=True)
+def task_pipeline_step(self, state: dict[str, Any], step: dict[str, Any]) -> dict[str, Any]:
+    """Uma etapa do pipeline; o retorno é o estado da próxima (ou o artefato final).
+
+    Os arquivos passam de uma etapa para a outra por caminho no volume do
+    worker: intermediários nunca voltam para a API nem para o cliente.
+    """
+    job_id, index, last = state["job_id"], state["index"], state["last"]
+    final = index == last
+    suffix = "" if final else f"-step{index + 1}"
+    out_base = os.path.join(state["tmp_dir"], f"job-{job_id}{suffix}")
+    try:
+        out = run_step(
+            self,
+            step,
+            state["paths"],
+            state["digests"],
+            out_base,
+            page_count=state.get("page_count"),
+            job_id=job_id,
+        )
+    except Exception as exc:
+        if not final:
+            # A última task (id = job) nunca vai rodar: o job falha aqui
+            self.backend.mark_as_failure(job_id, exc)
+            publish_event(job_id, status_payload(job_id, "FAILURE", None))
+        raise
+    finally:
+        # Entradas desta etapa (upload ou intermediário anterior) já não servem
+        _remove_files(state["paths"])
+    if final:
+        return describe_artifact(out.paths[0], out.content_type, out.filename)
+    return {
+        **state,
+        "paths": out.paths,
+        "digests": out.digests,
+        "index": index + 1,
+        "page_count": None,
+    }
+
+
+def submit_pipeline(  # noqa: PLR0913
+    job_id: str,
+    tmp_dir: str,
+    paths: list[str],
+    digests: list[str],
+    steps: list[dict[str, Any]],
+    *,
+    page_count: int | None = None,
+    priority: int | None = None,
+    costs: list[float] | None = None,
+) -> None:
+    """Enfileira as etapas como chain; a última task recebe o id do job.
+
+    Cada etapa vai para a fila da sua operação (route_task), todas com a
+    prioridade do pipeline inteiro; costs (por etapa) vão no header para o
+    modelo de tempos do mode=auto.
+    """
+    state = {
+        "job_id": job_id,
+        "tmp_dir": tmp_dir,
+        "paths": paths,
+        "digests": digests,
+        "index": 0,
+        "last": len(steps) - 1,
+        "page_count": page_count,
+    }
+    options = [{} if priority is None else {"priority": priority} for _ in steps]
+    for step, cost, opts in zip(steps, costs or [], options, strict=False):
+        opts["headers"] = cost_header(step["op"], cost)
+    sig = chain(
+        task_pipeline_step.s(state, steps[0]).set(**options[0]),
+        *(task_pipeline_step.s(s).set(**o) for s, o in zip(steps[1:], options[1:], strict=True)),
+    )
+    sig.apply_async(task_id=job_id)
+
+
+def _remove_files(paths: list[str]) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Estados finais também vão para o canal do job (SSE em /api/jobs/{id}/events)
+@task_success.connect
+def _publish_success(sender=None, result=None, **_kwargs) -> None:
+    job_id = getattr(sender.request, "id", None) if sender else None
+    if job_id:
+        publish_event(job_id, status_payload(job_id, "SUCCESS", result))
+
+
+@task_failure.connect
+def _publish_failure(task_id=None, **_kwargs) -> None:
+    if task_id:
+        publish_event(task_id, status_payload(task_id, "FAILURE", None))
+
+
+@task_postrun.connect
+def _release_inputs(task_id=None, kwargs=None, **_kwargs) -> None:
+    """Entradas saem assim que o job termina (com sucesso ou não); o diretório do
+    job, agora só com o resultado, vale mais um TTL a partir do término.
+    """
+    kwargs = kwargs or {}
+    inputs = list(kwargs.get("inputs") or [])
+    if kwargs.get("input_path"):
+        inputs.append(kwargs["input_path"])
+    _remove_files(inputs)
+    storage = get_storage()
+    if task_id and storage.open(task_id) is not None:
+        storage.extend(task_id)
+
+
+# Tempo de execução por task (sem a espera na fila), para /metrics
+_started: dict[str, float] = {}
+
+
+@task_prerun.connect
+def _start_timer(task_id=None, **_kwargs) -> None:
+    if task_id:
+        _started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _observe_runtime(task_id=None, task=None, state=None, **_kwargs) -> None:
+    started = _started.pop(task_id, None) if task_id else None
+    if started is None or task is None:
+        return
+    elapsed = time.perf_counter() - started
+    TASK_SECONDS.labels(task.name, state or "UNKNOWN").observe(elapsed)
+    # Job concluído no worker também ensina o mode=auto (a API só mede o inline)
+    header = task.request.get(COST_MESSAGE_HEADER)
+    if state == "SUCCESS" and header:
+        op, cost = header
+        record(op, float(cost), elapsed, get_settings())
+
+
+# Diretório multiprocesso do Prometheus: o worker limpa o que sobrou de
+# execuções anteriores deste host ao subir, e cada processo (filho do prefork ou
+# o principal) sai marcado como morto
+@worker_init.connect
+def _clean_metrics(**_kwargs) -> None:
+    clean_multiproc_dir()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def _mark_metrics_dead(**_kwargs) -> None:
+    mark_process_dead()
+
+
+# Perfil sob demanda: job criado por requisição com perfil leva a chave no
+# header da mensagem; sem ela vale só a amostragem (PROFILE_SAMPLE_RATE)
+PROFILE_MESSAGE_HEADER = "convertaja_profile"
+_profiles: dict[str, Profile] = {}
+
+
+@before_task_publish.connect
+def _propagate_profile(headers=None, **_kwargs) -> None:
+    profile = current_profile()
+    if profile is not None and headers is not None:
+        headers[PROFILE_MESSAGE_HEADER] = profile.root
+
+
+@task_prerun.connect
+def _start_profile(task_id=None, task=None, **_kwargs) -> None:
+    if not task_id or task is None:
+        return
+    settings = get_settings()
+    parent = task.request.get(PROFILE_MESSAGE_HEADER)
+    if parent is None and not should_profile(None, settings):
+        return
+    key = f"{parent}.{task_id}" if parent else task_id
+    profile = start_profile(key, task.name, settings, root=parent)
+    if profile is not None:
+        _profiles[task_id] = profile
+
+
+@task_postrun.connect
+def _finish_profile(task_id=None, **_kwargs) -> None:
+    profile = _profiles.pop(task_id, None) if task_id else None
+    if profile is not None:
+        profile.finish()
+
+
+# Trace: a requisição que criou o job manda traceId, span pai e jobId no header
+# da mensagem; cada task abre um span com a espera na fila antes dele
+_spans: dict[str, Span] = {}
+
+
+@before_task_publish.connect
+def _propagate_trace(headers=None, **_kwargs) -> None:
+    if headers is not None:
+        inject(headers)
+
+
+@task_prerun.connect
+def _start_span(task_id=None, task=None, **_kwargs) -> None:
+    if not task_id or task is None:
+        return
+    carrier = task.request.get(TRACE_HEADER) or {}
+    job_id = carrier.get("jobId") or task_id
+    ws = get_storage().open(job_id)
+    root = begin_trace(
+        carrier.get("traceId") or task_id,
+        task.name,
+        get_settings(),
+        parent_id=carrier.get("parentId"),
+        job_id=job_id,
+        job_file=ws.file(TRACE_FILENAME) if ws else None,
+        taskId=task_id,
+    )
+    queued_at = carrier.get("publishedAt")
+    wait_ms = None
+    if root is not None:
+        _spans[task_id] = root
+        if queued_at:
+            # Relógios de API e worker: mesma máquina/NTP; diferença negativa vira 0
+            record_span(
+                "queue",
+                min(queued_at, root.start),
+                root.start,
+                parent_id=carrier.get("parentId"),
+                taskId=task_id,
+            )
+    if queued_at:
+        wait_ms = max(0, int((time.time() - queued_at) * 1000))
+    log_task(
+        "task_start",
+        task=task.name,
+        taskId=task_id,
+        jobId=job_id,
+        requestId=carrier.get("traceId"),
+        queueWaitMs=wait_ms,
+    )
+
+
+@task_postrun.connect
+def _end_span(task_id=None, task=None, state=None, **_kwargs) -> None:
+    root = _spans.pop(task_id, None) if task_id else None
+    if root is not None:
+        root.end(state=state)
+    log_task("task_end", task=getattr(task, "name", None), taskId=task_id, state=state)
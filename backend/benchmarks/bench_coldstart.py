@@ -0,0 +1,110 @@
+"""Partida a frio: do processo novo até a primeira resposta.
+
+Mede, em processos novos a cada rodada, o import de app.main e o tempo até o
+primeiro 200 de /api/health num uvicorn recém-iniciado (import + lifespan +
+primeira requisição). É o que paga uma instância que escala a zero.
+
+Uso (dentro de backend/):
+    python -m benchmarks.bench_coldstart --repeat 5 --out coldstart.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Any
+
+from benchmarks.report import check_baseline, environment, summarize, write_report
+
+IMPORT_SNIPPET = (
+    "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _env(tmp_dir: str) -> dict[str, str]:
+    return {**os.environ, "TMP_DIR": tmp_dir, "METRICS_ENABLED": "true"}
+
+
+def measure_import(tmp_dir: str) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        env=_env(tmp_dir),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_first_response(tmp_dir: str, timeout: float = 30.0) -> float:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/api/health"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        env=_env(tmp_dir),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:  # noqa: S310
+                    if resp.status == 200:  # noqa: PLR2004
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        raise RuntimeError("uvicorn não respondeu a tempo")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def run(repeat: int) -> dict[str, Any]:
+    imports, first = [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        measure_import(tmp)  # aquece o cache de bytecode (.pyc) e o do SO
+        for _ in range(repeat):
+            imports.append(measure_import(tmp))
+            first.append(measure_first_response(tmp))
+    return {
+        "benchmark": "coldstart",
+        "repeat": repeat,
+        "environment": environment(),
+        "results": {
+            "import/app.main": summarize(imports),
+            "uvicorn/first-health": summarize(first),
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+    report = run(args.repeat)
+    for case, r in report["results"].items():
+        print(f"{case:<24} {r['seconds']:>8.4f}s  p95 {r['p95']:>8.4f}s", file=sys.stderr)
+    write_report(report, args.out)
+    if args.baseline and check_baseline(report, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Latência ponta a ponta dos endpoints síncronos, com o app ASGI no processo.
+
+Mede o caminho inteiro da requisição (multipart, validação, pools, ZIP em
+streaming, resposta) sem rede nem uvicorn. Cache de resultados e rate limit
+ficam desligados para que toda rodada faça o trabalho de verdade.
+
+Uso (dentro de backend/):
+    python -m benchmarks.bench_endpoints --repeat 5 --concurrency 4 --out atual.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any
+
+from benchmarks.corpus import build_corpus, manifest
+from benchmarks.report import (
+    check_baseline,
+    environment,
+    peak_rss_mib,
+    summarize,
+    write_report,
+)
+
+PDF = "application/pdf"
+
+# nome -> (rota, arquivos [(campo, nome no corpus, content-type)], form, ferramentas)
+CASES: dict[str, tuple[str, list[tuple[str, str, str]], dict[str, str], tuple[str, ...]]] = {
+    "merge/text-10+text-100": (
+        "/api/pdf/merge",
+        [("files", "text-10", PDF), ("files", "text-100", PDF)],
+        {},
+        (),
+    ),
+    "split/text-100": (
+        "/api/pdf/split",
+        [("file", "text-100", PDF)],
+        {"ranges": "1-50,51-100"},
+        (),
+    ),
+    "split/huge-2000": (
+        "/api/pdf/split",
+        [("file", "huge-2000", PDF)],
+        {"ranges": "1-1000,1001-2000"},
+        (),
+    ),
+    "compress/mixed-10": (
+        "/api/pdf/compress",
+        [("file", "mixed-10", PDF)],
+        {"quality": "medium"},
+        ("gs",),
+    ),
+    "to-images/text-10@150": (
+        "/api/pdf/to-images",
+        [("file", "text-10", PDF)],
+        {"dpi": "150"},
+        ("pdftoppm",),
+    ),
+    "ocr/scanned-5": (
+        "/api/ocr",
+        [("file", "scanned-5", PDF)],
+        {"lang": "eng"},
+        ("pdftoppm", "tesseract"),
+    ),
+    "ocr/image-jpg": (
+        "/api/ocr",
+        [("file", "photo-jpg", "image/jpeg")],
+        {"lang": "eng"},
+        ("tesseract",),
+    ),
+}
+
+
+def _configure(tmp_dir: str) -> None:
+    # Antes de importar app.main: as configurações são lidas do ambiente
+    os.environ.update(
+        {
+            "TMP_DIR": tmp_dir,
+            "CACHE_ENABLED": "false",
+            "RATE_LIMIT": str(10**9),
+            "OCR_LANGS": "por,eng",
+            "MAX_FILE_MB": "100",
+            "METRICS_ENABLED": "false",
+        }
+    )
+
+
+async def _request(client: Any, route: str, files: list[tuple], data: dict[str, str]) -> int | None:
+    """Bytes da resposta, ou None se recusada por capacidade (503)."""
+    resp = await client.post(route, files=files, data=data)
+    if resp.status_code == 503:  # noqa: PLR2004
+        return None
+    if resp.status_code != 200:  # noqa: PLR2004
+        raise RuntimeError(f"{route}: HTTP {resp.status_code} {resp.text[:200]}")
+    return len(resp.content)
+
+
+async def run_cases(
+    paths: dict[str, str], repeat: int, concurrency: int, only: list[str]
+) -> dict[str, Any]:
+    from httpx import ASGITransport, AsyncClient  # noqa: PLC0415
+
+    from app.main import app  # noqa: PLC0415
+
+    # Log por requisição iria para o stdout junto com o relatório
+    logging.disable(logging.INFO)
+    results: dict[str, Any] = {}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        for case, (route, file_specs, data, tools) in CASES.items():
+            if only and not any(o in case for o in only):
+                continue
+            missing = [t for t in tools if shutil.which(t) is None]
+            if missing:
+                results[case] = {"skipped": f"ausente: {', '.join(missing)}"}
+                continue
+            payloads = {}
+            for _field, name, _ct in file_specs:
+                with open(paths[name], "rb") as f:
+                    payloads[name] = f.read()
+            files = [(field, (name, payloads[name], ct)) for field, name, ct in file_specs]
+
+            await _request(client, route, files, data)  # aquecimento
+            samples: list[float] = []
+            sizes: list[int | None] = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                sizes += await asyncio.gather(
+                    *(_request(client, route, files, data) for _ in range(concurrency))
+                )
+                samples.append(time.perf_counter() - start)
+            served = [n for n in sizes if n is not None]
+            results[case] = {
+                **summarize(samples),
+                "requestsPerSecond": round(len(served) / sum(samples), 2),
+                "responseBytes": served[0] if served else 0,
+                # Controle de admissão/pools recusando a concorrência pedida
+                "rejected": len(sizes) - len(served),
+            }
+    return results
+
+
+def run(corpus_dir: str, scale: int, repeat: int, concurrency: int, only: list[str]) -> dict:
+    files = build_corpus(corpus_dir, scale)
+    paths = {name: f.path for name, f in files.items()}
+    with tempfile.TemporaryDirectory() as tmp:
+        _configure(tmp)
+        results = asyncio.run(run_cases(paths, repeat, concurrency, only))
+    return {
+        "benchmark": "endpoints",
+        "scale": scale,
+        "repeat": repeat,
+        "concurrency": concurrency,
+        "environment": environment(),
+        "corpus": manifest(files),
+        "results": results,
+        # Pico do processo inteiro (app + pools), não por caso
+        "peakRssMiB": peak_rss_mib(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default=None, help="diretório do corpus (reaproveitado)")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--only", default="", help="filtros por substring, separados por vírgula")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+    only = [o for o in args.only.split(",") if o]
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run(args.corpus or tmp, args.scale, args.repeat, args.concurrency, only)
+    for case, r in report["results"].items():
+        if "skipped" in r:
+            print(f"{case:<28} {r['skipped']}", file=sys.stderr)
+        else:
+            print(
+                f"{case:<28} {r['seconds']:>8.4f}s  p95 {r['p95']:>8.4f}s  "
+                f"{r['requestsPerSecond']:>8.2f} req/s  503 {r['rejected']}",
+                file=sys.stderr,
+            )
+    write_report(report, args.out)
+    if args.baseline and check_baseline(report, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
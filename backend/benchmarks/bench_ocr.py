@@ -0,0 +1,63 @@
+"""Curva de escala do OCR paralelo em função do número de processos.
+
+Uso (dentro de backend/, com poppler e tesseract instalados):
+    python -m benchmarks.bench_ocr --pages 16 --workers 1,2,4,8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from app.services import ocr_service
+from benchmarks.corpus import write_scanned_pdf
+
+
+def run(pages: int, workers_list: list[int]) -> list[dict[str, float]]:
+    results: list[dict[str, float]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "scan.pdf")
+        write_scanned_pdf(pdf, pages)
+        baseline = None
+        for workers in workers_list:
+            os.environ["OCR_WORKERS"] = str(workers)
+            # Aquece o pool (spawn) fora da medição
+            ocr_service.ocr_pdf_pages(pdf, [1], ["eng"])
+            start = time.perf_counter()
+            ocr_service.ocr_pdf_pages(pdf, list(range(1, pages + 1)), ["eng"])
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            results.append(
+                {
+                    "workers": workers,
+                    "seconds": round(elapsed, 3),
+                    "pagesPerSecond": round(pages / elapsed, 3),
+                    "speedup": round(baseline / elapsed, 2),
+                }
+            )
+        ocr_service.shutdown_ocr_pool()
+    return results
+
+
+def main() -> None:
+    cpu = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, 16, cpu} & set(range(1, cpu + 1)))
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=16)
+    parser.add_argument("--workers", default=",".join(str(w) for w in default_workers))
+    args = parser.parse_args()
+    workers_list = [int(w) for w in args.workers.split(",") if w.strip()]
+    results = run(args.pages, workers_list)
+    for r in results:
+        print(
+            f"workers={r['workers']:>3}  {r['seconds']:>8.2f}s  "
+            f"{r['pagesPerSecond']:>6.2f} pág/s  x{r['speedup']}"
+        )
+    print(json.dumps({"benchmark": "ocr_scaling", "pages": args.pages, "results": results}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Custo por requisição do rate limiter no middleware.
+
+Compara a lista de timestamps antiga com o contador de janela deslizante
+(memória) e, se --redis-url for passado, com o script atômico no Redis.
+
+Uso (dentro de backend/):
+    python -m benchmarks.bench_ratelimit --requests 200000 --clients 1000
+    python -m benchmarks.bench_ratelimit --redis-url redis://localhost:6379/0
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import tracemalloc
+
+from app.utils.ratelimit import MemoryRateLimiter, RedisRateLimiter
+
+
+class LegacyListLimiter:
+    """Implementação anterior (main.py): lista de timestamps por IP + lock global."""
+
+    def __init__(self, limit: int, window_seconds: float):
+        self.limit = limit
+        self.window = window_seconds
+        self._store: dict[str, list[float]] = {}
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str) -> bool:
+        now = time.time()
+        with self._lock:
+            hits = self._store.get(key, [])
+            hits = [h for h in hits if now - h <= self.window]
+            if len(hits) >= self.limit:
+                return False
+            hits.append(now)
+            self._store[key] = hits
+        return True
+
+
+async def _measure(limiter, requests: int, clients: int) -> dict[str, float]:
+    keys = [f"10.0.{n // 256}.{n % 256}" for n in range(clients)]
+    tracemalloc.start()
+    start = time.perf_counter()
+    for n in range(requests):
+        await limiter.hit(keys[n % clients])
+    elapsed = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "usPerRequest": round(elapsed / requests * 1e6, 3),
+        "peakKiB": round(peak / 1024, 1),
+    }
+
+
+async def run(requests: int, clients: int, limit: int, redis_url: str | None) -> dict:
+    window = 600
+    results = {
+        "legacy-list": await _measure(LegacyListLimiter(limit, window), requests, clients),
+        "memory": await _measure(MemoryRateLimiter(limit, window), requests, clients),
+    }
+    if redis_url:
+        # Rede domina: menos requisições bastam
+        n = min(requests, 20_000)
+        results["redis"] = await _measure(RedisRateLimiter(redis_url, limit, window), n, clients)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=1_000)
+    parser.add_argument("--limit", type=int, default=60)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    results = asyncio.run(run(args.requests, args.clients, args.limit, args.redis_url))
+    for name, r in results.items():
+        print(f"{name:<12} {r['usPerRequest']:>9.3f} µs/req  pico {r['peakKiB']:>9.1f} KiB")
+    print(
+        json.dumps(
+            {
+                "benchmark": "ratelimit",
+                "requests": args.requests,
+                "clients": args.clients,
+                "results": results,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
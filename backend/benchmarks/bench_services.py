@@ -0,0 +1,229 @@
+"""Tempo e pico de RSS por serviço sobre o corpus sintético.
+
+Cada caso roda num processo novo (spawn), então o pico de RSS é só dele; o
+pico dos subprocessos (gs, pdftoppm, tesseract) sai à parte. Casos cuja
+ferramenta não está instalada aparecem como "skipped".
+
+Uso (dentro de backend/):
+    python -m benchmarks.bench_services --repeat 3 --out atual.json
+    python -m benchmarks.bench_services --only merge,split --baseline baseline.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any
+
+from benchmarks.corpus import build_corpus, manifest
+from benchmarks.report import (
+    check_baseline,
+    environment,
+    peak_rss_mib,
+    summarize,
+    write_report,
+)
+
+Paths = dict[str, str]
+
+
+def _merge(c: Paths, out: str) -> None:
+    from app.services.merge_service import merge_pdfs  # noqa: PLC0415
+
+    merge_pdfs([c["text-10"], c["text-100"], c["scanned-5"]], os.path.join(out, "m.pdf"))
+
+
+def _merge_huge(c: Paths, out: str) -> None:
+    from app.services.merge_service import merge_pdfs  # noqa: PLC0415
+
+    merge_pdfs([c["huge-2000"], c["text-10"]], os.path.join(out, "m.pdf"))
+
+
+def _split(c: Paths, out: str) -> None:
+    from app.services.split_service import split_pdf  # noqa: PLC0415
+
+    ranges = [(1, 50), (51, 100)]
+    split_pdf(c["text-100"], ranges, [os.path.join(out, f"s{n}.pdf") for n in (1, 2)])
+
+
+def _split_huge(c: Paths, out: str) -> None:
+    from app.services.split_service import split_pdf  # noqa: PLC0415
+
+    ranges = [(n, n + 99) for n in range(1, 2000, 100)]
+    split_pdf(c["huge-2000"], ranges, [os.path.join(out, f"s{n}.pdf") for n in range(20)])
+
+
+def _parse_ranges(_c: Paths, _out: str) -> None:
+    from app.utils.ranges import parse_ranges  # noqa: PLC0415
+
+    spec = ",".join(f"{n}-{n + 5}" for n in range(1, 1900, 10))
+    for _ in range(200):
+        parse_ranges(spec, 2000)
+
+
+def _compress(c: Paths, out: str) -> None:
+    from app.services.compress_service import compress_pdf  # noqa: PLC0415
+
+    compress_pdf(c["mixed-10"], os.path.join(out, "c.pdf"), "medium")
+
+
+def _to_images(
+    name: str, dpi: int, backend: str = "poppler", processes: int = 0, embedded: bool = True
+) -> Callable[[Paths, str], None]:
+    def run(c: Paths, out: str) -> None:
+        from app.config import get_settings  # noqa: PLC0415
+        from app.services.images_service import pdf_to_images  # noqa: PLC0415
+
+        # Processo do caso é novo (spawn): só ele vê estas variáveis
+        os.environ.update(
+            RENDER_BACKEND=backend,
+            RENDER_PROCESSES=str(processes),
+            EXTRACT_EMBEDDED_IMAGES=str(embedded).lower(),
+        )
+        get_settings.cache_clear()
+        pdf_to_images(c[name], os.path.join(out, "img"), "png", dpi)
+
+    return run
+
+
+def _ocr(name: str) -> Callable[[Paths, str], None]:
+    def run(c: Paths, _out: str) -> None:
+        from app.services.ocr_service import ocr_pdf_or_image  # noqa: PLC0415
+
+        ocr_pdf_or_image(c[name], ["eng"])
+
+    return run
+
+
+def _ingest(name: str, content_type: str) -> Callable[[Paths, str], None]:
+    def run(c: Paths, out: str) -> None:
+        from starlette.datastructures import Headers, UploadFile  # noqa: PLC0415
+
+        from app.utils.validators import stream_save_image, stream_save_pdf  # noqa: PLC0415
+
+        save = stream_save_pdf if content_type == "application/pdf" else stream_save_image
+        with open(c[name], "rb") as f:
+            upload = UploadFile(
+                f,
+                filename=os.path.basename(c[name]),
+                headers=Headers({"content-type": content_type}),
+            )
+            asyncio.run(save(upload, out, 200 * 1024 * 1024))
+
+    return run
+
+
+# nome -> (função, ferramentas externas necessárias)
+CASES: dict[str, tuple[Callable[[Paths, str], None], tuple[str, ...]]] = {
+    "merge/text+scanned": (_merge, ()),
+    "merge/huge-2000": (_merge_huge, ()),
+    "split/text-100": (_split, ()),
+    "split/huge-2000": (_split_huge, ()),
+    "parse_ranges/190x200": (_parse_ranges, ()),
+    "validators/pdf-huge-2000": (_ingest("huge-2000", "application/pdf"), ()),
+    "validators/pdf-scanned-5": (_ingest("scanned-5", "application/pdf"), ()),
+    "validators/image-jpg": (_ingest("photo-jpg", "image/jpeg"), ()),
+    "compress/mixed-10": (_compress, ("gs",)),
+    "to-images/text-10@150": (_to_images("text-10", 150), ("pdftoppm",)),
+    # Páginas escaneadas: o JPEG embutido sai direto, sem pdftoppm
+    "to-images/scanned-5@300": (_to_images("scanned-5", 300), ()),
+    "to-images/scanned-5@300/render": (
+        _to_images("scanned-5", 300, embedded=False),
+        ("pdftoppm",),
+    ),
+    # Caminho antigo (um pdftoppm, PPM decodificado e recodificado no PIL) para comparar
+    "to-images/text-10@150/pil-1": (
+        _to_images("text-10", 150, "pil", 1, embedded=False),
+        ("pdftoppm",),
+    ),
+    "to-images/scanned-5@300/pil-1": (
+        _to_images("scanned-5", 300, "pil", 1, embedded=False),
+        ("pdftoppm",),
+    ),
+    "ocr/scanned-5": (_ocr("scanned-5"), ("pdftoppm", "tesseract")),
+    "ocr/mixed-10": (_ocr("mixed-10"), ("pdftoppm", "tesseract")),
+    "ocr/image-png": (_ocr("photo-png"), ("tesseract",)),
+}
+
+
+def _run_case(case: str, paths: Paths, repeat: int) -> dict[str, Any]:
+    """Executa no processo filho: aquecimento + repeat medições."""
+    import resource  # noqa: PLC0415
+
+    fn, _tools = CASES[case]
+    samples: list[float] = []
+    for n in range(repeat + 1):
+        with tempfile.TemporaryDirectory() as out:
+            start = time.perf_counter()
+            fn(paths, out)
+            elapsed = time.perf_counter() - start
+        if n:  # primeira rodada só aquece imports e caches do SO
+            samples.append(elapsed)
+    return {
+        **summarize(samples),
+        "peakRssMiB": peak_rss_mib(),
+        "childPeakRssMiB": peak_rss_mib(resource.RUSAGE_CHILDREN),
+    }
+
+
+def run(corpus_dir: str, scale: int, repeat: int, only: list[str]) -> dict[str, Any]:
+    files = build_corpus(corpus_dir, scale)
+    paths = {name: f.path for name, f in files.items()}
+    results: dict[str, Any] = {}
+    ctx = get_context("spawn")
+    for case, (_fn, tools) in CASES.items():
+        if only and not any(o in case for o in only):
+            continue
+        missing = [t for t in tools if shutil.which(t) is None]
+        if missing:
+            results[case] = {"skipped": f"ausente: {', '.join(missing)}"}
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            results[case] = pool.submit(_run_case, case, paths, repeat).result()
+    return {
+        "benchmark": "services",
+        "scale": scale,
+        "repeat": repeat,
+        "environment": environment(),
+        "corpus": manifest(files),
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", default=None, help="diretório do corpus (reaproveitado)")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default="", help="filtros por substring, separados por vírgula")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+    only = [o for o in args.only.split(",") if o]
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run(args.corpus or tmp, args.scale, args.repeat, only)
+    for case, r in report["results"].items():
+        if "skipped" in r:
+            print(f"{case:<28} {r['skipped']}", file=sys.stderr)
+        else:
+            print(
+                f"{case:<28} {r['seconds']:>8.4f}s  p95 {r['p95']:>8.4f}s  "
+                f"RSS {r['peakRssMiB']:>7.1f} MiB  filhos {r['childPeakRssMiB']:>7.1f} MiB",
+                file=sys.stderr,
+            )
+    write_report(report, args.out)
+    if args.baseline and check_baseline(report, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
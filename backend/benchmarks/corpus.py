@@ -0,0 +1,196 @@
+"""Corpus sintético e determinístico para os benchmarks.
+
+Mesma semente, mesmos bytes: os PDFs de texto são montados à mão (sem datas
+nem ids aleatórios) e as imagens vêm de um gerador com semente fixa. O
+manifesto traz o SHA-256 de cada arquivo, então dois relatórios só são
+comparáveis se os corpora baterem.
+
+Uso (dentro de backend/):
+    python -m benchmarks.corpus --out /tmp/corpus --scale 1
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import time
+from dataclasses import asdict, dataclass
+
+from PIL import Image, ImageDraw
+from pypdf import PdfReader, PdfWriter
+
+SEED = 20240601
+# A4 em pontos
+PAGE_W, PAGE_H = 595, 842
+LOREM = (
+    "Lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua Ut enim ad minim veniam quis nostrud"
+).split()
+
+
+@dataclass(frozen=True)
+class CorpusFile:
+    name: str
+    path: str
+    kind: str
+    pages: int
+    size: int
+    sha256: str
+
+
+def _text_page_stream(rng: random.Random, page_no: int, lines: int) -> bytes:
+    ops = [b"BT", b"/F1 11 Tf", b"14 TL", b"50 800 Td"]
+    ops.append(f"(Pagina {page_no}) Tj T*".encode())
+    for _ in range(lines):
+        words = " ".join(rng.choice(LOREM) for _ in range(12))
+        ops.append(f"({words}) Tj T*".encode())
+    ops.append(b"ET")
+    return b"\n".join(ops)
+
+
+def write_text_pdf(path: str, pages: int, lines: int = 50, seed: int = SEED) -> None:
+    """PDF só com texto (Helvetica), escrito objeto a objeto com xref exata."""
+    rng = random.Random(seed)
+    # 1: catálogo, 2: árvore de páginas, 3: fonte; depois (página, conteúdo) por página
+    objects: list[bytes] = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids: list[str] = []
+    for n in range(1, pages + 1):
+        page_id, content_id = len(objects) + 1, len(objects) + 2
+        stream = _text_page_stream(rng, n, lines)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_W} {PAGE_H}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+        kids.append(f"{page_id} 0 R")
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Count {pages} /Kids [{' '.join(kids)}] >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for idx, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{idx} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for off in offsets:
+        out.write(f"{off:010d} 00000 n \n".encode())
+    out.write(
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    )
+    with open(path, "wb") as f:
+        f.write(out.getvalue())
+
+
+def scanned_page(page_no: int, seed: int = SEED) -> Image.Image:
+    """Página "escaneada": texto rasterizado a 150 DPI, com ruído leve."""
+    rng = random.Random(seed + page_no)
+    img = Image.new("L", (1240, 1754), color=255)  # A4 a 150 DPI
+    draw = ImageDraw.Draw(img)
+    for line in range(40):
+        words = " ".join(rng.choice(LOREM) for _ in range(6))
+        draw.text((80, 80 + line * 40), f"Pagina {page_no} {words}", fill=0)
+    for _ in range(400):
+        draw.point((rng.randrange(1240), rng.randrange(1754)), fill=rng.randrange(160, 255))
+    return img
+
+
+def write_scanned_pdf(path: str, pages: int, seed: int = SEED) -> None:
+    """PDF só de imagens (sem camada de texto), como saída de scanner."""
+    images = [scanned_page(n, seed) for n in range(1, pages + 1)]
+    # Datas fixas: o PIL grava a hora atual por padrão
+    fixed = time.strptime("2024-01-01", "%Y-%m-%d")
+    images[0].save(
+        path,
+        "PDF",
+        resolution=150,
+        save_all=True,
+        append_images=images[1:],
+        creationDate=fixed,
+        modDate=fixed,
+    )
+
+
+def write_mixed_pdf(path: str, text_pdf: str, scanned_pdf: str) -> None:
+    """Páginas de texto e escaneadas intercaladas (OCR só nas escaneadas)."""
+    text, scanned = PdfReader(text_pdf), PdfReader(scanned_pdf)
+    writer = PdfWriter()
+    for n in range(max(len(text.pages), len(scanned.pages))):
+        if n < len(text.pages):
+            writer.add_page(text.pages[n])
+        if n < len(scanned.pages):
+            writer.add_page(scanned.pages[n])
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def write_photo(path: str, fmt: str, size: tuple[int, int] = (2000, 1500)) -> None:
+    """Imagem com gradiente e blocos pseudoaleatórios (comprime como foto, não como tela)."""
+    rng = random.Random(SEED)
+    w, h = size
+    img = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for _ in range(300):
+        x, y = rng.randrange(w), rng.randrange(h)
+        color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        draw.rectangle((x, y, x + rng.randrange(20, 200), y + rng.randrange(20, 200)), fill=color)
+    if fmt == "jpg":
+        img.save(path, "JPEG", quality=85)
+    else:
+        img.save(path, "PNG")
+
+
+def _describe(name: str, path: str, kind: str) -> CorpusFile:
+    with open(path, "rb") as f:
+        data = f.read()
+    pages = len(PdfReader(path).pages) if path.endswith(".pdf") else 1
+    return CorpusFile(name, path, kind, pages, len(data), hashlib.sha256(data).hexdigest())
+
+
+def build_corpus(out_dir: str, scale: int = 1) -> dict[str, CorpusFile]:
+    """Gera (ou reaproveita) o corpus em out_dir; scale multiplica as páginas."""
+    os.makedirs(out_dir, exist_ok=True)
+    specs = {
+        "text-10": ("text", lambda p: write_text_pdf(p, 10 * scale)),
+        "text-100": ("text", lambda p: write_text_pdf(p, 100 * scale)),
+        "scanned-5": ("scanned", lambda p: write_scanned_pdf(p, 5 * scale)),
+        "huge-2000": ("huge", lambda p: write_text_pdf(p, 2000 * scale, lines=5)),
+    }
+    files: dict[str, CorpusFile] = {}
+    for name, (kind, writer) in specs.items():
+        path = os.path.join(out_dir, f"{name}.pdf")
+        if not os.path.exists(path):
+            writer(path)
+        files[name] = _describe(name, path, kind)
+    mixed = os.path.join(out_dir, "mixed-10.pdf")
+    if not os.path.exists(mixed):
+        write_mixed_pdf(mixed, files["text-10"].path, files["scanned-5"].path)
+    files["mixed-10"] = _describe("mixed-10", mixed, "mixed")
+    for fmt in ("png", "jpg"):
+        path = os.path.join(out_dir, f"photo.{fmt}")
+        if not os.path.exists(path):
+            write_photo(path, fmt)
+        files[f"photo-{fmt}"] = _describe(f"photo-{fmt}", path, "image")
+    return files
+
+
+def manifest(files: dict[str, CorpusFile]) -> dict[str, dict]:
+    return {name: {k: v for k, v in asdict(f).items() if k != "path"} for name, f in files.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--scale", type=int, default=1)
+    args = parser.parse_args()
+    files = build_corpus(args.out, args.scale)
+    print(json.dumps({"corpus": manifest(files)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+"""Teste de carga contra a stack rodando (uvicorn + Redis + Celery).
+
+N clientes concorrentes sorteiam cenários leves e pesados que passam por todas
+as rotas do main.py (síncronas, uploads retomáveis, jobs com SSE/status/
+trace/download e o scrape de /metrics; com METRICS_ENABLED=false ou
+TRACE_ENABLED=false essas duas aparecem como erro 404). O relatório traz, por
+rota, p50/p95/p99 e as taxas de erro, 429, 413 e 503; a espera na fila do
+Celery e o tempo total dos jobs; e a latência de /api/health com a stack
+ociosa e durante a carga. O health é o canário de event loop bloqueado: se o
+p99 dele sobe junto com as rotas pesadas, há trabalho de CPU rodando no loop
+em vez de nos pools.
+
+Com o RATE_LIMIT padrão quase tudo vira 429 em segundos (bom para validar o
+limite); para medir admissão e dimensionar workers, suba a API com um
+RATE_LIMIT alto.
+
+Uso (dentro de backend/):
+    docker compose -f ../docker/docker-compose.yml up --build -d
+    python -m benchmarks.loadtest --url http://localhost:8000 --concurrency 16 --duration 60 \\
+        --out carga.json
+    python -m benchmarks.loadtest --mix heavy --baseline carga-base.json --max-health-p99 0.25
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+from benchmarks.corpus import build_corpus, manifest
+from benchmarks.report import check_baseline, environment, percentile, write_report
+
+PDF = "application/pdf"
+# Recusas (tamanho, rate limit, capacidade): contadas à parte e fora dos percentis,
+# senão as respostas instantâneas puxariam a latência para baixo
+REJECTIONS = {413, 429, 503}
+IDLE_HEALTH_SAMPLES = 20
+
+
+@dataclass
+class RouteStats:
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+
+
+class Recorder:
+    """Latência e status por rota (template), mais esperas de job e o canário."""
+
+    def __init__(self) -> None:
+        self.routes: dict[str, RouteStats] = defaultdict(RouteStats)
+        self.series: dict[str, list[float]] = defaultdict(list)
+        self.counts: Counter = Counter()
+
+    def record(self, route: str, seconds: float, status: int | str) -> None:
+        stats = self.routes[route]
+        stats.statuses[status] += 1
+        if status not in REJECTIONS:
+            stats.latencies.append(seconds)
+
+    async def call(
+        self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs: Any
+    ) -> httpx.Response | None:
+        """Requisição medida até o último byte; None em erro de transporte."""
+        start = time.perf_counter()
+        try:
+            resp = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as err:
+            self.record(route, time.perf_counter() - start, type(err).__name__)
+            return None
+        self.record(route, time.perf_counter() - start, resp.status_code)
+        return resp
+
+
+@dataclass
+class Ctx:
+    client: httpx.AsyncClient
+    rec: Recorder
+    payloads: dict[str, bytes]
+    job_timeout: float
+
+
+class ScenarioError(Exception):
+    pass
+
+
+def _ok(resp: httpx.Response | None, *codes: int) -> httpx.Response:
+    if resp is None or resp.status_code not in (codes or (200,)):
+        raise ScenarioError("transporte" if resp is None else str(resp.status_code))
+    return resp
+
+
+def _file(ctx: Ctx, field_name: str, name: str, content_type: str = PDF) -> tuple:
+    return (field_name, (name, ctx.payloads[name], content_type))
+
+
+async def _merge(ctx: Ctx, names: tuple[str, ...]) -> None:
+    files = [_file(ctx, "files", n) for n in names]
+    _ok(
+        await ctx.rec.call(ctx.client, "POST /api/pdf/merge", "POST", "/api/pdf/merge", files=files)
+    )
+
+
+async def _split(ctx: Ctx) -> None:
+    resp = await ctx.rec.call(
+        ctx.client,
+        "POST /api/pdf/split",
+        "POST",
+        "/api/pdf/split",
+        files=[_file(ctx, "file", "text-10")],
+        data={"ranges": "1-5,6-10"},
+    )
+    _ok(resp)
+
+
+async def _compress(ctx: Ctx) -> None:
+    resp = await ctx.rec.call(
+        ctx.client,
+        "POST /api/pdf/compress",
+        "POST",
+        "/api/pdf/compress",
+        files=[_file(ctx, "file", "mixed-10")],
+        data={"quality": "medium"},
+    )
+    _ok(resp)
+
+
+async def _to_images(ctx: Ctx) -> None:
+    resp = await ctx.rec.call(
+        ctx.client,
+        "POST /api/pdf/to-images",
+        "POST",
+        "/api/pdf/to-images",
+        files=[_file(ctx, "file", "text-10")],
+        data={"dpi": "150"},
+    )
+    _ok(resp)
+
+
+async def _ocr(ctx: Ctx) -> None:
+    resp = _ok(
+        await ctx.rec.call(
+            ctx.client,
+            "POST /api/ocr",
+            "POST",
+            "/api/ocr",
+            files=[_file(ctx, "file", "scanned-5")],
+            data={"lang": "eng"},
+        )
+    )
+    text_id = resp.json()["id"]
+    route = "GET /api/ocr/download/{id}"
+    _ok(await ctx.rec.call(ctx.client, route, "GET", f"/api/ocr/download/{text_id}"))
+
+
+async def _resumable_upload(ctx: Ctx) -> None:
+    """Upload em duas partes (com HEAD para retomar) e split pelo uploadId."""
+    body = ctx.payloads["text-10"]
+    created = _ok(
+        await ctx.rec.call(
+            ctx.client,
+            "POST /api/uploads",
+            "POST",
+            "/api/uploads",
+            data={"filename": "text-10.pdf", "length": str(len(body)), "content_type": PDF},
+        ),
+        201,
+    )
+    upload_id = created.json()["uploadId"]
+    url = f"/api/uploads/{upload_id}"
+    half = len(body) // 2
+    patch = "PATCH /api/uploads/{id}"
+    headers = {"Upload-Offset": "0"}
+    _ok(
+        await ctx.rec.call(ctx.client, patch, "PATCH", url, content=body[:half], headers=headers),
+        204,
+    )
+    head = _ok(await ctx.rec.call(ctx.client, "HEAD /api/uploads/{id}", "HEAD", url))
+    offset = int(head.headers["Upload-Offset"])
+    headers = {"Upload-Offset": str(offset)}
+    _ok(
+        await ctx.rec.call(ctx.client, patch, "PATCH", url, content=body[offset:], headers=headers),
+        204,
+    )
+    _ok(
+        await ctx.rec.call(ctx.client, "POST /api/uploads/{id}/complete", "POST", f"{url}/complete")
+    )
+    resp = await ctx.rec.call(
+        ctx.client,
+        "POST /api/pdf/split",
+        "POST",
+        "/api/pdf/split",
+        data={"upload_id": upload_id, "ranges": "1-10"},
+    )
+    _ok(resp)
+
+
+async def _wait_events(ctx: Ctx, job_id: str, submitted: float, job_type: str) -> None:
+    """Acompanha o job pelo SSE: fila = até o primeiro evento fora de "queued"."""
+    route = "GET /api/jobs/{id}/events"
+    start = time.perf_counter()
+    queued = True
+    async with ctx.client.stream("GET", f"/api/jobs/{job_id}/events") as resp:
+        ctx.rec.record(route, time.perf_counter() - start, resp.status_code)
+        _ok(resp)
+        async for line in resp.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            status = json.loads(line[len("data: ") :])["status"]
+            if queued and status != "queued":
+                # Job curto pode pular direto para "done": vira o limite superior da espera
+                queued = False
+                ctx.rec.series[f"queue-wait/{job_type}"].append(time.perf_counter() - submitted)
+            if status == "done":
+                break
+            if status == "error":
+                raise ScenarioError("job com erro")
+
+
+async def _job(ctx: Ctx, job_type: str, files: list[tuple], data: dict[str, str]) -> None:
+    """Enfileira (mode=async), espera pelo SSE, confere status e trace e baixa o resultado."""
+    start = time.perf_counter()
+    resp = _ok(
+        await ctx.rec.call(
+            ctx.client,
+            "POST /api/jobs",
+            "POST",
+            "/api/jobs",
+            files=files,
+            data={"type": job_type, **data},
+        )
+    )
+    job_id = resp.json()["jobId"]
+    try:
+        await asyncio.wait_for(
+            _wait_events(ctx, job_id, time.perf_counter(), job_type), ctx.job_timeout
+        )
+    except TimeoutError as err:
+        raise ScenarioError("timeout do job") from err
+    status = _ok(await ctx.rec.call(ctx.client, "GET /api/jobs/{id}", "GET", f"/api/jobs/{job_id}"))
+    if status.json()["status"] != "done":
+        raise ScenarioError(status.json()["status"])
+    # Linha do tempo lida do volume (spans da API e do worker), antes do download
+    route = "GET /api/jobs/{id}/trace"
+    _ok(await ctx.rec.call(ctx.client, route, "GET", f"/api/jobs/{job_id}/trace"))
+    route = "GET /api/jobs/{id}/download"
+    _ok(await ctx.rec.call(ctx.client, route, "GET", f"/api/jobs/{job_id}/download"))
+    ctx.rec.series[f"job-total/{job_type}"].append(time.perf_counter() - start)
+
+
+async def _auto(ctx: Ctx) -> None:
+    """mode=auto: 200 com o arquivo (inline) ou 202 com jobId (fila)."""
+    resp = _ok(
+        await ctx.rec.call(
+            ctx.client,
+            "POST /api/jobs",
+            "POST",
+            "/api/jobs",
+            files=[_file(ctx, "file", "text-10")],
+            data={"type": "compress", "quality": "low", "mode": "auto"},
+        ),
+        200,
+        202,
+    )
+    ctx.rec.counts["inline" if resp.status_code == 200 else "queued"] += 1  # noqa: PLR2004
+
+
+async def _scrape(ctx: Ctx) -> None:
+    """Scrape do Prometheus: agrega os arquivos mmap de todos os processos e
+    consulta a profundidade das filas no Redis (sem rate limit, fora de /api).
+    """
+    _ok(await ctx.rec.call(ctx.client, "GET /metrics", "GET", "/metrics"))
+
+
+Scenario = Callable[[Ctx], Awaitable[None]]
+
+# nome -> (classe, peso, cenário)
+SCENARIOS: dict[str, tuple[str, int, Scenario]] = {
+    "merge/text-10x2": ("light", 6, lambda c: _merge(c, ("text-10", "text-10"))),
+    "split/text-10": ("light", 6, _split),
+    "upload+split/text-10": ("light", 3, _resumable_upload),
+    "metrics/scrape": ("light", 1, _scrape),
+    "job/merge": (
+        "light",
+        2,
+        lambda c: _job(
+            c, "merge", [_file(c, "files", "text-10"), _file(c, "files", "text-100")], {}
+        ),
+    ),
+    "merge/huge-2000": ("heavy", 1, lambda c: _merge(c, ("huge-2000", "text-10"))),
+    "compress/mixed-10": ("heavy", 2, _compress),
+    "to-images/text-10@150": ("heavy", 2, _to_images),
+    "ocr/scanned-5": ("heavy", 2, _ocr),
+    "auto/compress-text-10": ("heavy", 1, _auto),
+    "job/compress": (
+        "heavy",
+        1,
+        lambda c: _job(c, "compress", [_file(c, "file", "mixed-10")], {"quality": "medium"}),
+    ),
+    "job/to-images": (
+        "heavy",
+        1,
+        lambda c: _job(c, "to-images", [_file(c, "file", "scanned-5")], {"dpi": "150"}),
+    ),
+    "job/ocr": (
+        "heavy",
+        1,
+        lambda c: _job(c, "ocr", [_file(c, "file", "scanned-5")], {"lang": "eng"}),
+    ),
+}
+
+
+def pick_scenarios(mix: str, only: list[str]) -> dict[str, tuple[str, int, Scenario]]:
+    return {
+        name: spec
+        for name, spec in SCENARIOS.items()
+        if (mix in {"mixed", spec[0]}) and (not only or any(o in name for o in only))
+    }
+
+
+async def _client_loop(
+    ctx: Ctx, scenarios: dict[str, tuple[str, int, Scenario]], rng: random.Random, deadline: float
+) -> Counter:
+    names = list(scenarios)
+    weights = [scenarios[n][1] for n in names]
+    outcomes: Counter = Counter()
+    while time.monotonic() < deadline:
+        name = rng.choices(names, weights)[0]
+        try:
+            await scenarios[name][2](ctx)
+            outcomes[(name, "ok")] += 1
+        except (ScenarioError, httpx.HTTPError, KeyError, ValueError):
+            outcomes[(name, "failed")] += 1
+    return outcomes
+
+
+async def _canary(ctx: Ctx, route: str, stop: asyncio.Event, interval: float) -> None:
+    while not stop.is_set():
+        await ctx.rec.call(ctx.client, route, "GET", "/api/health")
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except TimeoutError:
+            pass
+
+
+def route_summary(stats: RouteStats, elapsed: float) -> dict[str, Any]:
+    total = sum(stats.statuses.values())
+    errors = sum(
+        n
+        for s, n in stats.statuses.items()
+        if not isinstance(s, int) or (s >= 400 and s not in REJECTIONS)  # noqa: PLR2004
+    )
+    summary: dict[str, Any] = {
+        "requests": total,
+        "requestsPerSecond": round(total / elapsed, 2) if elapsed else 0.0,
+        "status": {str(s): n for s, n in sorted(stats.statuses.items(), key=str)},
+        "errorRate": round(errors / total, 4) if total else 0.0,
+        **{
+            f"rate{code}": round(stats.statuses[code] / total, 4) if total else 0.0
+            for code in sorted(REJECTIONS)
+        },
+    }
+    return summary | series_summary(stats.latencies)
+
+
+def series_summary(samples: list[float]) -> dict[str, Any]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        # "seconds" (p50) e "p99" são as chaves comparadas com o baseline
+        "seconds": round(percentile(ordered, 0.50), 4),
+        "p50": round(percentile(ordered, 0.50), 4),
+        "p95": round(percentile(ordered, 0.95), 4),
+        "p99": round(percentile(ordered, 0.99), 4),
+        "max": round(ordered[-1], 4),
+        "runs": len(ordered),
+    }
+
+
+async def run_load(  # noqa: PLR0913
+    url: str,
+    payloads: dict[str, bytes],
+    scenarios: dict[str, tuple[str, int, Scenario]],
+    *,
+    concurrency: int,
+    duration: float,
+    seed: int,
+    health_interval: float,
+    job_timeout: float,
+) -> dict[str, Any]:
+    rec = Recorder()
+    limits = httpx.Limits(max_connections=concurrency + 2)
+    timeout = httpx.Timeout(job_timeout, connect=10)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        ctx = Ctx(client, rec, payloads, job_timeout)
+        # Referência antes da carga: o canário só diz algo comparado ao ocioso
+        for _ in range(IDLE_HEALTH_SAMPLES):
+            await rec.call(client, "canary/idle", "GET", "/api/health")
+        stop = asyncio.Event()
+        canary = asyncio.create_task(_canary(ctx, "canary/load", stop, health_interval))
+        started = time.monotonic()
+        deadline = started + duration
+        outcomes = await asyncio.gather(
+            *(
+                _client_loop(ctx, scenarios, random.Random(seed + n), deadline)
+                for n in range(concurrency)
+            )
+        )
+        elapsed = time.monotonic() - started
+        stop.set()
+        await canary
+
+    results = {route: route_summary(stats, elapsed) for route, stats in sorted(rec.routes.items())}
+    for name, samples in sorted(rec.series.items()):
+        results[name] = series_summary(samples)
+    merged: Counter = sum(outcomes, Counter())
+    traffic = [s for r, s in rec.routes.items() if not r.startswith("canary/")]
+    return {
+        "elapsed": round(elapsed, 2),
+        "scenarios": {
+            name: {"ok": merged[(name, "ok")], "failed": merged[(name, "failed")]}
+            for name in scenarios
+        },
+        "totals": route_summary(
+            RouteStats(statuses=sum((s.statuses for s in traffic), Counter())), elapsed
+        ),
+        # mode=auto: quantas vezes o servidor executou inline x enfileirou
+        "auto": dict(rec.counts),
+        "results": results,
+    }
+
+
+def run(args: argparse.Namespace, corpus_dir: str) -> dict[str, Any]:
+    files = build_corpus(corpus_dir, args.scale)
+    payloads = {}
+    for name, f in files.items():
+        with open(f.path, "rb") as fh:
+            payloads[name] = fh.read()
+    only = [o for o in args.only.split(",") if o]
+    scenarios = pick_scenarios(args.mix, only)
+    if not scenarios:
+        raise SystemExit("nenhum cenário selecionado")
+    load = asyncio.run(
+        run_load(
+            args.url,
+            payloads,
+            scenarios,
+            concurrency=args.concurrency,
+            duration=args.duration,
+            seed=args.seed,
+            health_interval=args.health_interval,
+            job_timeout=args.job_timeout,
+        )
+    )
+    return {
+        "benchmark": "loadtest",
+        "url": args.url,
+        "mix": args.mix,
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "seed": args.seed,
+        "environment": environment(),
+        "corpus": manifest(files),
+        **load,
+    }
+
+
+def _print_summary(report: dict[str, Any]) -> None:
+    for route, r in report["results"].items():
+        if "p50" not in r:
+            print(f"{route:<36} {r['requests']:>6} req, todas recusadas", file=sys.stderr)
+            continue
+        line = f"{route:<36} p50 {r['p50']:>8.4f}s  p95 {r['p95']:>8.4f}s  p99 {r['p99']:>8.4f}s"
+        if "status" in r:
+            line += (
+                f"  {r['requests']:>6} req  erro {r['errorRate']:.1%}  429 {r['rate429']:.1%}"
+                f"  413 {r['rate413']:.1%}  503 {r['rate503']:.1%}"
+            )
+        print(line, file=sys.stderr)
+    for name, o in report["scenarios"].items():
+        print(f"cenário {name:<28} ok {o['ok']:>5}  falhas {o['failed']:>5}", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--corpus", default=None, help="diretório do corpus (reaproveitado)")
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos de carga")
+    parser.add_argument("--mix", choices=["mixed", "light", "heavy"], default="mixed")
+    parser.add_argument("--only", default="", help="filtros por substring, separados por vírgula")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--health-interval", type=float, default=0.25)
+    parser.add_argument("--job-timeout", type=float, default=300.0)
+    parser.add_argument(
+        "--max-health-p99", type=float, default=None, help="falha se o canário passar disso (s)"
+    )
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run(args, args.corpus or tmp)
+    _print_summary(report)
+    write_report(report, args.out)
+    failed = False
+    canary_p99 = report["results"].get("canary/load", {}).get("p99")
+    if (
+        args.max_health_p99 is not None
+        and canary_p99 is not None
+        and canary_p99 > args.max_health_p99
+    ):
+        print(f"canário: p99 de /api/health {canary_p99:.4f}s sob carga", file=sys.stderr)
+        failed = True
+    if args.baseline and check_baseline(report, args.baseline, args.threshold):
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
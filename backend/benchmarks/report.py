@@ -0,0 +1,137 @@
+"""Relatório JSON dos benchmarks e comparação com um baseline guardado.
+
+Uso (dentro de backend/):
+    python -m benchmarks.report atual.json baseline.json --threshold 0.25
+
+Sai com código 1 se algum caso ficou mais lento (ou usou mais memória) que o
+baseline além do limite relativo.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import sys
+from typing import Any
+
+# Métricas comparadas (maior = pior) e o piso absoluto abaixo do qual a
+# diferença é ruído de medição
+COMPARED = {"seconds": 0.005, "p99": 0.01, "peakRssMiB": 5.0}
+TOOLS = ("gs", "pdftoppm", "tesseract")
+
+
+def environment() -> dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "tools": {t: shutil.which(t) is not None for t in TOOLS},
+    }
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    """Nearest-rank sobre uma lista já ordenada (q entre 0 e 1)."""
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "seconds": round(statistics.median(ordered), 4),
+        "min": round(ordered[0], 4),
+        "p95": round(percentile(ordered, 0.95), 4),
+        "runs": len(ordered),
+    }
+
+
+def peak_rss_mib(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss em KiB no Linux
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+def compare(
+    current: dict[str, Any], baseline: dict[str, Any], threshold: float
+) -> list[dict[str, Any]]:
+    """Linhas (caso, métrica, baseline, atual, razão, regressão) dos casos em comum."""
+    rows: list[dict[str, Any]] = []
+    base_results = baseline.get("results", {})
+    for case, result in current.get("results", {}).items():
+        base = base_results.get(case)
+        if not base or "skipped" in result or "skipped" in base:
+            continue
+        for metric, floor in COMPARED.items():
+            if metric not in result or metric not in base:
+                continue
+            old, new = float(base[metric]), float(result[metric])
+            ratio = new / old if old else float("inf") if new else 1.0
+            rows.append(
+                {
+                    "case": case,
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "ratio": round(ratio, 3),
+                    "regression": new - old > floor and ratio > 1 + threshold,
+                }
+            )
+    return rows
+
+
+def corpus_matches(current: dict[str, Any], baseline: dict[str, Any]) -> bool:
+    def digests(report: dict[str, Any]) -> dict[str, str]:
+        return {k: v["sha256"] for k, v in report.get("corpus", {}).items()}
+
+    return digests(current) == digests(baseline)
+
+
+def print_comparison(rows: list[dict[str, Any]]) -> int:
+    """Imprime a tabela e devolve o número de regressões."""
+    for r in rows:
+        flag = "REGRESSÃO" if r["regression"] else ""
+        print(
+            f"{r['case']:<32} {r['metric']:<11} {r['baseline']:>10.4f} → "
+            f"{r['current']:>10.4f}  x{r['ratio']:<6} {flag}",
+            file=sys.stderr,
+        )
+    return sum(r["regression"] for r in rows)
+
+
+def check_baseline(current: dict[str, Any], baseline_path: str, threshold: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("benchmark") != current.get("benchmark"):
+        print(f"baseline é de outro benchmark ({baseline.get('benchmark')})", file=sys.stderr)
+        return 1
+    if not corpus_matches(current, baseline):
+        print("aviso: corpus diferente do baseline; comparação só indicativa", file=sys.stderr)
+    return print_comparison(compare(current, baseline, threshold))
+
+
+def write_report(report: dict[str, Any], out: str | None) -> None:
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("current")
+    parser.add_argument("baseline")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args()
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    regressions = check_baseline(current, args.baseline, args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()